@@ -1,12 +1,43 @@
+import gzip
+import hmac
+import json
 import os
-from flask import Flask, jsonify, render_template, send_file
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from flask import (
+    Flask, Request, Response, jsonify, render_template, request, send_file, send_from_directory,
+    stream_with_context,
+)
 from dotenv import load_dotenv
 from recorder import Recorder
-from jobs import JobManager
+from captions import LiveCaptioner
+from central import CentralClient
+from jobs import LEASE_SECONDS, JobManager, transcript_path_for
+from ingest import normalize_audio, recording_path, save_stream, upload_label
+from transcript_store import draft_path, ensure_text, load_transcript, loads_transcript, structured_path
+from semantic_index import EmbeddingMismatch, SemanticIndex
+from summarizer import answer_question
+from gateway import get_gateway
 
 load_dotenv()
 
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint != "upload_recording":
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        # Spool uploaded file parts straight to disk next to the recordings instead of into memory;
+        # upload_recording() keeps or removes every one of them
+        return tempfile.NamedTemporaryFile("wb+", dir=RECORDINGS_DIR, suffix=".upload", delete=False)
+
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 
 RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "recordings")
 TRANSCRIPTS_DIR = os.path.join(os.path.dirname(__file__), "transcripts")
@@ -14,22 +45,90 @@ os.makedirs(RECORDINGS_DIR, exist_ok=True)
 os.makedirs(TRANSCRIPTS_DIR, exist_ok=True)
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "jobs.db")
+INDEX_DIR = os.path.join(os.path.dirname(__file__), "index")
+
+# "thread": run the pipeline in a background thread of this process (default).
+# "process": only queue jobs; worker.py processes them in separate processes.
+JOB_WORKER = os.getenv("JOB_WORKER", "thread").lower()
+
+# Multi-room deployments: each room's node tags its jobs with ROOM and, given CENTRAL_URL, pushes
+# recordings to that node's queue instead of processing them itself. The central node runs
+# JOB_WORKER=process; remote workers (worker.py --central) lease jobs via /api/queue/*.
+ROOM = os.getenv("ROOM") or None
+QUEUE_TOKEN = os.getenv("QUEUE_TOKEN") or None
+central = CentralClient(os.getenv("CENTRAL_URL"), token=QUEUE_TOKEN) if os.getenv("CENTRAL_URL") else None
+CENTRAL_JOBS_TTL = 5
+_central_cache = {"jobs": [], "fetched": float("-inf"), "refreshing": False}
+_central_jobs_lock = threading.Lock()
 
+# Live captions run a local Whisper model next to ffmpeg, so they are opt-in
+captioner = LiveCaptioner(TRANSCRIPTS_DIR) if os.getenv("LIVE_CAPTIONS", "false").lower() == "true" else None
 recorder = Recorder(
     mic_device=os.getenv("MIC_DEVICE", "hw:1,0"),
-    output_dir=RECORDINGS_DIR
+    output_dir=RECORDINGS_DIR,
+    captioner=captioner
 )
-job_manager = JobManager(db_path=DB_PATH)
+semantic_index = SemanticIndex(INDEX_DIR)
+# In process mode the worker owns in-flight jobs, so a web restart must not fail them
+job_manager = JobManager(db_path=DB_PATH, recover=JOB_WORKER != "process", index=semantic_index)
 
 _required_env = ["GMAIL_USER", "GMAIL_APP_PASSWORD", "GMAIL_TO", "GROQ_API_KEY"]
 _missing = [k for k in _required_env if not os.getenv(k)]
 if _missing:
-    import sys
     print(f"ERROR: Missing required env vars: {', '.join(_missing)}", file=sys.stderr)
     print("Copy .env.example to .env and fill in your credentials.", file=sys.stderr)
     sys.exit(1)
 
 
+def _queue_job(job_id, audio_path):
+    if JOB_WORKER == "process":
+        return  # left pending in the jobs table for worker.py to claim
+    job_manager.process_async(
+        job_id=job_id,
+        audio_path=audio_path,
+        transcript_dir=TRANSCRIPTS_DIR,
+        gmail_user=os.getenv("GMAIL_USER"),
+        gmail_password=os.getenv("GMAIL_APP_PASSWORD"),
+        to_address=os.getenv("GMAIL_TO"),
+        summary_model=os.getenv("GROQ_SUMMARY_MODEL", "llama-3.3-70b-versatile")
+    )
+
+
+def _push_to_central(filepath, label):
+    try:
+        central.upload(filepath, label, room=ROOM)
+    except OSError:
+        # Central node unreachable: process here rather than lose the meeting
+        job_id = job_manager.create_job(label, audio_path=filepath, room=ROOM)
+        _queue_job(job_id, filepath)
+
+
+def _central_jobs():
+    """
+    This room's jobs on the central node, as last fetched. A stale copy triggers a refresh in
+    the background, so a dashboard poll never waits on (or for a down) central node.
+    """
+    with _central_jobs_lock:
+        stale = not _central_cache["refreshing"] and time.monotonic() - _central_cache["fetched"] > CENTRAL_JOBS_TTL
+        if stale:
+            _central_cache["refreshing"] = True
+        jobs = _central_cache["jobs"]
+    if stale:
+        threading.Thread(target=_refresh_central_jobs, daemon=True).start()
+    return jobs
+
+
+def _refresh_central_jobs():
+    try:
+        jobs = [dict(job, node=central.base_url) for job in central.jobs(room=ROOM, archived=True, timeout=10)]
+    except (OSError, ValueError):
+        jobs = None  # keep showing the last copy
+    with _central_jobs_lock:
+        if jobs is not None:
+            _central_cache["jobs"] = jobs
+        _central_cache.update(fetched=time.monotonic(), refreshing=False)
+
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -52,27 +151,150 @@ def stop_recording():
     basename = os.path.basename(filepath).replace("meeting_", "").replace(".mp3", "")
     label = f"{basename[:8]} {basename[9:13]}" if len(basename) >= 13 else basename
 
-    job_id = job_manager.create_job(label, audio_path=filepath)
-    job_manager.process_async(
-        job_id=job_id,
-        audio_path=filepath,
-        transcript_dir=TRANSCRIPTS_DIR,
-        gmail_user=os.getenv("GMAIL_USER"),
-        gmail_password=os.getenv("GMAIL_APP_PASSWORD"),
-        to_address=os.getenv("GMAIL_TO"),
-        summary_model=os.getenv("GROQ_SUMMARY_MODEL", "llama-3.3-70b-versatile")
-    )
+    if central:
+        # Uploading an hour of audio takes a while; don't hold the request (and a server thread) for it
+        threading.Thread(target=_push_to_central, args=(filepath, label), daemon=True).start()
+        return jsonify({"status": "uploading", "central": central.base_url})
+    job_id = job_manager.create_job(label, audio_path=filepath, room=ROOM)
+    _queue_job(job_id, filepath)
+    return jsonify({"status": "processing", "job_id": job_id})
+
+
+@app.route("/api/upload", methods=["POST"])
+def upload_recording():
+    """Queue an existing recording, sent as multipart field "file" or as a raw body (?filename=...).
+
+    Room nodes pushing to a central node also pass ?label= and ?room=.
+    """
+    if request.mimetype == "multipart/form-data":
+        spooled = [f.stream for _, f in request.files.items(multi=True)]
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            upload = None
+        for stream in spooled:
+            stream.close()
+            if upload is None or stream is not upload.stream:
+                os.unlink(stream.name)
+        if upload is None:
+            return jsonify({"error": "No file uploaded"}), 400
+        upload_path, filename = upload.stream.name, upload.filename
+    else:
+        fd, upload_path = tempfile.mkstemp(suffix=".upload", dir=RECORDINGS_DIR)
+        os.close(fd)
+        save_stream(request.stream, upload_path)
+        filename = request.args.get("filename")
+
+    filepath = recording_path(RECORDINGS_DIR)
+    try:
+        normalize_audio(upload_path, filepath)
+    except subprocess.CalledProcessError:
+        return jsonify({"error": "Could not decode audio"}), 400
+    finally:
+        os.unlink(upload_path)
+
+    label = request.args.get("label") or upload_label(filename)
+    job_id = job_manager.create_job(label, audio_path=filepath, room=request.args.get("room") or ROOM)
+    _queue_job(job_id, filepath)
     return jsonify({"status": "processing", "job_id": job_id})
 
 
 @app.route("/api/status")
 def recording_status():
-    return jsonify({"recording": recorder.is_recording()})
+    return jsonify({"recording": recorder.is_recording(), "captions": captioner is not None})
+
+
+@app.route("/api/gateway/stats")
+def gateway_stats():
+    """Groq calls made by this process (answers; also jobs unless JOB_WORKER=process): counts and latency."""
+    return jsonify(get_gateway().stats())
+
+
+CAPTIONS_KEEPALIVE_SECONDS = 15
+# Each caption viewer holds one of the WSGI_THREADS server threads for as long as it stays
+# connected; keep this well below WSGI_THREADS so the dashboard and API stay responsive
+CAPTIONS_MAX_CLIENTS = int(os.getenv("CAPTIONS_MAX_CLIENTS", "4"))
+_caption_clients = threading.BoundedSemaphore(CAPTIONS_MAX_CLIENTS)
+
+
+def _sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+@app.route("/api/captions")
+def live_captions():
+    """Server-sent events: a snapshot of the captions so far, then partial/final lines until "end"."""
+    if captioner is None:
+        return jsonify({"error": "Live captions are disabled"}), 404
+    if not _caption_clients.acquire(blocking=False):
+        return jsonify({"error": "Too many caption viewers"}), 503
+    events, snapshot = captioner.subscribe()
+
+    def stream():
+        yield _sse(snapshot)
+        if not snapshot["active"]:
+            yield _sse({"type": "end"})
+            return
+        while True:
+            try:
+                event = events.get(timeout=CAPTIONS_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"  # also notices clients that went away
+                continue
+            yield _sse(event)
+            if event["type"] == "end":
+                return
+
+    def release():
+        captioner.unsubscribe(events)
+        _caption_clients.release()
+
+    resp = Response(stream_with_context(stream()), mimetype="text/event-stream")
+    resp.cache_control.no_cache = True
+    resp.headers["X-Accel-Buffering"] = "no"
+    # Runs when the server closes the response, even if the stream never started
+    resp.call_on_close(release)
+    return resp
 
 
 @app.route("/api/jobs")
 def list_jobs():
-    return jsonify(job_manager.list_jobs())
+    jobs = job_manager.list_jobs(include_archived=request.args.get("archived") == "1",
+                                 room=request.args.get("room"))
+    if central and ROOM and "room" not in request.args:
+        # This room's meetings that were pushed to the central node; "node" tells the page where they live
+        jobs += _central_jobs()
+    return jsonify(jobs)
+
+
+@app.route("/api/ask", methods=["POST"])
+def ask():
+    """Answer a question about past meetings from the top-k matching transcript/summary chunks."""
+    body = request.get_json(silent=True) or {}
+    question = (body.get("question") or "").strip()
+    if not question:
+        return jsonify({"error": "Missing question"}), 400
+    try:
+        k = max(1, min(int(body.get("k", 8)), 20))
+    except (TypeError, ValueError):
+        return jsonify({"error": "k must be an integer"}), 400
+    try:
+        hits = semantic_index.search([question], k=k)[0]
+    except ImportError:
+        return jsonify({"error": "Semantic search is not installed"}), 503
+    except EmbeddingMismatch as e:
+        return jsonify({"error": str(e)}), 503
+    if not hits:
+        return jsonify({"answer": "No past meetings are indexed yet.", "sources": []})
+    answer = answer_question(
+        question, [chunk for _, chunk in hits],
+        model=os.getenv("GROQ_SUMMARY_MODEL", "llama-3.3-70b-versatile")
+    )
+    sources = [
+        {"job_id": c["job_id"], "label": c["label"], "kind": c["kind"],
+         "start": c.get("start"), "end": c.get("end"), "score": round(score, 3)}
+        for score, c in hits
+    ]
+    return jsonify({"answer": answer, "sources": sources})
 
 
 @app.route("/api/jobs/<job_id>/retry", methods=["POST"])
@@ -82,25 +304,233 @@ def retry_job(job_id):
         return jsonify({"error": "Not found"}), 404
     if not job_manager.retry_job(job_id):
         return jsonify({"error": "Job is not in error state"}), 409
-    job_manager.process_async(
-        job_id=job_id,
-        audio_path=job["audio_path"],
-        transcript_dir=TRANSCRIPTS_DIR,
-        gmail_user=os.getenv("GMAIL_USER"),
-        gmail_password=os.getenv("GMAIL_APP_PASSWORD"),
-        to_address=os.getenv("GMAIL_TO"),
-        summary_model=os.getenv("GROQ_SUMMARY_MODEL", "llama-3.3-70b-versatile")
-    )
+    _queue_job(job_id, job["audio_path"])
     return jsonify({"status": "retrying", "job_id": job_id})
 
 
+def _queue_request():
+    """The JSON body of a /api/queue call, or an error response if the caller may not use the queue."""
+    if JOB_WORKER != "process":
+        # In thread mode this node processes its own jobs, so a lease would race the local pipeline
+        return None, (jsonify({"error": "Queue requires JOB_WORKER=process"}), 503)
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if QUEUE_TOKEN and not hmac.compare_digest(supplied, QUEUE_TOKEN):
+        return None, (jsonify({"error": "Unauthorized"}), 401)
+    body = request.get_json(silent=True) or {}
+    if not body.get("worker"):
+        return None, (jsonify({"error": "Missing worker"}), 400)
+    try:
+        body["lease_seconds"] = max(10, min(int(body.get("lease_seconds") or LEASE_SECONDS), 3600))
+    except (TypeError, ValueError):
+        return None, (jsonify({"error": "Invalid lease_seconds"}), 400)
+    return body, None
+
+
+@app.route("/api/queue/lease", methods=["POST"])
+def lease_job():
+    body, error = _queue_request()
+    if error:
+        return error
+    job = job_manager.lease_next_job(body["worker"], body["lease_seconds"])
+    if not job:
+        return "", 204
+    return jsonify({k: job[k] for k in ("id", "label", "room", "created_at", "lease_expires")})
+
+
+@app.route("/api/queue/<job_id>/heartbeat", methods=["POST"])
+def heartbeat_job(job_id):
+    body, error = _queue_request()
+    if error:
+        return error
+    try:
+        renewed = job_manager.heartbeat(job_id, body["worker"], body["lease_seconds"], status=body.get("status"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not renewed:
+        return jsonify({"error": "Lease lost"}), 409
+    return jsonify({"status": "ok"})
+
+
+@app.route("/api/queue/<job_id>/complete", methods=["POST"])
+def complete_job(job_id):
+    body, error = _queue_request()
+    if error:
+        return error
+    job = job_manager.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Lease lost"}), 409
+    if job_manager.completed_by(job_id, body["worker"]):
+        return jsonify({"status": "done"})  # a retry whose first attempt landed
+    try:
+        stored = loads_transcript(body.get("segments") or "")
+    except (ValueError, TypeError, KeyError):
+        return jsonify({"error": "Invalid segments"}), 400
+    # Renewing the lease is the ownership check: while it runs, the job can't be handed to another
+    # worker, so nobody else's completion can land between writing the files and recording them
+    if not job_manager.heartbeat(job_id, body["worker"], body["lease_seconds"]):
+        return jsonify({"error": "Lease lost"}), 409
+    transcript_path = transcript_path_for(TRANSCRIPTS_DIR, job["audio_path"])
+    fd, tmp = tempfile.mkstemp(dir=TRANSCRIPTS_DIR, suffix=".segments.tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(body["segments"])
+    os.replace(tmp, structured_path(transcript_path))
+    ensure_text(transcript_path)
+    if not job_manager.complete_lease(job_id, body["worker"], body.get("summary") or "", transcript_path,
+                                      body.get("metrics") or {}, stored):
+        return jsonify({"error": "Lease lost"}), 409
+    return jsonify({"status": "done"})
+
+
+@app.route("/api/queue/<job_id>/fail", methods=["POST"])
+def fail_job(job_id):
+    body, error = _queue_request()
+    if error:
+        return error
+    if not job_manager.fail_lease(job_id, body["worker"], str(body.get("error") or "remote worker failed")):
+        return jsonify({"error": "Lease lost"}), 409
+    return jsonify({"status": "error"})
+
+
+def _compress_file(path, dest, encoding):
+    # Concurrent first requests (the page and the service worker's prefetch) each build their own
+    # temporary file; whichever finishes last wins the rename
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            if encoding == "br":
+                import brotli
+                with open(path, "rb") as src:
+                    raw.write(brotli.compress(src.read(), mode=brotli.MODE_TEXT))
+            else:
+                with open(path, "rb") as src, gzip.open(raw, "wb") as out:
+                    shutil.copyfileobj(src, out)
+        os.replace(tmp, dest)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def _precompressed(path):
+    """
+    Return (sidecar_path, encoding) for the best encoding the client accepts, or (None, None).
+
+    Sidecars (transcript.txt.br / .gz) are built once and rebuilt when the source is newer, so
+    each encoding gets its own strong ETag from send_file.
+    """
+    encodings = ["gzip"]
+    try:
+        import brotli  # noqa: F401
+        encodings.insert(0, "br")
+    except ImportError:
+        pass
+    for encoding in encodings:
+        if request.accept_encodings[encoding] <= 0:
+            continue
+        dest = path + (".br" if encoding == "br" else ".gz")
+        if not os.path.exists(dest) or os.path.getmtime(dest) < os.path.getmtime(path):
+            _compress_file(path, dest, encoding)
+        return dest, encoding
+    return None, None
+
+
 @app.route("/api/jobs/<job_id>/transcript")
 def view_transcript(job_id):
+    job = job_manager.get_job(job_id)
+    if job and job.get("archived"):
+        return _archived_transcript(job_id)
+    if job and not job.get("transcript_path") and job.get("audio_path"):
+        return _draft_transcript(job)
+    if not job or not job.get("transcript_path") or not ensure_text(job["transcript_path"]):
+        return jsonify({"error": "Not found"}), 404
+    path = job["transcript_path"]
+    # Byte ranges refer to the identity encoding, so ranged requests are never compressed
+    sidecar, encoding = (None, None) if request.range else _precompressed(path)
+    if not sidecar:
+        resp = send_file(path, mimetype="text/plain", conditional=True)
+    else:
+        resp = send_file(sidecar, mimetype="text/plain", conditional=True)
+        resp.headers["Content-Encoding"] = encoding
+    resp.vary.add("Accept-Encoding")
+    resp.cache_control.no_cache = True  # revalidate with the ETag; a retry rewrites the transcript
+    return resp
+
+
+def _draft_transcript(job):
+    """Live captions of a job still being processed, until its real transcript replaces them."""
+    path = draft_path(transcript_path_for(TRANSCRIPTS_DIR, job["audio_path"]))
+    if not os.path.exists(path):
+        return jsonify({"error": "Not found"}), 404
+    resp = send_file(path, mimetype="text/plain", conditional=True)
+    resp.headers["X-Transcript-Draft"] = "1"
+    resp.cache_control.no_cache = True
+    return resp
+
+
+def _archived_transcript(job_id):
+    data = job_manager.archived_file(job_id, "transcript")
+    if data is None:
+        return jsonify({"error": "Not found"}), 404
+    resp = Response(data, mimetype="text/plain")
+    resp.add_etag()
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+
+@app.route("/api/jobs/<job_id>/segments")
+def transcript_segments(job_id):
+    """Timed, speaker-labelled segments overlapping ?start=&end= (seconds), for seeking playback."""
     job = job_manager.get_job(job_id)
     if not job or not job.get("transcript_path"):
         return jsonify({"error": "Not found"}), 404
-    return send_file(job["transcript_path"], mimetype="text/plain")
+    if job.get("archived"):
+        data = job_manager.archived_file(job_id, "segments")
+        stored = loads_transcript(data) if data else None
+    else:
+        segments_path = structured_path(job["transcript_path"])
+        stored = load_transcript(segments_path) if os.path.exists(segments_path) else None
+    if stored is None:
+        return jsonify({"error": "Not found"}), 404
+    start = request.args.get("start", 0.0, type=float)
+    end = request.args.get("end", float("inf"), type=float)
+    return jsonify(stored.between(start, end))
+
+
+@app.route("/api/jobs/<job_id>/audio")
+def play_audio(job_id):
+    job = job_manager.get_job(job_id)
+    if not job or not job.get("audio_path") or not os.path.exists(job["audio_path"]):
+        return jsonify({"error": "Not found"}), 404
+    # conditional=True gives Range/206 for seeking plus ETag and Last-Modified validation
+    return send_file(job["audio_path"], mimetype="audio/mpeg", conditional=True)
+
+
+@app.route("/sw.js")
+def service_worker():
+    # Served from the root so the worker's scope covers the whole app, not just /static/
+    resp = send_from_directory(app.static_folder, "sw.js", mimetype="text/javascript")
+    resp.cache_control.no_cache = True
+    return resp
+
+
+def _archive_periodically(interval_hours=6):
+    days = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+    try:
+        job_manager.archive_jobs(older_than_days=days)
+    except Exception as e:
+        # Archiving is housekeeping: never keep the app from starting, and try again next time
+        print(f"Archiving failed: {e!r}", file=sys.stderr)
+    timer = threading.Timer(interval_hours * 3600, _archive_periodically, args=(interval_hours,))
+    timer.daemon = True
+    timer.start()
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=os.getenv("FLASK_DEBUG", "false").lower() == "true")
+    if JOB_WORKER != "process":  # in process mode worker.py does the archiving
+        _archive_periodically()
+    if os.getenv("WSGI_SERVER", "flask").lower() == "waitress":
+        # Single process, many threads: the Recorder's ffmpeg handle lives in this process.
+        # Equivalent gunicorn invocation: gunicorn -w 1 --threads 8 -b 0.0.0.0:5001 app:app
+        from waitress import serve
+        serve(app, host="0.0.0.0", port=5001, threads=int(os.getenv("WSGI_THREADS", "8")))
+    else:
+        app.run(host="0.0.0.0", port=5001, debug=os.getenv("FLASK_DEBUG", "false").lower() == "true")
@@ -0,0 +1,21 @@
+import zlib
+
+ZSTD_LEVEL = 10
+
+
+def compress(data):
+    """Compress bytes with zstd when available (zlib otherwise). Returns (codec, blob)."""
+    try:
+        import zstandard
+    except ImportError:
+        return "zlib", zlib.compress(data, 9)
+    return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def decompress(codec, blob):
+    if blob is None:
+        return None
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
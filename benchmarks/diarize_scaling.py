@@ -0,0 +1,57 @@
+"""
+Measure diarization embedding speedup against worker count, and peak memory per budget.
+
+    python benchmarks/diarize_scaling.py [--minutes 10] [--memory-mb 512] [audio.mp3]
+
+Without an audio file a synthetic noise recording is used; embedding cost depends on
+length, not content, so the timings are representative. Requires resemblyzer.
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import diarizer  # noqa: E402
+
+
+def _blocks(args, block_seconds):
+    if args.audio:
+        yield from diarizer._pcm_blocks(args.audio, block_seconds * diarizer.SAMPLE_RATE)
+        return
+    rng = np.random.default_rng(0)
+    for _ in range(0, args.minutes * 60, block_seconds):
+        yield (rng.standard_normal(block_seconds * diarizer.SAMPLE_RATE) * 0.1).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio", nargs="?")
+    parser.add_argument("--minutes", type=int, default=10)
+    parser.add_argument("--memory-mb", type=float, default=512)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    budget = diarizer._memory_budget(args.memory_mb)
+    print(f"{'workers':>7}  {'block s':>7}  {'seconds':>8}  {'speedup':>7}  {'peak RSS MB':>11}")
+
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        block_seconds, in_flight = diarizer._plan_blocks(budget, workers)
+        t0 = time.perf_counter()
+        windows = sum(len(slices) for _, _, (_, slices) in
+                      diarizer._embedded_blocks(_blocks(args, block_seconds), workers, in_flight,
+                                                block_seconds * diarizer.SAMPLE_RATE))
+        elapsed = time.perf_counter() - t0
+        baseline = baseline or elapsed
+        # ru_maxrss is the high-water mark so far (kB on Linux), children included separately
+        peak = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+        print(f"{workers:>7}  {block_seconds:>7}  {elapsed:>8.2f}  {baseline / elapsed:>6.2f}x  {peak / 1024:>11.0f}"
+              f"  ({windows} windows)")
+
+
+if __name__ == "__main__":
+    main()
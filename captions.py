@@ -0,0 +1,163 @@
+import os
+import queue
+import threading
+from transcript_store import draft_path
+
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2  # s16le mono, as the Recorder's second ffmpeg output writes it
+MAX_BACKLOG_SECONDS = 30
+
+
+class LiveCaptioner:
+    """
+    Rolling captions of the recording in progress, from a small local Whisper model.
+
+    The Recorder feeds raw PCM as it arrives. Every step_seconds the uncommitted audio (at most
+    window_seconds of it) is recognized again and published as a "partial"; once a full window
+    has been heard its text is published as "final" and appended to the draft transcript
+    (transcripts/<recording>.draft.txt), which the job pipeline removes once the real
+    transcript exists. Captions are best-effort: failures are published, never raised into
+    the recording.
+    """
+
+    def __init__(self, draft_dir, model_name=None, window_seconds=None, step_seconds=None, recognize=None):
+        self.draft_dir = draft_dir
+        self.model_name = model_name or os.getenv("CAPTIONS_MODEL", "tiny.en")
+        window_seconds = window_seconds or float(os.getenv("CAPTIONS_WINDOW_SECONDS", "5"))
+        step_seconds = step_seconds or float(os.getenv("CAPTIONS_STEP_SECONDS", "1"))
+        self.window_bytes = int(window_seconds * BYTES_PER_SECOND) & ~1
+        self.step_bytes = int(step_seconds * BYTES_PER_SECOND) & ~1
+        self._recognize_fn = recognize
+        self._model = None
+        self._cond = threading.Condition()
+        self._buffer = bytearray()
+        self._committed_bytes = 0
+        self._lines = []
+        self._partial = ""
+        self._subscribers = []
+        self._running = False
+        self._failed = False
+        self._thread = None
+        self.draft_path = None
+
+    def start(self, audio_path):
+        if self._thread:
+            # The previous recording's final pass must not run into this one's buffers
+            self._thread.join()
+        transcript_name = os.path.basename(audio_path).replace(".mp3", ".txt")
+        with self._cond:
+            self.draft_path = draft_path(os.path.join(self.draft_dir, transcript_name))
+            self._buffer = bytearray()
+            self._committed_bytes = 0
+            self._lines = []
+            self._partial = ""
+            self._running = True
+            self._failed = False
+        open(self.draft_path, "w").close()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, pcm):
+        with self._cond:
+            if not self._running or self._failed:
+                return
+            self._buffer += pcm
+            self._cond.notify()
+
+    def stop(self, wait=True):
+        """Stop after recognizing the audio still buffered, so the draft ends where the recording did.
+
+        With wait=False the final pass finishes in the background; the next start() waits for it.
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if wait and self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def is_active(self):
+        return self._running and not self._failed
+
+    def subscribe(self):
+        """Returns (queue of events, snapshot of the captions so far)."""
+        events = queue.Queue(maxsize=256)
+        with self._cond:
+            self._subscribers.append(events)
+            snapshot = {"type": "snapshot", "lines": list(self._lines), "partial": self._partial,
+                        "active": self.is_active()}
+        return events, snapshot
+
+    def unsubscribe(self, events):
+        with self._cond:
+            if events in self._subscribers:
+                self._subscribers.remove(events)
+
+    def _publish(self, event):
+        with self._cond:
+            subscribers = list(self._subscribers)
+        for events in subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                pass  # a stalled client misses captions rather than holding up the rest
+
+    def _run(self):
+        decoded = 0  # buffer length at the last recognition pass
+        try:
+            self._load_model()
+            while True:
+                with self._cond:
+                    while self._running and len(self._buffer) < decoded + self.step_bytes:
+                        self._cond.wait()
+                    if not self._running and len(self._buffer) < BYTES_PER_SECOND // 10:
+                        break
+                    self._drop_backlog()
+                    window = bytes(self._buffer[:self.window_bytes])
+                    final = len(window) >= self.window_bytes or not self._running
+                text = self._recognize(window).strip()
+                start = self._committed_bytes / BYTES_PER_SECOND
+                if final:
+                    with self._cond:
+                        del self._buffer[:len(window)]
+                        self._committed_bytes += len(window)
+                        self._partial = ""
+                        if text:
+                            self._lines.append(text)
+                    decoded = 0
+                    if text:
+                        with open(self.draft_path, "a") as f:
+                            f.write(text + "\n")
+                else:
+                    with self._cond:
+                        self._partial = text
+                    decoded = len(window)
+                self._publish({"type": "final" if final else "partial", "text": text, "start": round(start, 1)})
+        except Exception as e:
+            with self._cond:
+                self._failed = True
+            self._publish({"type": "error", "error": str(e)})
+        self._publish({"type": "end"})
+
+    def _drop_backlog(self):
+        # If recognition can't keep up, skip ahead rather than fall ever further behind
+        while len(self._buffer) > MAX_BACKLOG_SECONDS * BYTES_PER_SECOND:
+            del self._buffer[:self.window_bytes]
+            self._committed_bytes += self.window_bytes
+
+    def _load_model(self):
+        if self._recognize_fn or self._model is not None:
+            return
+        from faster_whisper import WhisperModel
+        self._model = WhisperModel(self.model_name, device="cpu", compute_type="int8")
+
+    def _recognize(self, pcm):
+        if self._recognize_fn:
+            return self._recognize_fn(pcm)
+        import numpy as np
+
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _ = self._model.transcribe(
+            audio, beam_size=1, condition_on_previous_text=False, without_timestamps=True
+        )
+        return " ".join(s.text.strip() for s in segments)
@@ -0,0 +1,85 @@
+"""
+HTTP client for a central meeting-notes node.
+
+Room nodes push finished recordings to the central queue; remote workers lease jobs from it,
+download the audio, heartbeat while they process and report the result back. Stdlib only, so
+a recorder Pi needs nothing beyond the app's own requirements.
+"""
+import json
+import os
+import shutil
+import urllib.error
+import urllib.parse
+import urllib.request
+
+CHUNK_SIZE = 1 << 20
+
+
+class LeaseLost(Exception):
+    """The central queue gave the job to another worker (our lease expired)."""
+
+
+class CentralClient:
+    def __init__(self, base_url, token=None, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None, headers=None, timeout=None):
+        headers = dict(headers or {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        return urllib.request.urlopen(req, timeout=timeout or self.timeout)
+
+    def _post_json(self, path, payload):
+        """POST JSON and return (status, decoded body). 409 means the lease is gone."""
+        try:
+            with self._request("POST", path, json.dumps(payload).encode(),
+                               {"Content-Type": "application/json"}) as resp:
+                data = resp.read()
+                return resp.status, json.loads(data) if data else None
+        except urllib.error.HTTPError as e:
+            if e.code == 409:
+                raise LeaseLost(path) from e
+            raise
+
+    def upload(self, audio_path, label, room=None):
+        """Queue a recording on the central node; returns the central job id."""
+        query = urllib.parse.urlencode(
+            {k: v for k, v in (("filename", os.path.basename(audio_path)), ("label", label), ("room", room)) if v}
+        )
+        with open(audio_path, "rb") as f:
+            headers = {"Content-Type": "application/octet-stream",
+                       "Content-Length": str(os.fstat(f.fileno()).st_size)}
+            # Uploads are large; a slow LAN gets longer than the per-call default
+            with self._request("POST", f"/api/upload?{query}", f, headers, timeout=max(self.timeout, 300)) as resp:
+                return json.loads(resp.read())["job_id"]
+
+    def jobs(self, room=None, archived=False, timeout=None):
+        query = urllib.parse.urlencode({k: v for k, v in (("room", room), ("archived", "1" if archived else None)) if v})
+        with self._request("GET", f"/api/jobs?{query}", timeout=timeout) as resp:
+            return json.loads(resp.read())
+
+    def lease(self, worker, lease_seconds):
+        """Lease the next job, or None if the queue is empty."""
+        status, job = self._post_json("/api/queue/lease", {"worker": worker, "lease_seconds": lease_seconds})
+        return job if status == 200 else None
+
+    def download_audio(self, job_id, dest_path):
+        with self._request("GET", f"/api/jobs/{urllib.parse.quote(job_id)}/audio") as resp, \
+                open(dest_path, "wb") as out:
+            shutil.copyfileobj(resp, out, CHUNK_SIZE)
+
+    def heartbeat(self, job_id, worker, lease_seconds, status=None):
+        self._post_json(f"/api/queue/{urllib.parse.quote(job_id)}/heartbeat",
+                        {"worker": worker, "lease_seconds": lease_seconds, "status": status})
+
+    def complete(self, job_id, worker, summary, metrics, segments_path):
+        with open(segments_path) as f:
+            segments = f.read()
+        self._post_json(f"/api/queue/{urllib.parse.quote(job_id)}/complete",
+                        {"worker": worker, "summary": summary, "metrics": metrics, "segments": segments})
+
+    def fail(self, job_id, worker, error):
+        self._post_json(f"/api/queue/{urllib.parse.quote(job_id)}/fail", {"worker": worker, "error": error})
@@ -0,0 +1,16 @@
+import threading
+
+_lock = threading.Lock()
+_groq = None
+
+
+def groq_client():
+    """Return the shared Groq client, constructing it (and importing groq) on first use."""
+    global _groq
+    if _groq is None:
+        with _lock:
+            if _groq is None:
+                from groq import Groq
+                # Retries belong to gateway.Gateway, which also honors rate limits
+                _groq = Groq(max_retries=0)
+    return _groq
@@ -0,0 +1,101 @@
+import re
+
+# Hesitation sounds only; words like "like" or "you know" can carry meaning, so they stay
+_FILLER_RE = re.compile(r"(?<![\w'])(?:u+h+m*|u+m+|e+r+m+|e+r+|a+h+|h+m+|m+h*m+)(?![\w'])[,.!?]*\s*", re.IGNORECASE)
+_TURN_RE = re.compile(r"^Speaker_(\d+):\s?(.*)$")
+# Short speaker label: compact, and unlike "S3" it doesn't occur in ordinary text ("AWS S3")
+_SHORT_LABEL_RE = re.compile(r"\bSpk(\d{1,3})\b")
+_ISSUED_LABEL_RE = re.compile(r"^Spk(\d{1,3}):", re.MULTILINE)
+
+MAX_NGRAM = 8
+MIN_REPEATS = 3  # "I think I think" is speech; the same phrase three times running is Whisper looping
+
+
+def _normalize(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def collapse_repeats(words, max_n=MAX_NGRAM, min_repeats=MIN_REPEATS):
+    """
+    Keep only the last copy of any 1..max_n word phrase repeated min_repeats+ times in a row.
+
+    Returns (words, number of words removed).
+    """
+    norm = [_normalize(w) for w in words]
+    out = []
+    removed = 0
+    i = 0
+    while i < len(words):
+        # Only phrases short enough to still repeat min_repeats times before the end
+        for n in range(1, min(max_n, (len(words) - i) // min_repeats) + 1):
+            gram = norm[i:i + n]
+            runs = 1
+            while norm[i + runs * n:i + (runs + 1) * n] == gram:
+                runs += 1
+            if runs >= min_repeats:
+                out.extend(words[i + (runs - 1) * n:i + runs * n])  # last copy keeps closing punctuation
+                removed += (runs - 1) * n
+                i += runs * n
+                break
+        else:
+            out.append(words[i])
+            i += 1
+    return out, removed
+
+
+def _clean(text, stats):
+    text, fillers = _FILLER_RE.subn("", text)
+    stats["fillers_removed"] += fillers
+    words, removed = collapse_repeats(text.split())
+    stats["repeated_words_removed"] += removed
+    return " ".join(words)
+
+
+def compact_transcript(transcript, diarized=False):
+    """
+    Shrink a transcript before it goes into the summary prompt.
+
+    Drops hesitation fillers and Whisper's repeated-phrase hallucinations, then for diarized
+    text drops turns left empty, merges adjacent turns of the same speaker and shortens
+    "Speaker_03:" to "Spk3:". Returns (text, stats).
+    """
+    stats = {
+        "chars_before": len(transcript), "fillers_removed": 0, "repeated_words_removed": 0,
+        "turns_dropped": 0, "turns_merged": 0,
+    }
+    if not diarized:
+        text = _clean(transcript, stats)
+    else:
+        turns = []  # [speaker, text]
+        for line in transcript.splitlines():
+            match = _TURN_RE.match(line)
+            speaker, body = (int(match.group(1)), match.group(2)) if match else (None, line)
+            body = _clean(body, stats)
+            if not body:
+                stats["turns_dropped"] += 1
+            elif turns and turns[-1][0] == speaker:
+                turns[-1][1] += " " + body
+                stats["turns_merged"] += 1
+            else:
+                turns.append([speaker, body])
+        # Merging can line up a phrase that looped across turn boundaries
+        for turn in turns:
+            words, removed = collapse_repeats(turn[1].split())
+            stats["repeated_words_removed"] += removed
+            turn[1] = " ".join(words)
+        text = "\n".join(f"Spk{speaker}: {body}" if speaker is not None else body for speaker, body in turns)
+
+    stats["chars_after"] = len(text)
+    stats["ratio"] = round(len(text) / len(transcript), 3) if transcript else 1.0
+    return text, stats
+
+
+def expand_speaker_labels(text, compacted):
+    """Turn the short "Spk3" labels back into "Speaker_03", for speakers the compacted transcript had."""
+    issued = {int(n) for n in _ISSUED_LABEL_RE.findall(compacted)}
+
+    def expand(match):
+        speaker = int(match.group(1))
+        return f"Speaker_{speaker:02d}" if speaker in issued else match.group(0)
+
+    return _SHORT_LABEL_RE.sub(expand, text)
@@ -1,97 +1,391 @@
+import collections
+import dataclasses
+import math
+import multiprocessing
 import os
+import itertools
 import subprocess
-import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
-import numpy as np
+SAMPLE_RATE = 16000
+MIN_SEGMENT_SAMPLES = 1600  # segments shorter than 0.1s carry no usable voice
+# Audio is decoded and embedded in blocks of at most this long, however long the recording
+PREPARE_BLOCK_SECONDS = 60
+MIN_BLOCK_SECONDS = 5
+# Rough cost of embedding one second of audio: mel frames plus LSTM activations for resemblyzer's
+# ~1.3 overlapping 1.6s windows per second; the decoded float32 samples come on top
+ENCODER_BYTES_PER_SECOND = 4 * 1024 * 1024
+# Fixed RSS of one spawned pool worker before it embeds anything: a fresh interpreter with torch,
+# resemblyzer and the encoder's weights loaded (benchmarks/diarize_scaling.py reports the real peak)
+WORKER_PROCESS_BYTES = 300 * 1024 * 1024
+WINDOWS_PER_SECOND = 1.3  # resemblyzer's default partial-utterance rate
+AUDIO_NORM_TARGET_DBFS = -30  # resemblyzer's own preprocessing target
+MAX_GAIN_DB = 30  # don't turn a silent block into loud noise
 
+# Per-process state of pool workers, set up once by _init_worker
+_worker_slots = None
+_worker_encoder = None
 
-def _convert_to_wav(audio_path):
-    """Convert audio to 16kHz mono WAV via ffmpeg. Returns temp WAV path (caller must delete)."""
-    tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-    tmp.close()
+
+def _diarize_workers():
+    return max(1, int(os.getenv("DIARIZE_WORKERS", os.cpu_count() or 1)))
+
+
+def _memory_budget(memory_mb=None):
+    return int(float(memory_mb or os.getenv("DIARIZE_MEMORY_MB", "512")) * 1024 * 1024)
+
+
+def _plan_blocks(budget, workers):
+    """
+    (block seconds, blocks in flight). A pool of n workers first costs n * WORKER_PROCESS_BYTES;
+    the audio being embedded must fit in half of what is left. When no pool of two or more
+    fits, blocks are embedded serially in this process (in_flight 1), which adds no process.
+    """
+    per_second = SAMPLE_RATE * 4 + ENCODER_BYTES_PER_SECOND
+    in_flight = 1
+    for n in range(min(workers, budget // WORKER_PROCESS_BYTES), 1, -1):
+        if (budget - n * WORKER_PROCESS_BYTES) // 2 >= n * per_second * MIN_BLOCK_SECONDS:
+            in_flight = n
+            break
+    share = (budget - (in_flight * WORKER_PROCESS_BYTES if in_flight > 1 else 0)) // 2
+    seconds = max(MIN_BLOCK_SECONDS, min(PREPARE_BLOCK_SECONDS, share // (per_second * in_flight)))
+    return seconds, in_flight
+
+
+def _init_worker(slot_names, slot_samples):
+    global _worker_slots, _worker_encoder
+    import numpy as np
+    import torch
+    from resemblyzer import VoiceEncoder
+
+    torch.set_num_threads(1)  # one core per process; the pool provides the parallelism
+    segments = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    _worker_slots = [(shm, np.ndarray((slot_samples,), dtype=np.float32, buffer=shm.buf)) for shm in segments]
+    _worker_encoder = VoiceEncoder(device="cpu", verbose=False)
+
+
+def _embed_windows(encoder, block):
+    # Sliding ~1.6s windows: (window embeddings, window sample ranges relative to the block)
+    _, windows, slices = encoder.embed_utterance(block, return_partials=True)
+    return windows, [(sl.start, sl.stop) for sl in slices]
+
+
+def _embed_block(slot, length):
+    return _embed_windows(_worker_encoder, _worker_slots[slot][1][:length])
+
+
+def _make_pool(workers, slots, slot_samples, context="spawn"):
+    # spawn, not fork: torch's thread pools don't survive a fork of an initialized parent
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context(context),
+        initializer=_init_worker,
+        initargs=([shm.name for shm in slots], slot_samples),
+    )
+
+
+def _pcm_blocks(audio_path, block_samples):
+    """Decode to 16kHz mono float32 with ffmpeg, yielding blocks; the whole file is never in memory."""
+    import numpy as np
+
+    proc = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-v", "error", "-i", audio_path,
+         "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "pipe:1"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    finished = False
     try:
-        subprocess.run(
-            ["ffmpeg", "-y", "-i", audio_path, "-ar", "16000", "-ac", "1", tmp.name],
-            capture_output=True,
-            check=True,
-        )
-    except Exception:
-        os.unlink(tmp.name)
-        raise
-    return tmp.name
+        while True:
+            pcm = proc.stdout.read(block_samples * 2)
+            if not pcm:
+                finished = True
+                break
+            yield np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    finally:
+        proc.stdout.close()
+        if not finished:
+            proc.kill()  # the consumer stopped early
+        proc.wait()
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, "ffmpeg")
+
 
+def _duration(audio_path):
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", audio_path],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        return float(out)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+
+def _normalize_volume(block):
+    """resemblyzer's normalize_volume(increase_only=True), made safe for silent blocks."""
+    import numpy as np
+
+    power = float(np.mean(block ** 2)) if len(block) else 0.0
+    if power <= 0:
+        return block
+    gain_db = min(AUDIO_NORM_TARGET_DBFS - 10 * math.log10(power), MAX_GAIN_DB)
+    return block * (10 ** (gain_db / 20)) if gain_db > 0 else block
+
+
+@dataclasses.dataclass
+class PreparedAudio:
+    """Window embeddings of a whole recording, in time order, ready for segment assignment."""
+    embeddings: "np.ndarray"  # (windows, dims), unit length
+    starts: "np.ndarray"  # window start, seconds
+    ends: "np.ndarray"  # window end, seconds
+
+
+class _WindowStore:
+    """Window embeddings appended block by block into arrays sized up front from the duration."""
+
+    def __init__(self, capacity):
+        self.capacity = max(int(capacity), 16)
+        self.count = 0
+        self.embeddings = None
+        self.starts = None
+        self.ends = None
+
+    def add(self, offset, length, windows, slices):
+        import numpy as np
+
+        n = len(slices)
+        if self.embeddings is None:
+            self.embeddings = np.empty((self.capacity, windows.shape[1]), dtype=np.float32)
+            self.starts = np.empty(self.capacity, dtype=np.float64)
+            self.ends = np.empty(self.capacity, dtype=np.float64)
+        if self.count + n > self.capacity:
+            self._grow(max(self.capacity * 2, self.count + n))
+        window_slice = slice(self.count, self.count + n)
+        self.embeddings[window_slice] = windows
+        self.starts[window_slice] = [(offset + start) / SAMPLE_RATE for start, _ in slices]
+        self.ends[window_slice] = [(offset + min(stop, length)) / SAMPLE_RATE for _, stop in slices]
+        self.count += n
 
-def diarize(audio_path, whisper_segments):
+    def _grow(self, capacity):
+        # Only when the duration was unknown or wrong; np.resize copies into a fresh array
+        import numpy as np
+
+        self.embeddings = np.resize(self.embeddings, (capacity, self.embeddings.shape[1]))
+        self.starts = np.resize(self.starts, capacity)
+        self.ends = np.resize(self.ends, capacity)
+        self.capacity = capacity
+
+    def prepared(self):
+        import numpy as np
+
+        if self.embeddings is None:
+            return PreparedAudio(np.zeros((0, 0), dtype=np.float32), np.zeros(0), np.zeros(0))
+        return PreparedAudio(self.embeddings[:self.count], self.starts[:self.count], self.ends[:self.count])
+
+
+def _embedded_blocks(blocks, workers, in_flight, block_samples):
     """
-    Assign speaker labels to Whisper segments using resemblyzer embeddings.
+    Yield (offset, length, (windows, slices)) per block, keeping at most in_flight blocks alive.
 
-    whisper_segments: list of segment objects with .start, .end, .text
+    In the pool, each block in flight has its own shared-memory slot: the block is written
+    there and tasks carry only the slot number and length, never a pickled array. A slot is
+    reused only after the result of the block it held has been taken.
+    """
+    blocks = iter(blocks)
+    head = list(itertools.islice(blocks, 2))
+    blocks = itertools.chain(head, blocks)
+    offset = 0
+    if in_flight <= 1 or workers <= 1 or len(head) < 2:
+        # A single block would only pay for starting the pool's encoders
+        from resemblyzer import VoiceEncoder
 
-    Returns (transcript: str, diarized: bool).
-    Falls back to plain transcript (diarized=False) when:
-    - resemblyzer or scikit-learn is not installed
-    - fewer than 2 speakers are detected
-    - any exception occurs
+        encoder = VoiceEncoder()
+        for block in blocks:
+            if len(block) >= MIN_SEGMENT_SAMPLES:
+                yield offset, len(block), _embed_windows(encoder, _normalize_volume(block))
+            offset += len(block)
+        return
+
+    import numpy as np
+
+    slots = [shared_memory.SharedMemory(create=True, size=block_samples * 4) for _ in range(in_flight)]
+    views = [np.ndarray((block_samples,), dtype=np.float32, buffer=shm.buf) for shm in slots]
+    try:
+        with _make_pool(in_flight, slots, block_samples) as pool:
+            pending = collections.deque()
+            submitted = 0
+            for block in blocks:
+                if len(block) >= MIN_SEGMENT_SAMPLES:
+                    slot = submitted % in_flight
+                    views[slot][:len(block)] = _normalize_volume(block)
+                    pending.append((offset, len(block), pool.submit(_embed_block, slot, len(block))))
+                    submitted += 1
+                offset += len(block)
+                if len(pending) >= in_flight:
+                    start, length, future = pending.popleft()
+                    yield start, length, future.result()
+            while pending:
+                start, length, future = pending.popleft()
+                yield start, length, future.result()
+    finally:
+        views.clear()  # release the exported buffers, or close() refuses
+        for shm in slots:
+            shm.close()
+            shm.unlink()
+
+
+def prepare_diarization(audio_path, workers=None, memory_mb=None, cancel=None):
+    """
+    Decode the recording and embed it in sliding windows, before any transcript exists.
+
+    This is the expensive half of diarization and needs only the audio, so the job pipeline
+    runs it while the recording is being transcribed; diarize(..., prepared=...) then just
+    maps segments onto windows. Audio streams from ffmpeg in blocks sized from
+    DIARIZE_MEMORY_MB (or memory_mb), so memory stays flat however long the recording: only
+    the window embeddings grow with it, at about 5 MB per hour. Long silences are not
+    trimmed, so window times stay aligned with Whisper's timestamps.
+
+    Setting the cancel event stops decoding and embedding between blocks; the result is then None.
     """
-    plain_text = " ".join((seg.text or "").strip() for seg in whisper_segments)
+    from resemblyzer import VoiceEncoder  # noqa: F401 - fail fast, before decoding anything
 
+    workers = workers or _diarize_workers()
+    block_seconds, in_flight = _plan_blocks(_memory_budget(memory_mb), workers)
+    duration = _duration(audio_path)
+    store = _WindowStore(math.ceil(duration * WINDOWS_PER_SECOND * 1.05) + 8 if duration else 1024)
+    block_samples = block_seconds * SAMPLE_RATE
+    blocks = _pcm_blocks(audio_path, block_samples)
+    embedded = _embedded_blocks(blocks, workers, in_flight, block_samples)
     try:
-        from resemblyzer import VoiceEncoder, preprocess_wav
-        from sklearn.cluster import AgglomerativeClustering
+        for offset, length, (windows, slices) in embedded:
+            if cancel is not None and cancel.is_set():
+                return None
+            store.add(offset, length, windows, slices)
+    finally:
+        # Kill ffmpeg and release the pool and its shared memory now, not when garbage collected
+        embedded.close()
+        blocks.close()
+    return store.prepared()
 
-        wav_path = _convert_to_wav(audio_path)
-        try:
-            wav = preprocess_wav(wav_path)
-        finally:
-            os.unlink(wav_path)
 
-        encoder = VoiceEncoder()
-        embeddings = []
-        valid_indices = []
-        for i, seg in enumerate(whisper_segments):
-            start = int(seg.start * 16000)
-            end = int(seg.end * 16000)
-            chunk = wav[start:end]
-            if len(chunk) < 1600:  # skip segments shorter than 0.1s
-                continue
-            embeddings.append(encoder.embed_utterance(chunk))
-            valid_indices.append(i)
-
-        if len(embeddings) < 2:
-            return plain_text, False
-
-        labels = AgglomerativeClustering(
+def format_turns(segments, speakers):
+    """Join segments into "Speaker_XX: text" lines, merging consecutive segments of one speaker."""
+    lines = []
+    current_speaker = None
+    current_texts = []
+    for seg, speaker in zip(segments, speakers):
+        if speaker != current_speaker:
+            if current_texts and current_speaker:
+                lines.append(f"{current_speaker}: {' '.join(current_texts)}")
+            current_speaker = speaker
+            current_texts = [seg.text.strip()]
+        else:
+            current_texts.append(seg.text.strip())
+
+    if current_texts and current_speaker:
+        lines.append(f"{current_speaker}: {' '.join(current_texts)}")
+
+    return "\n".join(lines)
+
+
+def _segment_embeddings(prepared, whisper_segments):
+    """Per segment, the overlap-weighted mean of the windows it overlaps; skips segments with none."""
+    import numpy as np
+
+    embeddings = np.empty((len(whisper_segments), prepared.embeddings.shape[1]), dtype=np.float32)
+    valid_indices = []
+    for i, seg in enumerate(whisper_segments):
+        if (seg.end - seg.start) * SAMPLE_RATE < MIN_SEGMENT_SAMPLES:
+            continue
+        # Windows are in time order and equally long, so both bounds are sorted
+        lo = int(np.searchsorted(prepared.ends, seg.start, side="right"))
+        hi = int(np.searchsorted(prepared.starts, seg.end, side="left"))
+        if lo >= hi:
+            continue
+        weights = np.minimum(prepared.ends[lo:hi], seg.end) - np.maximum(prepared.starts[lo:hi], seg.start)
+        embedding = weights @ prepared.embeddings[lo:hi]
+        embeddings[len(valid_indices)] = embedding / np.linalg.norm(embedding)
+        valid_indices.append(i)
+    return embeddings[:len(valid_indices)], valid_indices
+
+
+def _max_cluster_segments(budget):
+    # Complete linkage keeps an n x n float64 distance matrix, plus a working copy
+    return max(2, math.isqrt(budget // 2 // 16))
+
+
+def _cluster(embeddings, max_segments):
+    """
+    Cluster labels for the embeddings. Past max_segments, an evenly spaced sample is clustered
+    and every segment joins the nearest cluster centroid, so all-day sessions stay in budget.
+    """
+    import numpy as np
+    from sklearn.cluster import AgglomerativeClustering
+
+    def fit(x):
+        return AgglomerativeClustering(
             n_clusters=None,
             distance_threshold=0.6,
             metric="cosine",
             linkage="complete",
-        ).fit_predict(np.array(embeddings))
-
-        if len(set(labels)) < 2:
-            return plain_text, False
-
-        speaker_map = {c: f"Speaker_{i:02d}" for i, c in enumerate(sorted(set(labels)))}
-        segment_speakers = ["Speaker_00"] * len(whisper_segments)
-        for idx, label in zip(valid_indices, labels):
-            segment_speakers[idx] = speaker_map[label]
-
-        lines = []
-        current_speaker = None
-        current_texts = []
-        for i, seg in enumerate(whisper_segments):
-            speaker = segment_speakers[i]
-            if speaker != current_speaker:
-                if current_texts and current_speaker:
-                    lines.append(f"{current_speaker}: {' '.join(current_texts)}")
-                current_speaker = speaker
-                current_texts = [seg.text.strip()]
-            else:
-                current_texts.append(seg.text.strip())
-
-        if current_texts and current_speaker:
-            lines.append(f"{current_speaker}: {' '.join(current_texts)}")
-
-        return "\n".join(lines), True
+        ).fit_predict(x)
+
+    if len(embeddings) <= max_segments:
+        return fit(embeddings)
+    sampled = embeddings[np.linspace(0, len(embeddings) - 1, max_segments).astype(int)]
+    sample_labels = np.asarray(fit(sampled))
+    clusters = np.unique(sample_labels)
+    centroids = np.stack([sampled[sample_labels == c].mean(axis=0) for c in clusters])
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+    return clusters[np.argmax(embeddings @ centroids.T, axis=1)]
+
+
+def _label_speakers(embeddings, valid_indices, n_segments, max_segments):
+    if len(embeddings) < 2:
+        return None
+    labels = _cluster(embeddings, max_segments)
 
+    if len(set(labels)) < 2:
+        return None
+
+    speaker_map = {c: f"Speaker_{i:02d}" for i, c in enumerate(sorted(set(labels)))}
+    segment_speakers = ["Speaker_00"] * n_segments
+    for idx, label in zip(valid_indices, labels):
+        segment_speakers[idx] = speaker_map[label]
+    return segment_speakers
+
+
+def diarize(audio_path, whisper_segments, return_speakers=False, prepared=None):
+    """
+    Assign speaker labels to Whisper segments using resemblyzer embeddings.
+
+    whisper_segments: list of segment objects with .start, .end, .text
+    prepared: PreparedAudio from prepare_diarization(audio_path); when given, the audio is not
+    decoded or embedded again
+
+    Returns (transcript: str, diarized: bool), or with return_speakers=True
+    (transcript, diarized, speakers) where speakers holds one label per segment
+    (None when not diarized).
+    Falls back to plain transcript (diarized=False) when:
+    - resemblyzer or scikit-learn is not installed
+    - fewer than 2 speakers are detected
+    - any exception occurs
+    """
+    try:
+        if prepared is None:
+            prepared = prepare_diarization(audio_path)
+        embeddings, valid_indices = _segment_embeddings(prepared, whisper_segments)
+        speakers = _label_speakers(embeddings, valid_indices, len(whisper_segments),
+                                   _max_cluster_segments(_memory_budget()))
     except Exception:
-        return plain_text, False
+        speakers = None
+
+    if speakers:
+        transcript = format_turns(whisper_segments, speakers)
+    else:
+        transcript = " ".join((seg.text or "").strip() for seg in whisper_segments)
+    if return_speakers:
+        return transcript, speakers is not None, speakers
+    return transcript, speakers is not None
@@ -21,7 +21,11 @@ def send_notes(gmail_user, gmail_password, to_address, meeting_label, summary, t
     part.add_header("Content-Disposition", f'attachment; filename="{filename}"')
     msg.attach(part)
 
-    with smtplib.SMTP("smtp.gmail.com", 587) as server:
-        server.starttls()
+    # Overridable so a local SMTP server (e.g. loadtest.py's stand-in) can take Gmail's place
+    host = os.getenv("SMTP_HOST", "smtp.gmail.com")
+    port = int(os.getenv("SMTP_PORT", "587"))
+    with smtplib.SMTP(host, port) as server:
+        if os.getenv("SMTP_STARTTLS", "true").lower() == "true":
+            server.starttls()
         server.login(gmail_user, gmail_password)
         server.send_message(msg)
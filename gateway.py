@@ -0,0 +1,203 @@
+import email.utils
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
+
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_gateway = None
+
+
+class TokenBucket:
+    """Allow `rate` calls per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+def _percentile_ms(sorted_values, p):
+    if not sorted_values:
+        return None  # only coalesced calls so far
+    return round(sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))] * 1000, 1)
+
+
+def _retry_after(exc):
+    """Seconds the server asked us to wait (retry-after-ms / retry-after), or None."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(exc):
+    if getattr(exc, "status_code", None) in RETRYABLE_STATUS:
+        return True
+    from groq import APIConnectionError  # also covers APITimeoutError
+    return isinstance(exc, APIConnectionError)
+
+
+class Gateway:
+    """
+    Single choke point for Groq API calls.
+
+    Each endpoint name ("transcribe", "chat", ...) gets its own token bucket sized to its
+    requests-per-minute limit; all endpoints share one concurrency cap. Failed calls with a
+    retryable status are retried with jittered exponential backoff, or after the server's
+    Retry-After hint when one is sent, and a 429 pauses the whole endpoint for that long.
+
+    Calls given a coalesce_key share the result of an identical call already in flight
+    (e.g. the same question asked twice while the first answer is still being generated),
+    so duplicates cost no extra request or rate-limit token.
+    """
+
+    def __init__(self, rpm=None, default_rpm=30, burst=5, max_concurrency=2,
+                 max_retries=5, base_delay=1.0, max_delay=60.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self._rpm = dict(rpm or {})
+        self._default_rpm = default_rpm
+        self._burst = burst
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._paused_until = defaultdict(float)
+        self._latencies = defaultdict(lambda: deque(maxlen=500))
+        self._counts = defaultdict(lambda: {"calls": 0, "errors": 0, "retries": 0, "rate_limited": 0,
+                                            "coalesced": 0})
+        self._in_flight = {}
+
+    def _bucket(self, endpoint):
+        with self._lock:
+            if endpoint not in self._buckets:
+                rate = self._rpm.get(endpoint, self._default_rpm) / 60
+                self._buckets[endpoint] = TokenBucket(rate, self._burst, self._clock, self._sleep)
+            return self._buckets[endpoint]
+
+    def _backoff(self, attempt, hint):
+        if hint is not None:
+            return min(self.max_delay, hint) + random.uniform(0, self.base_delay / 4)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, endpoint, fn, *args, coalesce_key=None, **kwargs):
+        if coalesce_key is None:
+            return self._call(endpoint, fn, *args, **kwargs)
+        key = (endpoint, coalesce_key)
+        with self._lock:
+            shared = self._in_flight.get(key)
+            if shared is None:
+                shared = self._in_flight[key] = Future()
+                leader = True
+            else:
+                self._counts[endpoint]["coalesced"] += 1
+                leader = False
+        if not leader:
+            return shared.result()
+        try:
+            result = self._call(endpoint, fn, *args, **kwargs)
+        except BaseException as e:
+            shared.set_exception(e)
+            raise
+        else:
+            shared.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _call(self, endpoint, fn, *args, **kwargs):
+        bucket = self._bucket(endpoint)
+        for attempt in range(self.max_retries + 1):
+            pause = self._paused_until[endpoint] - self._clock()
+            if pause > 0:
+                self._sleep(pause)
+            bucket.acquire()
+            with self._semaphore:
+                started = self._clock()
+                try:
+                    result = fn(*args, **kwargs)
+                    error = None
+                except Exception as e:
+                    error = e
+                elapsed = self._clock() - started
+
+            with self._lock:
+                counts = self._counts[endpoint]
+                counts["calls"] += 1
+                self._latencies[endpoint].append(elapsed)
+                if error is None:
+                    return result
+                counts["errors"] += 1
+                if attempt == self.max_retries or not _is_retryable(error):
+                    raise error
+                counts["retries"] += 1
+                delay = self._backoff(attempt, _retry_after(error))
+                if getattr(error, "status_code", None) == 429:
+                    counts["rate_limited"] += 1
+                    self._paused_until[endpoint] = max(self._paused_until[endpoint], self._clock() + delay)
+            self._sleep(delay)
+
+    def stats(self):
+        """Per-endpoint call counts and latency percentiles (ms) over the last 500 calls."""
+        with self._lock:
+            result = {}
+            for endpoint, counts in self._counts.items():
+                latencies = sorted(self._latencies[endpoint])
+                result[endpoint] = dict(
+                    counts,
+                    p50_ms=_percentile_ms(latencies, 0.5),
+                    p95_ms=_percentile_ms(latencies, 0.95),
+                    max_ms=_percentile_ms(latencies, 1.0),
+                )
+            return result
+
+
+def get_gateway():
+    """Return the process-wide Gateway, configured from the environment on first use."""
+    global _gateway
+    if _gateway is None:
+        with _lock:
+            if _gateway is None:
+                _gateway = Gateway(
+                    rpm={
+                        "transcribe": int(os.getenv("GROQ_TRANSCRIBE_RPM", "20")),
+                        "chat": int(os.getenv("GROQ_CHAT_RPM", "30")),
+                    },
+                    max_concurrency=int(os.getenv("GROQ_MAX_CONCURRENCY", "2")),
+                    max_retries=int(os.getenv("GROQ_MAX_RETRIES", "5")),
+                )
+    return _gateway
@@ -0,0 +1,107 @@
+import argparse
+import os
+import subprocess
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".mp4", ".wav", ".ogg", ".opus", ".webm", ".flac", ".aac", ".amr")
+CHUNK_SIZE = 1024 * 1024
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RECORDINGS_DIR = os.path.join(BASE_DIR, "recordings")
+
+
+def recording_path(output_dir):
+    """A new meeting_*.mp3 path; the random suffix keeps concurrent imports from colliding."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(output_dir, f"meeting_{timestamp}_{uuid.uuid4().hex[:6]}.mp3")
+
+
+def upload_label(filename):
+    return os.path.splitext(os.path.basename(filename or ""))[0] or "upload"
+
+
+def save_stream(stream, dest_path, chunk_size=CHUNK_SIZE):
+    """Copy a file-like stream to disk chunk by chunk, never holding more than one chunk in memory."""
+    with open(dest_path, "wb") as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+
+
+def normalize_audio(src_path, dest_path):
+    """Re-encode any ffmpeg-readable audio/video to the recorder's 16kHz mono mp3 in one pass."""
+    subprocess.run(
+        ["ffmpeg", "-y", "-i", src_path, "-vn", "-ar", "16000", "-ac", "1", dest_path],
+        capture_output=True,
+        check=True,
+    )
+
+
+def import_file(src_path, job_manager, output_dir, settings=None):
+    from jobs import JobStatus
+
+    dest_path = recording_path(output_dir)
+    normalize_audio(src_path, dest_path)
+    # Processed inline, so created already claimed: worker.py or a remote worker must not run it too
+    status = JobStatus.TRANSCRIBING if settings else JobStatus.PENDING
+    job_id = job_manager.create_job(upload_label(src_path), audio_path=dest_path, status=status)
+    if settings:
+        job_manager.process(job_id=job_id, audio_path=dest_path, **settings)
+    return job_id
+
+
+def import_directory(directory, job_manager, output_dir, settings=None, concurrency=2):
+    """
+    Import every audio file in directory (not recursive), at most `concurrency` at a time.
+
+    With settings, each job is run through the pipeline as part of its import; without,
+    jobs are left pending for worker.py. Returns {path: job_id or None on failure}.
+    """
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(AUDIO_EXTENSIONS)
+    )
+
+    def _import(path):
+        try:
+            return import_file(path, job_manager, output_dir, settings)
+        except Exception as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        return dict(zip(paths, pool.map(_import, paths)))
+
+
+def main():
+    from dotenv import load_dotenv
+    from jobs import JobManager
+    from semantic_index import SemanticIndex
+    import worker
+
+    parser = argparse.ArgumentParser(description="Import a directory of existing recordings as jobs.")
+    parser.add_argument("directory")
+    parser.add_argument("--concurrency", type=int, default=2,
+                        help="files converted and processed at the same time (default: 2)")
+    parser.add_argument("--queue-only", action="store_true",
+                        help="only create pending jobs; leave processing to worker.py")
+    args = parser.parse_args()
+
+    load_dotenv()
+    os.makedirs(RECORDINGS_DIR, exist_ok=True)
+    os.makedirs(worker.TRANSCRIPTS_DIR, exist_ok=True)
+    job_manager = JobManager(worker.DB_PATH, recover=False, index=SemanticIndex(worker.INDEX_DIR))
+    settings = None if args.queue_only else worker.pipeline_settings()
+    results = import_directory(args.directory, job_manager, RECORDINGS_DIR, settings, args.concurrency)
+    failed = [path for path, job_id in results.items() if job_id is None]
+    print(f"Imported {len(results) - len(failed)} of {len(results)} files")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
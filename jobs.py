@@ -1,15 +1,35 @@
 import os
+import json
 import uuid
 import sqlite3
+import sys
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from datetime import datetime
-from transcriber import transcribe
-from diarizer import diarize
+from datetime import datetime, timedelta
+from archive import compress, decompress
+from transcriber import Segment, transcribe
+from diarizer import diarize, prepare_diarization
 from summarizer import summarize
+from compactor import compact_transcript, expand_speaker_labels
+from semantic_index import summary_chunks, transcript_chunks
 from emailer import send_notes
+from transcript_store import draft_path, ensure_text, load_transcript, save_transcript, structured_path
 
-_INTERRUPTED_STATUSES = ("pending", "transcribing", "diarizing", "summarizing", "emailing")
+_IN_FLIGHT_STATUSES = ("transcribing", "diarizing", "summarizing", "emailing")
+_INTERRUPTED_STATUSES = ("pending",) + _IN_FLIGHT_STATUSES
+LEASE_SECONDS = 120
+# A job whose lease runs out this many times keeps killing its workers (e.g. out of memory on a
+# long recording); it is failed rather than handed out again forever
+MAX_LEASE_ATTEMPTS = 3
+
+# Columns added after a table was first created; ADD COLUMN is cheap in SQLite
+_ADDED_COLUMNS = {
+    "jobs": (("metrics", "TEXT"), ("room", "TEXT"), ("lease_owner", "TEXT"), ("lease_expires", "REAL"),
+             ("attempts", "INTEGER NOT NULL DEFAULT 0")),
+    "jobs_archive": (("room", "TEXT"),),
+}
 
 
 class JobStatus(str, Enum):
@@ -23,12 +43,19 @@ class JobStatus(str, Enum):
 
 
 class JobManager:
-    def __init__(self, db_path="jobs.db"):
+    def __init__(self, db_path="jobs.db", recover=True, index=None):
         self._lock = threading.Lock()
-        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._index = index
+        # timeout: the web tier and worker processes share the file, so wait out their writes
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
         self._db.row_factory = sqlite3.Row
+        # Takes effect only while the file is still empty, so new databases get it for free;
+        # existing ones are converted once by enable_incremental_vacuum()
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
         self._init_db()
-        self._recover()
+        if recover:
+            self._recover()
 
     def _init_db(self):
         self._db.execute("""
@@ -43,35 +70,283 @@ class JobManager:
                 created_at       TEXT NOT NULL
             )
         """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs_archive (
+                id               TEXT PRIMARY KEY,
+                label            TEXT NOT NULL,
+                status           TEXT NOT NULL,
+                transcript_path  TEXT,
+                audio_path       TEXT,
+                created_at       TEXT NOT NULL,
+                archived_at      TEXT NOT NULL,
+                metrics          TEXT,
+                codec            TEXT NOT NULL,
+                summary_z        BLOB,
+                transcript_z     BLOB,
+                segments_z       BLOB
+            )
+        """)
+        self._migrate()
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs(created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_archive_created_at ON jobs_archive(created_at)")
         self._db.commit()
 
-    def _recover(self):
-        placeholders = ",".join("?" * len(_INTERRUPTED_STATUSES))
+    def _migrate(self):
+        for table, added in _ADDED_COLUMNS.items():
+            columns = {row[1] for row in self._db.execute(f"PRAGMA table_info({table})")}
+            for name, decl in added:
+                if name not in columns:
+                    self._db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+    def _recover(self, statuses=_INTERRUPTED_STATUSES):
+        # Leased jobs belong to remote workers, which outlive this process; their leases expire instead
+        placeholders = ",".join("?" * len(statuses))
         self._db.execute(
-            f"UPDATE jobs SET status=?, error=? WHERE status IN ({placeholders})",
-            [JobStatus.ERROR, "interrupted by restart"] + list(_INTERRUPTED_STATUSES)
+            f"UPDATE jobs SET status=?, error=? WHERE status IN ({placeholders}) AND lease_owner IS NULL",
+            [JobStatus.ERROR, "interrupted by restart"] + list(statuses)
         )
         self._db.commit()
 
-    def create_job(self, label, audio_path=None):
+    def recover_in_flight(self):
+        """Fail jobs a dead worker left mid-pipeline; queued (pending) jobs stay queued."""
+        self._recover(_IN_FLIGHT_STATUSES)
+
+    def create_job(self, label, audio_path=None, room=None, status=JobStatus.PENDING):
+        """Insert a job; pass an in-flight status to create it already claimed by the caller."""
         job_id = str(uuid.uuid4())[:8]
         with self._lock:
             self._db.execute(
-                "INSERT INTO jobs (id, label, status, audio_path, created_at) VALUES (?,?,?,?,?)",
-                (job_id, label, JobStatus.PENDING, audio_path, datetime.now().isoformat())
+                "INSERT INTO jobs (id, label, status, audio_path, room, created_at) VALUES (?,?,?,?,?,?)",
+                (job_id, label, status, audio_path, room, datetime.now().isoformat())
             )
             self._db.commit()
         return job_id
 
+    @staticmethod
+    def _job_dict(row):
+        job = dict(row)
+        job["metrics"] = json.loads(job["metrics"]) if job.get("metrics") else None
+        return job
+
     def get_job(self, job_id):
         row = self._db.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
-        return dict(row) if row else None
+        if row:
+            return self._job_dict(row)
+        return self._archived_job(job_id)
+
+    def _archived_job(self, job_id):
+        row = self._db.execute(
+            "SELECT id, label, status, transcript_path, audio_path, room, created_at, metrics, codec, summary_z "
+            "FROM jobs_archive WHERE id=?", (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+        job = self._job_dict(row)
+        job.update(summary=decompress(job.pop("codec"), job.pop("summary_z")).decode(), error=None, archived=True)
+        return job
+
+    def archived_file(self, job_id, kind):
+        """Decompressed "transcript" (.txt) or "segments" (.segments.json) bytes of an archived job."""
+        column = {"transcript": "transcript_z", "segments": "segments_z"}[kind]
+        row = self._db.execute(
+            f"SELECT codec, {column} FROM jobs_archive WHERE id=?", (job_id,)
+        ).fetchone()
+        return decompress(row[0], row[1]) if row else None
 
-    def list_jobs(self):
+    def list_jobs(self, include_archived=False, room=None):
+        where, params = ("WHERE room=?", (room,)) if room else ("", ())
         rows = self._db.execute(
-            "SELECT * FROM jobs ORDER BY created_at DESC"
+            f"SELECT * FROM jobs {where} ORDER BY created_at DESC", params
         ).fetchall()
-        return [dict(r) for r in rows]
+        jobs = [self._job_dict(r) for r in rows]
+        if include_archived:
+            # Summaries stay compressed in list views; get_job() expands a single one
+            archived = self._db.execute(
+                "SELECT id, label, status, transcript_path, audio_path, room, created_at, metrics "
+                f"FROM jobs_archive {where} ORDER BY created_at DESC", params
+            ).fetchall()
+            jobs += [dict(self._job_dict(r), summary=None, error=None, archived=True) for r in archived]
+            jobs.sort(key=lambda j: j["created_at"], reverse=True)
+        return jobs
+
+    def archive_jobs(self, older_than_days=30, batch_size=50, vacuum_pages=500):
+        """
+        Move finished jobs older than the cutoff into jobs_archive, compressing the summary and
+        the transcript files into the row (the files are then removed). Works in batches so the
+        web tier is never locked out for long, then frees some pages (if the database uses
+        incremental auto_vacuum) and refreshes statistics. A job that can't be archived is logged
+        and left in place. Returns the number of jobs archived.
+        """
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+        archived = 0
+        skipped = []  # rows that failed to archive; left in place, retried on the next run
+        while True:
+            exclude = f"AND id NOT IN ({','.join('?' * len(skipped))})" if skipped else ""
+            rows = self._db.execute(
+                f"SELECT * FROM jobs WHERE status=? AND created_at < ? {exclude} ORDER BY created_at LIMIT ?",
+                (JobStatus.DONE, cutoff, *skipped, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            removable = []
+            with self._lock:
+                for row in rows:
+                    try:
+                        paths = self._archive_row(row)
+                        self._db.commit()
+                    except Exception as e:
+                        # One unreadable job must not block archiving, or leave the database locked
+                        self._db.rollback()
+                        skipped.append(row["id"])
+                        print(f"{row['id']}: not archived: {e!r}", file=sys.stderr)
+                        continue
+                    removable += paths
+                    archived += 1
+            for path in removable:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+        if archived:
+            with self._lock:
+                self._db.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+                self._db.execute("PRAGMA optimize")
+                self._db.commit()
+        return archived
+
+    def _archive_row(self, row):
+        """Insert one jobs row into jobs_archive and delete it; returns the files now safe to remove."""
+        transcript_path = row["transcript_path"]
+        paths = {}
+        if transcript_path:
+            ensure_text(transcript_path)
+            paths = {"transcript": transcript_path, "segments": structured_path(transcript_path)}
+        codec, summary_z = compress((row["summary"] or "").encode())
+        blobs = {}
+        for kind, path in paths.items():
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    blobs[kind] = compress(f.read())[1]
+        self._db.execute(
+            "INSERT OR REPLACE INTO jobs_archive (id, label, status, transcript_path, audio_path, room, created_at, "
+            "archived_at, metrics, codec, summary_z, transcript_z, segments_z) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            (row["id"], row["label"], row["status"], transcript_path, row["audio_path"], row["room"], row["created_at"],
+             datetime.now().isoformat(), row["metrics"], codec,
+             summary_z, blobs.get("transcript"), blobs.get("segments"))
+        )
+        self._db.execute("DELETE FROM jobs WHERE id=?", (row["id"],))
+        if not transcript_path:
+            return []
+        return list(paths.values()) + [transcript_path + ".gz", transcript_path + ".br"]
+
+    def enable_incremental_vacuum(self):
+        """
+        One-off maintenance for a database created before archiving existed: switch it to
+        incremental auto_vacuum. That needs a full VACUUM, which rewrites the whole file and
+        blocks every other writer meanwhile, so run it while the app is stopped
+        (worker.py --vacuum). Returns False if the database already used it.
+        """
+        if self._db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        with self._lock:
+            self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._db.commit()
+            self._db.execute("VACUUM")
+        return True
+
+    def claim_next_job(self):
+        """Move the oldest pending job to transcribing and return it, or None if the queue is empty.
+
+        The conditional UPDATE makes the claim atomic across processes sharing the database.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE status=? ORDER BY created_at LIMIT 1",
+                (JobStatus.PENDING,)
+            ).fetchone()
+            if not row:
+                return None
+            claimed = self._db.execute(
+                "UPDATE jobs SET status=? WHERE id=? AND status=?",
+                (JobStatus.TRANSCRIBING, row[0], JobStatus.PENDING)
+            ).rowcount
+            self._db.commit()
+        return self.get_job(row[0]) if claimed else None
+
+    def lease_next_job(self, owner, lease_seconds=LEASE_SECONDS):
+        """Lease the oldest pending job to a remote worker, or one whose lease has run out.
+
+        Like claim_next_job() the conditional UPDATE makes the lease atomic; a worker that
+        stops heartbeating simply loses the job to the next one that asks, until the job has
+        been leased MAX_LEASE_ATTEMPTS times: then it is failed instead.
+        """
+        now = time.time()
+        placeholders = ",".join("?" * len(_IN_FLIGHT_STATUSES))
+        expired = f"status IN ({placeholders}) AND lease_owner IS NOT NULL AND lease_expires < ?"
+        leasable = f"(status=? OR ({expired}))"
+        params = [JobStatus.PENDING, *_IN_FLIGHT_STATUSES, now]
+        with self._lock:
+            self._db.execute(
+                f"UPDATE jobs SET status=?, error=?, lease_expires=NULL WHERE {expired} AND attempts >= ?",
+                [JobStatus.ERROR, f"lease expired {MAX_LEASE_ATTEMPTS} times; workers keep failing on it",
+                 *_IN_FLIGHT_STATUSES, now, MAX_LEASE_ATTEMPTS]
+            )
+            row = self._db.execute(
+                f"SELECT id FROM jobs WHERE {leasable} ORDER BY created_at LIMIT 1", params
+            ).fetchone()
+            if not row:
+                self._db.commit()
+                return None
+            leased = self._db.execute(
+                f"UPDATE jobs SET status=?, error=NULL, lease_owner=?, lease_expires=?, attempts=attempts + 1 "
+                f"WHERE id=? AND {leasable}",
+                [JobStatus.TRANSCRIBING, owner, now + lease_seconds, row[0]] + params
+            ).rowcount
+            self._db.commit()
+        return self.get_job(row[0]) if leased else None
+
+    def _update_lease(self, job_id, owner, sql, params):
+        placeholders = ",".join("?" * len(_IN_FLIGHT_STATUSES))
+        with self._lock:
+            updated = self._db.execute(
+                f"UPDATE jobs SET {sql} WHERE id=? AND lease_owner=? AND status IN ({placeholders})",
+                list(params) + [job_id, owner, *_IN_FLIGHT_STATUSES]
+            ).rowcount
+            self._db.commit()
+        return bool(updated)
+
+    def heartbeat(self, job_id, owner, lease_seconds=LEASE_SECONDS, status=None):
+        """Extend a lease, optionally reporting the worker's current stage. False if the lease was lost."""
+        if status is not None and status not in _IN_FLIGHT_STATUSES:
+            raise ValueError(f"not an in-flight status: {status}")
+        return self._update_lease(
+            job_id, owner, "lease_expires=?, status=COALESCE(?, status)", (time.time() + lease_seconds, status)
+        )
+
+    def complete_lease(self, job_id, owner, summary, transcript_path, metrics, stored):
+        """
+        Record a remote worker's result. False (and nothing stored) if the lease was lost.
+
+        The worker stays recorded as lease_owner, so a retried completion whose first attempt
+        landed but whose response was lost is acknowledged again rather than refused.
+        """
+        completed = self._update_lease(
+            job_id, owner, "status=?, summary=?, transcript_path=?, metrics=?, lease_expires=NULL",
+            (JobStatus.DONE, summary, transcript_path, json.dumps(metrics))
+        )
+        if completed:
+            self._index_job(job_id, self.get_job(job_id)["label"], stored, summary)
+            return True
+        return self.completed_by(job_id, owner)
+
+    def completed_by(self, job_id, owner):
+        row = self._db.execute("SELECT status, lease_owner FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return bool(row) and row[0] == JobStatus.DONE and row[1] == owner
+
+    def fail_lease(self, job_id, owner, error):
+        return self._update_lease(
+            job_id, owner, "status=?, error=?, lease_owner=NULL, lease_expires=NULL", (JobStatus.ERROR, error)
+        )
 
     def _set_status(self, job_id, status):
         with self._lock:
@@ -81,44 +356,20 @@ class JobManager:
     def process(self, job_id, audio_path, transcript_dir, gmail_user,
                 gmail_password, to_address, summary_model):
         try:
-            transcript_path = os.path.join(
-                transcript_dir,
-                os.path.basename(audio_path).replace(".mp3", ".txt")
-            )
-            self._set_status(job_id, JobStatus.TRANSCRIBING)
-            # transcript_text is written to disk via output_path; diarize() produces the version for summarization
-            transcript_text, whisper_segments = transcribe(
-                audio_path,
-                output_path=transcript_path, return_segments=True
-            )
-
-            self._set_status(job_id, JobStatus.DIARIZING)
-            transcript, diarized = diarize(audio_path, whisper_segments)
-            if diarized:
-                with open(transcript_path, "w") as f:
-                    f.write(transcript)
-
-            self._set_status(job_id, JobStatus.SUMMARIZING)
-            summary = summarize(transcript, model=summary_model, diarized=diarized)
-
-            self._set_status(job_id, JobStatus.EMAILING)
             label = self._db.execute(
                 "SELECT label FROM jobs WHERE id=?", (job_id,)
             ).fetchone()[0]
-            send_notes(
-                gmail_user=gmail_user,
-                gmail_password=gmail_password,
-                to_address=to_address,
-                meeting_label=label,
-                summary=summary,
-                transcript_path=transcript_path
+            transcript_path, stored, summary, metrics = run_pipeline(
+                label, audio_path, transcript_dir, gmail_user, gmail_password, to_address, summary_model,
+                set_status=lambda status: self._set_status(job_id, status)
             )
             with self._lock:
                 self._db.execute(
-                    "UPDATE jobs SET status=?, summary=?, transcript_path=? WHERE id=?",
-                    (JobStatus.DONE, summary, transcript_path, job_id)
+                    "UPDATE jobs SET status=?, summary=?, transcript_path=?, metrics=? WHERE id=?",
+                    (JobStatus.DONE, summary, transcript_path, json.dumps(metrics), job_id)
                 )
                 self._db.commit()
+            self._index_job(job_id, label, stored, summary)
 
         except Exception as e:
             with self._lock:
@@ -128,6 +379,17 @@ class JobManager:
                 )
                 self._db.commit()
 
+    def _index_job(self, job_id, label, stored, summary):
+        if self._index is None:
+            return
+        try:
+            self._index.add(job_id, label, transcript_chunks(stored) + summary_chunks(summary))
+        except ImportError:
+            pass  # search is optional: sentence-transformers isn't installed
+        except Exception as e:
+            # The job is done and its notes are sent; failing it now would only resend them on retry
+            print(f"{job_id}: not indexed for search: {e!r}", file=sys.stderr)
+
     def retry_job(self, job_id):
         with self._lock:
             row = self._db.execute(
@@ -136,7 +398,8 @@ class JobManager:
             if not row or row[0] != JobStatus.ERROR:
                 return False
             self._db.execute(
-                "UPDATE jobs SET status=?, error=NULL, summary=NULL, transcript_path=NULL WHERE id=?",
+                "UPDATE jobs SET status=?, error=NULL, summary=NULL, transcript_path=NULL, "
+                "lease_owner=NULL, lease_expires=NULL, attempts=0 WHERE id=?",
                 (JobStatus.PENDING, job_id)
             )
             self._db.commit()
@@ -145,3 +408,91 @@ class JobManager:
     def process_async(self, **kwargs):
         t = threading.Thread(target=self.process, kwargs=kwargs, daemon=True)
         t.start()
+
+
+def transcript_path_for(transcript_dir, audio_path):
+    return os.path.join(transcript_dir, os.path.basename(audio_path).replace(".mp3", ".txt"))
+
+
+def run_pipeline(label, audio_path, transcript_dir, gmail_user, gmail_password, to_address, summary_model,
+                 set_status, notify=True):
+    """
+    Transcribe, diarize, summarize and (with notify) email one recording, reporting each stage
+    via set_status. Returns (transcript_path, stored transcript, summary, metrics). Shared by
+    JobManager.process and remote workers, which report to a central queue instead of a local
+    jobs table and only email once the central node has accepted the result.
+    """
+    transcript_path = transcript_path_for(transcript_dir, audio_path)
+    segments_path = structured_path(transcript_path)
+    metrics = {}
+    if os.path.exists(segments_path):
+        # An earlier attempt got past diarization; don't pay for Groq or resemblyzer again
+        stored = load_transcript(segments_path)
+    else:
+        stored = _transcribe_and_diarize(audio_path, segments_path, metrics, set_status)
+    transcript, diarized = stored.to_text(), stored.diarized
+    ensure_text(transcript_path)
+    if os.path.exists(draft_path(transcript_path)):
+        os.unlink(draft_path(transcript_path))  # live captions are superseded
+
+    set_status(JobStatus.SUMMARIZING)
+    compacted, compaction_stats = compact_transcript(transcript, diarized=diarized)
+    summary, summary_stats = summarize(
+        compacted, model=summary_model, diarized=diarized, return_stats=True
+    )
+    if diarized:
+        summary = expand_speaker_labels(summary, compacted)
+    metrics.update(compaction=compaction_stats, summary=summary_stats)
+    if not notify:
+        return transcript_path, stored, summary, metrics
+
+    set_status(JobStatus.EMAILING)
+    send_notes(
+        gmail_user=gmail_user,
+        gmail_password=gmail_password,
+        to_address=to_address,
+        meeting_label=label,
+        summary=summary,
+        transcript_path=transcript_path
+    )
+    return transcript_path, stored, summary, metrics
+
+
+def _transcribe_and_diarize(audio_path, segments_path, metrics, set_status):
+    """
+    Run transcription and diarization as a two-branch graph: decoding and window embeddings
+    only need the audio, so they run in a side thread while the recording is uploaded to
+    Groq; only the segment-to-speaker assignment waits for Whisper's segments.
+    """
+    set_status(JobStatus.TRANSCRIBING)
+    started = time.monotonic()
+    name = os.path.splitext(os.path.basename(audio_path))[0]
+    cancel = threading.Event()
+    prep = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"prepare-{name}")
+    preparing = prep.submit(prepare_diarization, audio_path, cancel=cancel)
+    prep.shutdown(wait=False)
+
+    try:
+        transcript_text, whisper_segments = transcribe(audio_path, return_segments=True)
+    except Exception:
+        # Stop decoding and free the embedding pool before the job is marked failed
+        cancel.set()
+        if not preparing.cancel():
+            preparing.exception()
+        raise
+    if not whisper_segments and transcript_text:
+        whisper_segments = [Segment(start=0.0, end=0.0, text=transcript_text)]
+    transcribed = time.monotonic()
+
+    set_status(JobStatus.DIARIZING)
+    try:
+        prepared = preparing.result()
+    except Exception:
+        prepared = None  # diarize() then prepares again itself, or falls back to plain text
+    _, diarized, speakers = diarize(audio_path, whisper_segments, return_speakers=True, prepared=prepared)
+    finished = time.monotonic()
+    metrics["timings"] = {
+        "transcribe_seconds": round(transcribed - started, 2),
+        "diarize_wait_seconds": round(finished - transcribed, 2),  # what the overlap didn't hide
+    }
+    return save_transcript(segments_path, whisper_segments, speakers if diarized else None)
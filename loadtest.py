@@ -0,0 +1,605 @@
+"""
+Load generator for the web tier and the job pipeline.
+
+    python loadtest.py [scenario] [--duration S] [--server flask|waitress] [--json report.json]
+
+Serves app.py on a local port with the Recorder replaced by a fake, points Groq and SMTP at
+local stand-ins (nothing leaves the machine), drives the API with simulated browsers and
+recorders, and reports request latency percentiles, job turnaround, SQLite lock contention
+and thread counts. Scenarios are listed by --list; any Scenario field can be overridden,
+e.g. --set pollers=50 --set groq_latency=2.
+"""
+import argparse
+import collections
+import dataclasses
+import json
+import logging
+import os
+import random
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SLOW_STATEMENT_SECONDS = 0.1
+
+
+@dataclasses.dataclass
+class Scenario:
+    duration: float = 30.0  # seconds of load, after which outstanding jobs are drained
+    pollers: int = 10  # browsers refreshing /api/jobs and /api/status
+    poll_interval: float = 5.0  # the PWA's refresh period
+    recorders: int = 1  # clients cycling /api/start and /api/stop on the one shared recorder
+    meeting_seconds: float = 5.0  # recording length per start/stop cycle
+    uploaders: int = 0  # clients posting recordings to /api/upload (decoding needs ffmpeg)
+    upload_interval: float = 10.0
+    audio_seconds: float = 2.0  # length of the synthetic recordings
+    segments: int = 40  # transcript segments the transcription stand-in returns
+    groq_latency: float = 0.5  # stand-in response time, seconds
+    groq_429_rate: float = 0.0  # share of stand-in responses that are rate limited
+    smtp_latency: float = 0.2
+    drain_seconds: float = 60.0  # how long to wait for jobs still running when load stops
+
+
+SCENARIOS = {
+    "smoke": Scenario(duration=10, pollers=3, meeting_seconds=2),
+    "office": Scenario(duration=60, pollers=20, recorders=2, meeting_seconds=5),
+    "dashboard": Scenario(duration=60, pollers=100, poll_interval=1.0, recorders=0),
+    "backlog": Scenario(duration=60, pollers=5, recorders=4, meeting_seconds=0.5, groq_latency=2.0,
+                        groq_429_rate=0.2),
+    "ingest": Scenario(duration=60, pollers=5, recorders=0, uploaders=4, upload_interval=2.0),
+}
+
+
+def _percentiles(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {"count": len(ordered), "p50": rank(50), "p90": rank(90), "p99": rank(99), "max": ordered[-1]}
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = collections.defaultdict(list)
+        self.statuses = collections.defaultdict(collections.Counter)
+
+    def record(self, name, seconds, status=None):
+        with self._lock:
+            self.samples[name].append(seconds)
+            if status is not None:
+                self.statuses[name][status] += 1
+
+
+def _write_wav(path, seconds):
+    """A short tone, so ffmpeg and the diarizer have real audio to decode."""
+    rate = 16000
+    frames = bytearray()
+    for i in range(int(seconds * rate)):
+        sample = int(3000 * ((i // 40) % 2 * 2 - 1))  # 200 Hz square wave
+        frames += sample.to_bytes(2, "little", signed=True)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(bytes(frames))
+
+
+class FakeRecorder:
+    """Recorder stand-in with the same start/stop/is_recording contract, writing a WAV on stop."""
+
+    captioner = None
+
+    def __init__(self, output_dir, audio_seconds):
+        self.output_dir = output_dir
+        self.audio_seconds = audio_seconds
+        self._lock = threading.Lock()
+        self._filepath = None
+
+    def start(self):
+        from ingest import recording_path
+        with self._lock:
+            self._filepath = recording_path(self.output_dir)
+            return self._filepath
+
+    def stop(self):
+        with self._lock:
+            filepath, self._filepath = self._filepath, None
+        if filepath:
+            _write_wav(filepath, self.audio_seconds)
+        return filepath
+
+    def is_recording(self):
+        return self._filepath is not None
+
+
+# --- Groq stand-in -----------------------------------------------------------------------------
+
+class GroqStandIn(ThreadingHTTPServer):
+    """Answers Groq's transcription and chat-completion endpoints after a configurable delay."""
+    daemon_threads = True
+
+    def __init__(self, scenario):
+        super().__init__(("127.0.0.1", 0), _GroqHandler)
+        self.scenario = scenario
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+        self.random = random.Random(0)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def rate_limited(self):
+        with self.lock:
+            return self.random.random() < self.scenario.groq_429_rate
+
+
+class _GroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", ""):
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                self.rfile.read(size + 2)
+                if size == 0:
+                    return
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _send(self, status, payload, headers=()):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        self._read_body()
+        time.sleep(server.scenario.groq_latency)
+        if server.rate_limited():
+            server.count("rate_limited")
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                       [("retry-after-ms", "200")])
+        elif self.path.endswith("/audio/transcriptions"):
+            server.count("transcriptions")
+            self._send(200, _transcription(server.scenario))
+        elif self.path.endswith("/chat/completions"):
+            server.count("chat")
+            self._send(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:8]}", "object": "chat.completion", "created": 0,
+                "model": "stand-in",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                    "role": "assistant", "content": "1. SUMMARY\n- Load test meeting\n\n2. ACTION ITEMS\n- None"}}],
+                "usage": {"prompt_tokens": 500, "completion_tokens": 20, "total_tokens": 520},
+            })
+        else:
+            self._send(404, {"error": {"message": f"unknown endpoint {self.path}"}})
+
+
+def _transcription(scenario):
+    step = scenario.audio_seconds / max(scenario.segments, 1)
+    segments = [
+        {"id": i, "start": round(i * step, 2), "end": round((i + 1) * step, 2),
+         "text": f" Point number {i} about the quarterly plan."}
+        for i in range(scenario.segments)
+    ]
+    return {"text": "".join(s["text"] for s in segments).strip(), "segments": segments,
+            "language": "en", "duration": scenario.audio_seconds, "task": "transcribe"}
+
+
+# --- SMTP stand-in -----------------------------------------------------------------------------
+
+class SmtpStandIn(socketserver.ThreadingTCPServer):
+    """Just enough SMTP for smtplib: EHLO, AUTH PLAIN, MAIL/RCPT/DATA and QUIT. No STARTTLS."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, scenario):
+        super().__init__(("127.0.0.1", 0), _SmtpHandler)
+        self.scenario = scenario
+        self.messages = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self._reply("220 loadtest ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self._reply("250-loadtest")
+                self._reply("250 AUTH PLAIN LOGIN")
+            elif command.startswith("AUTH"):
+                self._reply("235 2.7.0 Authentication successful")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self._reply("250 OK")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                time.sleep(self.server.scenario.smtp_latency)
+                with self.server.lock:
+                    self.server.messages += 1
+                self._reply("250 OK queued")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+# --- Instrumentation ---------------------------------------------------------------------------
+
+class _TimedLock:
+    """Stands in for JobManager's threading.Lock, recording how long each acquire waited."""
+
+    def __init__(self, stats, name):
+        self._lock = threading.Lock()
+        self._stats = stats
+        self._name = name
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self._lock.acquire()
+        self._stats.record(self._name, time.perf_counter() - started)
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+class _TimedConnection:
+    """sqlite3 connection proxy timing execute/commit, which include waits on SQLite's write lock."""
+
+    def __init__(self, db, stats):
+        self._db = db
+        self._stats = stats
+
+    def execute(self, *args):
+        started = time.perf_counter()
+        try:
+            return self._db.execute(*args)
+        finally:
+            self._stats.record("sqlite.execute", time.perf_counter() - started)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return self._db.commit()
+        finally:
+            self._stats.record("sqlite.commit", time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+def _os_threads():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+# --- Clients -----------------------------------------------------------------------------------
+
+class _Clients:
+    def __init__(self, base_url, scenario, stats, stop):
+        self.base_url = base_url
+        self.scenario = scenario
+        self.stats = stats
+        self.stop = stop
+        self.jobs = {}  # job_id -> created (monotonic)
+        self.jobs_lock = threading.Lock()
+
+    def request(self, name, method, path, body=None, headers=None):
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers or {})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                payload, status = resp.read(), resp.status
+        except urllib.error.HTTPError as e:
+            payload, status = e.read(), e.code
+        except OSError as e:
+            self.stats.record(name, time.perf_counter() - started, type(e).__name__)
+            return None, None
+        self.stats.record(name, time.perf_counter() - started, status)
+        return status, payload
+
+    def _track(self, payload):
+        job_id = json.loads(payload).get("job_id")
+        if job_id:
+            with self.jobs_lock:
+                self.jobs[job_id] = time.monotonic()
+
+    def poller(self, n):
+        self.stop.wait(random.Random(n).uniform(0, self.scenario.poll_interval))  # spread the herd
+        while not self.stop.is_set():
+            self.request("GET /api/jobs", "GET", "/api/jobs")
+            self.request("GET /api/status", "GET", "/api/status")
+            self.stop.wait(self.scenario.poll_interval)
+
+    def recorder(self, n):
+        while not self.stop.is_set():
+            status, _ = self.request("POST /api/start", "POST", "/api/start")
+            if status != 200:
+                self.stop.wait(0.5)  # someone else is recording
+                continue
+            self.stop.wait(self.scenario.meeting_seconds)
+            status, payload = self.request("POST /api/stop", "POST", "/api/stop")
+            if status == 200:
+                self._track(payload)
+
+    def uploader(self, n, audio):
+        while not self.stop.is_set():
+            status, payload = self.request("POST /api/upload", "POST", f"/api/upload?filename=load{n}.wav",
+                                           body=audio, headers={"Content-Type": "audio/wav"})
+            if status == 200:
+                self._track(payload)
+            self.stop.wait(self.scenario.upload_interval)
+
+
+def _serve(app, server):
+    if server == "waitress":
+        from waitress import create_server
+        httpd = create_server(app, host="127.0.0.1", port=0, threads=int(os.getenv("WSGI_THREADS", "8")))
+        port = httpd.effective_port
+        thread = threading.Thread(target=httpd.run, daemon=True)
+        thread.start()
+        return f"http://127.0.0.1:{port}", httpd.close
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # one access-log line per request drowns the report
+    httpd = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{httpd.server_port}", httpd.shutdown
+
+
+def _start(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def run(scenario, server="flask"):
+    """Run one scenario in this process and return the report as a dict."""
+    stats = Stats()
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    groq = _start(GroqStandIn(scenario))
+    smtp = _start(SmtpStandIn(scenario))
+    overrides = {
+        # Forced, so a load test can never reach the real Groq API or mailbox
+        "GROQ_BASE_URL": groq.url, "GROQ_API_KEY": "loadtest",
+        "SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(smtp.port), "SMTP_STARTTLS": "false",
+        "GMAIL_USER": "loadtest@example.com", "GMAIL_APP_PASSWORD": "loadtest", "GMAIL_TO": "loadtest@example.com",
+        # If app is first imported here, don't let it fail the in-flight jobs of a live jobs.db
+        "JOB_WORKER": "process",
+    }
+    saved_env = {k: os.environ.get(k) for k in overrides}
+    os.environ.update(overrides)
+
+    import app as app_module
+    import clients
+    import gateway
+    from jobs import JobManager
+
+    recordings = os.path.join(workdir, "recordings")
+    transcripts = os.path.join(workdir, "transcripts")
+    os.makedirs(recordings)
+    os.makedirs(transcripts)
+    job_manager = JobManager(os.path.join(workdir, "jobs.db"), recover=False)  # no semantic index
+    job_manager._lock = _TimedLock(stats, "jobmanager.lock")
+    job_manager._db = _TimedConnection(job_manager._db, stats)
+    patched = {
+        "recorder": FakeRecorder(recordings, scenario.audio_seconds), "job_manager": job_manager,
+        "RECORDINGS_DIR": recordings, "TRANSCRIPTS_DIR": transcripts, "JOB_WORKER": "thread", "captioner": None,
+    }
+    saved_app = {name: getattr(app_module, name) for name in patched}
+    for name, value in patched.items():
+        setattr(app_module, name, value)
+    saved_groq, clients._groq = clients._groq, None  # rebuilt against the stand-in
+    saved_gateway, gateway._gateway = gateway._gateway, None  # so its stats cover this run only
+
+    base_url, shutdown = _serve(app_module.app, server)
+    stop = threading.Event()
+    load = _Clients(base_url, scenario, stats, stop)
+    audio_path = os.path.join(workdir, "upload.wav")
+    _write_wav(audio_path, scenario.audio_seconds)
+    with open(audio_path, "rb") as f:
+        audio = f.read()
+
+    threads = [threading.Thread(target=load.poller, args=(i,), daemon=True) for i in range(scenario.pollers)]
+    threads += [threading.Thread(target=load.recorder, args=(i,), daemon=True) for i in range(scenario.recorders)]
+    threads += [threading.Thread(target=load.uploader, args=(i, audio), daemon=True)
+                for i in range(scenario.uploaders)]
+    turnaround, final_status = {}, {}
+    peak_threads = {"python": 0, "os": 0}
+    started = time.monotonic()
+    try:
+        for t in threads:
+            t.start()
+        deadline = started + scenario.duration
+        while True:
+            now = time.monotonic()
+            if now >= deadline and not stop.is_set():
+                stop.set()
+                deadline = now + scenario.drain_seconds
+            peak_threads["python"] = max(peak_threads["python"], threading.active_count())
+            peak_threads["os"] = max(peak_threads["os"], _os_threads() or 0)
+            with load.jobs_lock:
+                tracked = dict(load.jobs)
+            for job_id, created in tracked.items():
+                if job_id in final_status:
+                    continue
+                job = job_manager.get_job(job_id)
+                if job and job["status"] in ("done", "error"):
+                    final_status[job_id] = job["status"]
+                    turnaround[job_id] = now - created
+            # A recorder that was mid-meeting at stop still posts /api/stop, so wait for the clients too
+            drained = len(final_status) == len(tracked) and not any(t.is_alive() for t in threads)
+            if stop.is_set() and (drained or now >= deadline):
+                break
+            time.sleep(0.1)
+        for t in threads:
+            t.join(timeout=35)
+        elapsed = time.monotonic() - started
+    finally:
+        stop.set()
+        shutdown()
+        for standin in (groq, smtp):
+            standin.shutdown()
+            standin.server_close()
+        for name, value in saved_app.items():
+            setattr(app_module, name, value)
+        clients._groq = saved_groq
+        gateway_stats = gateway.get_gateway().stats()
+        gateway._gateway = saved_gateway
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+    with load.jobs_lock:
+        created = len(load.jobs)
+    statuses = collections.Counter(final_status.values())
+    errors = sorted({job_manager.get_job(j)["error"] for j, s in final_status.items() if s == "error"})
+    job_manager._db.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    statements = stats.samples["sqlite.execute"] + stats.samples["sqlite.commit"]
+    return {
+        "scenario": dataclasses.asdict(scenario),
+        "server": server,
+        "elapsed_seconds": round(elapsed, 1),
+        "requests": {
+            name: dict(_percentiles(samples), statuses=dict(stats.statuses[name]))
+            for name, samples in sorted(stats.samples.items()) if not name.startswith(("sqlite.", "jobmanager."))
+        },
+        "jobs": {
+            "created": created, "done": statuses["done"], "error": statuses["error"],
+            "unfinished": created - len(final_status), "errors": errors,
+            "turnaround": _percentiles(list(turnaround.values())),
+        },
+        "sqlite": {
+            "jobmanager_lock_wait": _percentiles(stats.samples["jobmanager.lock"]),
+            "execute": _percentiles(stats.samples["sqlite.execute"]),
+            "commit": _percentiles(stats.samples["sqlite.commit"]),
+            "slow_statements": sum(1 for s in statements if s >= SLOW_STATEMENT_SECONDS),
+        },
+        "threads": {"python_peak": peak_threads["python"], "os_peak": peak_threads["os"] or None},
+        "gateway": gateway_stats,
+        "groq": dict(groq.counts),
+        "smtp": {"messages": smtp.messages},
+    }
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:8.1f}"
+
+
+def _row(name, p):
+    if not p["count"]:
+        return f"  {name:<28} {0:>7}"
+    return f"  {name:<28} {p['count']:>7} {_ms(p['p50'])} {_ms(p['p90'])} {_ms(p['p99'])} {_ms(p['max'])}"
+
+
+def format_report(report):
+    header = f"  {'':<28} {'count':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    lines = [f"{report['elapsed_seconds']}s on {report['server']}", "", "Requests", header]
+    for name, p in report["requests"].items():
+        statuses = ", ".join(f"{k}: {v}" for k, v in sorted(p["statuses"].items(), key=str))
+        lines.append(_row(name, p) + f"   [{statuses}]")
+    jobs = report["jobs"]
+    lines += ["", f"Jobs  created {jobs['created']}, done {jobs['done']}, error {jobs['error']}, "
+                  f"unfinished {jobs['unfinished']}", header]
+    t = jobs["turnaround"]
+    lines.append(_row("turnaround", t) if not t["count"] else
+                 f"  {'turnaround':<28} {t['count']:>7} " + " ".join(f"{t[k]:7.1f}s" for k in ("p50", "p90", "p99", "max")))
+    lines += [f"  error: {e}" for e in jobs["errors"]]
+    sqlite = report["sqlite"]
+    lines += ["", "SQLite", header, _row("JobManager lock wait", sqlite["jobmanager_lock_wait"]),
+              _row("execute", sqlite["execute"]), _row("commit", sqlite["commit"]),
+              f"  statements >= {SLOW_STATEMENT_SECONDS * 1000:.0f} ms: {sqlite['slow_statements']}"]
+    lines += ["", "Groq gateway", f"  {'':<28} {'calls':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  retries"]
+    for endpoint, g in report["gateway"].items():
+        latency = " ".join(f"{g[k]:8.1f}" if g[k] is not None else f"{'-':>8}" for k in ("p50_ms", "p95_ms", "max_ms"))
+        lines.append(f"  {endpoint:<28} {g['calls']:>7} {latency}"
+                     f"  {g['retries']} (429: {g['rate_limited']}, coalesced: {g['coalesced']})")
+    threads = report["threads"]
+    lines += ["", f"Threads  Python peak {threads['python_peak']}, OS peak {threads['os_peak']}",
+              f"Stand-ins  Groq {report['groq']}, SMTP {report['smtp']['messages']} messages"]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", nargs="?", default="smoke", choices=sorted(SCENARIOS))
+    parser.add_argument("--duration", type=float, help="override the scenario's duration (seconds)")
+    parser.add_argument("--set", action="append", default=[], metavar="FIELD=VALUE",
+                        help="override any Scenario field, e.g. pollers=50")
+    parser.add_argument("--server", choices=("flask", "waitress"), default=os.getenv("WSGI_SERVER", "flask"))
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON, for comparing runs")
+    parser.add_argument("--list", action="store_true", help="list scenarios and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, scenario in sorted(SCENARIOS.items()):
+            print(f"{name}: {scenario}")
+        return
+    scenario = SCENARIOS[args.scenario]
+    types = {field.name: field.type for field in dataclasses.fields(Scenario)}
+    overrides = {}
+    for item in args.set:
+        name, _, value = item.partition("=")
+        if name not in types:
+            parser.error(f"unknown scenario field {name!r}; fields: {', '.join(types)}")
+        overrides[name] = types[name](value)
+    if args.duration:
+        overrides["duration"] = args.duration
+    scenario = dataclasses.replace(scenario, **overrides)
+
+    report = run(scenario, server=args.server)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,23 @@
 import subprocess
 import os
+import threading
 from datetime import datetime
 
+PCM_CHUNK_BYTES = 3200  # 0.1 s of 16 kHz s16le mono
+
 class Recorder:
-    def __init__(self, mic_device, output_dir):
+    def __init__(self, mic_device, output_dir, captioner=None):
         self.mic_device = mic_device
         self.output_dir = output_dir
+        self.captioner = captioner
         self._process = None
         self._filepath = None
+        self._reader = None
 
     def start(self):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         self._filepath = os.path.join(self.output_dir, f"meeting_{timestamp}.mp3")
-        self._process = subprocess.Popen([
+        cmd = [
             "ffmpeg", "-y",
             "-f", "alsa",
             "-channels", "1",
@@ -20,14 +25,47 @@ class Recorder:
             "-ar", "16000",
             "-ac", "1",
             self._filepath
-        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        ]
+        if self.captioner:
+            # Second output: the same audio as raw PCM on stdout for live captions
+            cmd += ["-f", "s16le", "-ar", "16000", "-ac", "1", "pipe:1"]
+        self._process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE if self.captioner else subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        if self.captioner:
+            try:
+                self.captioner.start(self._filepath)
+            except Exception:
+                self._process.terminate()
+                self._process.wait()
+                self._process = None
+                self._filepath = None
+                raise
+            self._reader = threading.Thread(target=self._pump_audio, args=(self._process.stdout,), daemon=True)
+            self._reader.start()
         return self._filepath
 
+    def _pump_audio(self, stream):
+        # Always drain the pipe, even if captioning has failed, or ffmpeg blocks and stops recording
+        while True:
+            chunk = stream.read(PCM_CHUNK_BYTES)
+            if not chunk:
+                break
+            self.captioner.feed(chunk)
+
     def stop(self):
         if self._process is None:
             return None
         self._process.terminate()
         self._process.wait()
+        if self._reader:
+            # ffmpeg is gone, so the pipe is at EOF and the reader is about to finish
+            self._reader.join(timeout=1)
+            self._reader = None
+            # Don't hold up /api/stop while the captioner recognizes its last window
+            self.captioner.stop(wait=False)
         filepath = self._filepath
         self._process = None
         self._filepath = None
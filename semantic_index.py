@@ -0,0 +1,203 @@
+import fcntl
+import json
+import os
+import re
+import threading
+
+CHUNK_WORDS = 120
+SEARCH_BLOCK_ROWS = 8192
+_SECTION_RE = re.compile(r"^\s*\**\s*\d+\.\s*\**\s*([A-Z][A-Z /&-]+[A-Z])", re.MULTILINE)
+
+_model_lock = threading.Lock()
+_model = None
+
+
+def sentence_embedder(texts):
+    """Unit-length CPU embeddings from sentence-transformers (EMBEDDING_MODEL, default all-MiniLM-L6-v2)."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer(os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"), device="cpu")
+    return _model.encode(texts, batch_size=32, normalize_embeddings=True, convert_to_numpy=True)
+
+
+def transcript_chunks(stored, max_words=CHUNK_WORDS):
+    """Group consecutive segments of a StoredTranscript into ~max_words passages with their time span."""
+    chunks = []
+    words, lines, start, last_speaker = 0, [], None, None
+    for i in range(len(stored)):
+        seg = stored.segment(i)
+        if start is None:
+            start = seg["start"]
+        if seg["speaker"] and seg["speaker"] != last_speaker:
+            lines.append(f"{seg['speaker']}: {seg['text']}")
+        elif lines:
+            lines[-1] += " " + seg["text"]
+        else:
+            lines.append(seg["text"])
+        last_speaker = seg["speaker"]
+        words += len(seg["text"].split())
+        if words >= max_words:
+            chunks.append({"kind": "transcript", "start": start, "end": seg["end"], "text": "\n".join(lines)})
+            words, lines, start, last_speaker = 0, [], None, None
+    if lines:
+        chunks.append({"kind": "transcript", "start": start, "end": stored.ends[-1], "text": "\n".join(lines)})
+    return chunks
+
+
+def summary_chunks(summary):
+    """Split a summary into its numbered sections (SUMMARY, ACTION ITEMS, KEY DECISIONS, ...)."""
+    matches = list(_SECTION_RE.finditer(summary))
+    if not matches:
+        return [{"kind": "summary", "text": summary.strip()}] if summary.strip() else []
+    chunks = []
+    for match, following in zip(matches, matches[1:] + [None]):
+        body = summary[match.start():following.start() if following else len(summary)].strip()
+        chunks.append({"kind": f"summary:{match.group(1).strip().lower()}", "text": body})
+    return chunks
+
+
+class EmbeddingMismatch(ValueError):
+    """The embedder's vectors don't have the dimension the index was built with (EMBEDDING_MODEL changed)."""
+
+
+class SemanticIndex:
+    """
+    Append-only vector index over past meetings, stored in `directory`:
+
+    - vectors.f16: float16 matrix (capacity x dim), memory-mapped, grown by doubling
+    - chunks.jsonl: one metadata line per row; its line count is the number of valid rows
+    - info.json: embedding dimension
+
+    Writers take an flock so worker processes can share the index; readers reload when
+    chunks.jsonl grows. Embeddings are unit length, so dot products are cosine similarity.
+    """
+
+    def __init__(self, directory, embed=None):
+        self.directory = directory
+        self._embed = embed or sentence_embedder
+        self._lock = threading.Lock()
+        self._chunks = []
+        self._loaded_size = -1
+        self._vectors = None
+        self._dim = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _refresh(self):
+        import numpy as np
+
+        meta_path = self._path("chunks.jsonl")
+        size = os.path.getsize(meta_path) if os.path.exists(meta_path) else 0
+        if size == self._loaded_size:
+            return
+        self._chunks = []
+        if size:
+            with open(meta_path) as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # torn write from a crashed writer; the row is unused
+                    self._chunks.append(json.loads(line))
+        self._loaded_size = size
+        self._vectors = None
+        if self._chunks:
+            with open(self._path("info.json")) as f:
+                self._dim = json.load(f)["dim"]
+            self._vectors = np.memmap(self._path("vectors.f16"), dtype=np.float16, mode="r")
+            self._vectors = self._vectors.reshape(-1, self._dim)
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._chunks)
+
+    def job_ids(self):
+        with self._lock:
+            self._refresh()
+            return {c["job_id"] for c in self._chunks}
+
+    def add(self, job_id, label, chunks):
+        """Embed and append chunks (dicts with "text" plus metadata) for one job. Returns rows added."""
+        import numpy as np
+
+        chunks = [c for c in chunks if c.get("text")]
+        if not chunks:
+            return 0
+        vectors = np.asarray(self._embed([c["text"] for c in chunks]), dtype=np.float32)
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(self._path("index.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._refresh()
+            if any(c["job_id"] == job_id for c in self._chunks):
+                return 0  # already indexed (e.g. a second worker finished the same job)
+            dim = vectors.shape[1]
+            if not self._chunks:
+                with open(self._path("info.json"), "w") as f:
+                    json.dump({"dim": dim}, f)
+            else:
+                self._check_dim(dim)
+            count = len(self._chunks)
+            self._write_rows(count, vectors.astype(np.float16))
+            with open(self._path("chunks.jsonl"), "a") as f:
+                for chunk in chunks:
+                    f.write(json.dumps({**chunk, "job_id": job_id, "label": label}) + "\n")
+            self._refresh()
+        return len(chunks)
+
+    def _check_dim(self, dim):
+        if dim != self._dim:
+            raise EmbeddingMismatch(
+                f"the index at {self.directory} holds {self._dim}-dim embeddings but the embedder "
+                f"returns {dim}-dim ones; restore the previous EMBEDDING_MODEL or remove the index to rebuild it"
+            )
+
+    def _write_rows(self, start_row, rows):
+        import numpy as np
+
+        path = self._path("vectors.f16")
+        row_bytes = rows.shape[1] * 2
+        capacity = os.path.getsize(path) // row_bytes if os.path.exists(path) else 0
+        needed = start_row + len(rows)
+        if needed > capacity:
+            with open(path, "ab") as f:
+                f.truncate(max(needed, 2 * capacity, 1024) * row_bytes)
+        mm = np.memmap(path, dtype=np.float16, mode="r+", offset=start_row * row_bytes, shape=rows.shape)
+        mm[:] = rows
+        mm.flush()
+        del mm
+
+    def search(self, queries, k=5):
+        """
+        Top-k chunks for each query string, scanning the matrix in blocks so peak memory stays
+        bounded. Returns one list per query of (score, chunk) pairs, best first.
+        """
+        import numpy as np
+
+        with self._lock:
+            self._refresh()
+            chunks, vectors = self._chunks, self._vectors
+        if not chunks or not queries:
+            return [[] for _ in queries]
+        q = np.asarray(self._embed(list(queries)), dtype=np.float32)
+        self._check_dim(q.shape[1])
+        n = len(chunks)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, n, SEARCH_BLOCK_ROWS):
+            block = np.asarray(vectors[start:min(n, start + SEARCH_BLOCK_ROWS)], dtype=np.float32)
+            block_rows = np.broadcast_to(np.arange(start, start + len(block)), (len(queries), len(block)))
+            scores = np.concatenate([best_scores, q @ block.T], axis=1)
+            rows = np.concatenate([best_rows, block_rows], axis=1)
+            keep = min(k, scores.shape[1])
+            top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_rows = np.take_along_axis(rows, top, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        results = []
+        for qi in range(len(queries)):
+            results.append([
+                (float(best_scores[qi, j]), chunks[int(best_rows[qi, j])]) for j in order[qi]
+            ])
+        return results
@@ -0,0 +1,69 @@
+// Keeps finished transcripts (and the app shell) available offline.
+const CACHE = 'meeting-notes-v1';
+const SHELL = ['/', '/static/icon.svg', '/static/manifest.json'];
+const TRANSCRIPT_RE = /^\/api\/jobs\/[^/]+\/transcript$/;
+
+self.addEventListener('install', event => {
+  event.waitUntil(caches.open(CACHE).then(cache => cache.addAll(SHELL)));
+  self.skipWaiting();
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(keys.filter(k => k !== CACHE).map(k => caches.delete(k))))
+      .then(() => self.clients.claim())
+  );
+});
+
+// Network first, cache as fallback: online users always see the latest copy.
+async function networkFirst(request) {
+  const cache = await caches.open(CACHE);
+  try {
+    const resp = await fetch(request);
+    if (resp.ok) cache.put(request, resp.clone());
+    return resp;
+  } catch (err) {
+    const cached = await cache.match(request);
+    if (cached) return cached;
+    throw err;
+  }
+}
+
+// Whenever the job list is fetched, pull the newest finished transcripts into the cache ahead of
+// time: a few at a time, so the prefetch never takes over the server's threads from the page.
+// Archived meetings are decompressed on every request, so they are only cached once opened.
+const PREFETCH_RECENT = 20;
+const PREFETCH_CONCURRENCY = 2;
+
+async function cacheFinishedTranscripts(resp) {
+  const jobs = await resp.json();
+  const cache = await caches.open(CACHE);
+  const urls = jobs  // newest first
+    .filter(job => job.status === 'done' && !job.archived)
+    .slice(0, PREFETCH_RECENT)
+    .map(job => `/api/jobs/${encodeURIComponent(job.id)}/transcript`);
+  const prefetch = async () => {
+    for (let url = urls.shift(); url; url = urls.shift()) {
+      if (!(await cache.match(url))) {
+        try { await cache.add(url); } catch (err) { /* retried on the next refresh */ }
+      }
+    }
+  };
+  await Promise.all(Array.from({ length: PREFETCH_CONCURRENCY }, prefetch));
+}
+
+self.addEventListener('fetch', event => {
+  const url = new URL(event.request.url);
+  if (event.request.method !== 'GET' || url.origin !== self.location.origin) return;
+  if (event.request.headers.has('range')) return;  // audio seeking goes straight to the network
+
+  if (url.pathname === '/api/jobs') {
+    event.respondWith(networkFirst(event.request).then(resp => {
+      event.waitUntil(cacheFinishedTranscripts(resp.clone()));
+      return resp;
+    }));
+  } else if (TRANSCRIPT_RE.test(url.pathname) || SHELL.includes(url.pathname)) {
+    event.respondWith(networkFirst(event.request));
+  }
+});
@@ -1,6 +1,22 @@
-from groq import Groq
+import dataclasses
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from clients import groq_client
+from gateway import get_gateway
 
-_client = Groq()
+SMALL_MODEL = "llama-3.1-8b-instant"
+CHARS_PER_TOKEN = 4  # rough average for English transcripts
+
+PROMPT_BRIEF = """You are a meeting assistant. Analyze this short meeting transcript and provide:
+
+1. SUMMARY (1-3 bullet points)
+2. ACTION ITEMS (person: task, or "None identified" if none)
+3. KEY DECISIONS (or "None identified" if none)
+
+Transcript:
+{transcript}"""
 
 PROMPT_SIMPLE = """You are a meeting assistant. Analyze this transcript and provide:
 
@@ -32,11 +48,127 @@ PROMPT_DIARIZED = """You are a meeting assistant. Analyze this transcript and pr
 Transcript:
 {transcript}"""
 
+PROMPT_CHUNK = """You are a meeting assistant. This is part {part} of {parts} of a long meeting transcript.
+Write concise notes on this part only: topics discussed (keep specific numbers, dates and names),
+commitments and action items with owners, decisions, open questions, and any speaker roles that
+are apparent (keep the speaker labels as written). Notes only, no preamble.
+
+Transcript part:
+{transcript}"""
+
+PROMPT_ASK = """You are a meeting assistant. Answer the question using only the excerpts from past
+meetings below. Cite the meeting label for each fact. If the excerpts don't contain the answer,
+say so.
+
+Excerpts:
+{excerpts}
+
+Question: {question}"""
+
+REDUCE_PREFIX = "(Condensed notes from consecutive parts of a long meeting, in order.)\n\n"
+
+
+@dataclasses.dataclass
+class Route:
+    strategy: str  # "brief" | "full" | "map_reduce"
+    model: str
+    template: str
+    estimated_tokens: int
 
-def summarize(transcript, model="llama-3.3-70b-versatile", diarized=False):
-    template = PROMPT_DIARIZED if diarized else PROMPT_SIMPLE
-    response = _client.chat.completions.create(
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def route(transcript, model="llama-3.3-70b-versatile", diarized=False):
+    """
+    Pick model and prompt by transcript size.
+
+    Short meetings go to the small model (with the brief prompt unless speakers need analysing),
+    long ones are summarized in parts by the small model and merged by `model`, and everything
+    in between goes to `model` in one call. Thresholds: SUMMARY_SHORT_TOKENS / SUMMARY_LONG_TOKENS.
+    """
+    tokens = estimate_tokens(transcript)
+    full_template = PROMPT_DIARIZED if diarized else PROMPT_SIMPLE
+    if tokens <= int(os.getenv("SUMMARY_SHORT_TOKENS", "2000")):
+        small_model = os.getenv("GROQ_SUMMARY_SMALL_MODEL", SMALL_MODEL)
+        return Route("brief", small_model, full_template if diarized else PROMPT_BRIEF, tokens)
+    if tokens > int(os.getenv("SUMMARY_LONG_TOKENS", "24000")):
+        return Route("map_reduce", model, full_template, tokens)
+    return Route("full", model, full_template, tokens)
+
+
+def _split_chunks(text, max_chars):
+    """Split on turn (line) or sentence boundaries into pieces of at most max_chars."""
+    pieces = text.splitlines() if "\n" in text else re.split(r"(?<=[.!?])\s+", text)
+    chunks, current = [], ""
+    for piece in pieces:
+        while len(piece) > max_chars:
+            chunks.append(piece[:max_chars])
+            piece = piece[max_chars:]
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _complete(model, prompt):
+    """One chat completion; returns (text, latency_ms, prompt_tokens, completion_tokens)."""
+    started = time.monotonic()
+    response = get_gateway().call(
+        "chat",
+        groq_client().chat.completions.create,
         model=model,
-        messages=[{"role": "user", "content": template.format(transcript=transcript)}]
+        messages=[{"role": "user", "content": prompt}],
+        coalesce_key=(model, prompt),
     )
-    return response.choices[0].message.content.strip()
+    usage = getattr(response, "usage", None)
+    return (
+        response.choices[0].message.content.strip(),
+        round((time.monotonic() - started) * 1000),
+        int(getattr(usage, "prompt_tokens", 0) or 0),
+        int(getattr(usage, "completion_tokens", 0) or 0),
+    )
+
+
+def _tally(stats, result):
+    text, latency_ms, prompt_tokens, completion_tokens = result
+    stats["calls"] += 1
+    stats["latency_ms"] += latency_ms
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += completion_tokens
+    return text
+
+
+def summarize(transcript, model="llama-3.3-70b-versatile", diarized=False, return_stats=False):
+    """Summarize a transcript. With return_stats=True returns (summary, stats) for tuning the router."""
+    started = time.monotonic()
+    chosen = route(transcript, model=model, diarized=diarized)
+    stats = {
+        "strategy": chosen.strategy, "model": chosen.model, "estimated_tokens": chosen.estimated_tokens,
+        "calls": 0, "latency_ms": 0, "prompt_tokens": 0, "completion_tokens": 0,
+    }
+    if chosen.strategy == "map_reduce":
+        chunk_chars = int(os.getenv("SUMMARY_CHUNK_TOKENS", "6000")) * CHARS_PER_TOKEN
+        chunks = _split_chunks(transcript, chunk_chars)
+        small_model = os.getenv("GROQ_SUMMARY_SMALL_MODEL", SMALL_MODEL)
+        prompts = [PROMPT_CHUNK.format(part=i + 1, parts=len(chunks), transcript=chunk)
+                   for i, chunk in enumerate(chunks)]
+        # The gateway caps concurrency; the pool just keeps it busy
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            notes = [_tally(stats, r) for r in pool.map(lambda p: _complete(small_model, p), prompts)]
+        stats["chunks"] = len(chunks)
+        transcript = REDUCE_PREFIX + "\n\n".join(notes)
+    summary = _tally(stats, _complete(chosen.model, chosen.template.format(transcript=transcript)))
+    stats["wall_ms"] = round((time.monotonic() - started) * 1000)
+    return (summary, stats) if return_stats else summary
+
+
+def answer_question(question, passages, model="llama-3.3-70b-versatile"):
+    """Answer from retrieved passages (dicts with label, kind, text) instead of whole transcripts."""
+    excerpts = "\n\n".join(f"[{p['label']} — {p['kind']}]\n{p['text']}" for p in passages)
+    text, _, _, _ = _complete(model, PROMPT_ASK.format(excerpts=excerpts, question=question))
+    return text
@@ -6,3 +6,10 @@ os.environ.setdefault("GMAIL_USER", "test@example.com")
 os.environ.setdefault("GMAIL_APP_PASSWORD", "test-password")
 os.environ.setdefault("GMAIL_TO", "test@example.com")
 os.environ.setdefault("GROQ_API_KEY", "test-groq-key")
+
+
+@pytest.fixture(autouse=True)
+def _fresh_gateway(monkeypatch):
+    # Mocked API calls shouldn't be paced by real rate limits, or by earlier tests' usage
+    import gateway
+    monkeypatch.setattr(gateway, "_gateway", gateway.Gateway(default_rpm=60000, burst=1000))
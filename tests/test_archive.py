@@ -0,0 +1,18 @@
+import sys
+
+import archive
+
+
+def test_round_trip():
+    data = b"Speaker_00: hello again\n" * 100
+    codec, blob = archive.compress(data)
+    assert codec in ("zstd", "zlib")
+    assert len(blob) < len(data)
+    assert archive.decompress(codec, blob) == data
+
+
+def test_zlib_fallback(monkeypatch):
+    monkeypatch.setitem(sys.modules, "zstandard", None)  # import now raises ImportError
+    codec, blob = archive.compress(b"abc" * 50)
+    assert codec == "zlib"
+    assert archive.decompress(codec, blob) == b"abc" * 50
@@ -0,0 +1,85 @@
+from captions import BYTES_PER_SECOND, LiveCaptioner
+
+
+def _seconds(n):
+    return b"\x00\x00" * int(n * BYTES_PER_SECOND // 2)
+
+
+def _drain(events):
+    out = []
+    while True:
+        event = events.get(timeout=5)
+        out.append(event)
+        if event["type"] == "end":
+            return out
+
+
+def test_full_windows_become_draft_lines(tmp_path):
+    heard = []
+    captioner = LiveCaptioner(str(tmp_path), window_seconds=2, step_seconds=1,
+                              recognize=lambda pcm: heard.append(len(pcm)) or f"{len(pcm) / BYTES_PER_SECOND:g}s")
+    captioner.start(str(tmp_path / "meeting_20260301_0900.mp3"))
+    events, snapshot = captioner.subscribe()
+    assert snapshot == {"type": "snapshot", "lines": [], "partial": "", "active": True}
+    captioner.feed(_seconds(4.5))
+    captioner.stop()
+
+    finals = [e for e in _drain(events) if e["type"] == "final"]
+    assert [e["text"] for e in finals] == ["2s", "2s", "0.5s"]
+    assert [e["start"] for e in finals] == [0.0, 2.0, 4.0]
+    draft = tmp_path / "meeting_20260301_0900.draft.txt"
+    assert draft.read_text() == "2s\n2s\n0.5s\n"
+    assert max(heard) == 2 * BYTES_PER_SECOND  # never recognizes more than a window
+
+
+def test_partials_are_published_before_the_window_fills(tmp_path):
+    captioner = LiveCaptioner(str(tmp_path), window_seconds=5, step_seconds=1, recognize=lambda pcm: "hello")
+    captioner.start(str(tmp_path / "m.mp3"))
+    events, _ = captioner.subscribe()
+    captioner.feed(_seconds(1.5))
+    assert events.get(timeout=5) == {"type": "partial", "text": "hello", "start": 0.0}
+    _, snapshot = captioner.subscribe()
+    assert snapshot["partial"] == "hello"
+    captioner.stop()
+
+
+def test_recognizer_failure_is_published_not_raised(tmp_path):
+    def broken(pcm):
+        raise RuntimeError("model missing")
+
+    captioner = LiveCaptioner(str(tmp_path), window_seconds=1, step_seconds=1, recognize=broken)
+    captioner.start(str(tmp_path / "m.mp3"))
+    events, _ = captioner.subscribe()
+    captioner.feed(_seconds(1))
+    assert [e["type"] for e in _drain(events)] == ["error", "end"]
+    assert not captioner.is_active()
+    captioner.feed(_seconds(1))  # recording keeps feeding; nothing is buffered
+    captioner.stop()
+
+
+def test_slow_subscriber_does_not_block_others(tmp_path):
+    captioner = LiveCaptioner(str(tmp_path), recognize=lambda pcm: "x")
+    stalled, _ = captioner.subscribe()
+    for _ in range(300):
+        captioner._publish({"type": "partial", "text": "x"})
+    assert stalled.qsize() == 256
+    captioner.unsubscribe(stalled)
+    captioner._publish({"type": "partial", "text": "x"})
+    assert stalled.qsize() == 256
+
+
+def test_stop_without_waiting_finishes_before_the_next_start(tmp_path):
+    import threading
+    release = threading.Event()
+    captioner = LiveCaptioner(str(tmp_path), window_seconds=1, step_seconds=1,
+                              recognize=lambda pcm: release.wait(5) and "late")
+    captioner.start(str(tmp_path / "m1.mp3"))
+    captioner.feed(_seconds(1))
+    captioner.stop(wait=False)  # returns while the last window is still being recognized
+    assert (tmp_path / "m1.draft.txt").read_text() == ""
+    release.set()
+    captioner.start(str(tmp_path / "m2.mp3"))
+    assert (tmp_path / "m1.draft.txt").read_text() == "late\n"
+    _, snapshot = captioner.subscribe()
+    assert snapshot["lines"] == []
+    captioner.stop()
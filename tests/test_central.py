@@ -0,0 +1,44 @@
+import io
+import json
+import urllib.error
+from unittest.mock import MagicMock, patch
+import pytest
+from central import CentralClient, LeaseLost
+
+
+def _response(status=200, body=b""):
+    resp = MagicMock(status=status)
+    resp.read.return_value = body
+    resp.__enter__.return_value = resp
+    return resp
+
+
+def test_lease_sends_token_and_returns_job():
+    client = CentralClient("http://central:5001/", token="secret")
+    with patch("central.urllib.request.urlopen", return_value=_response(200, b'{"id": "j1"}')) as urlopen:
+        assert client.lease("w1", 60) == {"id": "j1"}
+    req = urlopen.call_args[0][0]
+    assert req.full_url == "http://central:5001/api/queue/lease"
+    assert req.get_header("Authorization") == "Bearer secret"
+    assert json.loads(req.data) == {"worker": "w1", "lease_seconds": 60}
+
+
+def test_lease_returns_none_when_queue_empty():
+    with patch("central.urllib.request.urlopen", return_value=_response(204)):
+        assert CentralClient("http://central:5001").lease("w1", 60) is None
+
+
+def test_conflict_means_lease_lost():
+    error = urllib.error.HTTPError("http://central:5001", 409, "Conflict", {}, io.BytesIO(b"{}"))
+    with patch("central.urllib.request.urlopen", side_effect=error), pytest.raises(LeaseLost):
+        CentralClient("http://central:5001").heartbeat("j1", "w1", 60)
+
+
+def test_upload_streams_file_with_room_and_label(tmp_path):
+    audio = tmp_path / "meeting_20260218_103000.mp3"
+    audio.write_bytes(b"audio")
+    with patch("central.urllib.request.urlopen", return_value=_response(200, b'{"job_id": "c1"}')) as urlopen:
+        assert CentralClient("http://central:5001").upload(str(audio), "20260218 1030", room="board") == "c1"
+    req = urlopen.call_args[0][0]
+    assert "room=board" in req.full_url and "label=20260218+1030" in req.full_url
+    assert req.get_header("Content-length") == "5"
@@ -0,0 +1,14 @@
+import sys
+from unittest.mock import patch, MagicMock
+import clients
+
+
+def test_groq_client_is_created_once(monkeypatch):
+    monkeypatch.setattr(clients, "_groq", None)
+    mock_groq = MagicMock()
+    with patch.dict(sys.modules, {"groq": mock_groq}):
+        first = clients.groq_client()
+        second = clients.groq_client()
+    assert first is second
+    mock_groq.Groq.assert_called_once_with(max_retries=0)
+
@@ -0,0 +1,65 @@
+from compactor import collapse_repeats, compact_transcript, expand_speaker_labels
+
+
+def test_collapse_repeats_removes_looped_phrases():
+    words = "Thank you. Thank you. Thank you. Thank you. Bye".split()
+    out, removed = collapse_repeats(words)
+    assert out == ["Thank", "you.", "Bye"]
+    assert removed == 6
+
+
+def test_collapse_repeats_keeps_ordinary_repetition():
+    words = "I think I think we should ship it".split()
+    assert collapse_repeats(words) == (words, 0)
+
+
+def test_collapse_repeats_ignores_case_and_punctuation():
+    out, _ = collapse_repeats("okay Okay, OKAY. next".split())
+    assert out == ["OKAY.", "next"]
+
+
+def test_compact_plain_drops_fillers():
+    text, stats = compact_transcript("Um, so the, uh, budget is umm approved. Umbrella stays.")
+    assert text == "so the, budget is approved. Umbrella stays."
+    assert stats["fillers_removed"] == 3
+    assert stats["chars_after"] < stats["chars_before"]
+    assert stats["ratio"] < 1
+
+
+def test_compact_diarized_drops_empty_turns_and_merges_neighbours():
+    transcript = (
+        "Speaker_00: We ship Friday.\n"
+        "Speaker_01: Hmm.\n"
+        "Speaker_00: Pending QA.\n"
+        "Speaker_01: Agreed."
+    )
+    text, stats = compact_transcript(transcript, diarized=True)
+    assert text == "Spk0: We ship Friday. Pending QA.\nSpk1: Agreed."
+    assert stats["turns_dropped"] == 1
+    assert stats["turns_merged"] == 1
+
+
+def test_compact_diarized_collapses_loops_across_merged_turns():
+    transcript = "Speaker_00: Thanks for watching.\nSpeaker_01: Uh.\nSpeaker_00: Thanks for watching. Thanks for watching."
+    text, _ = compact_transcript(transcript, diarized=True)
+    assert text == "Spk0: Thanks for watching."
+
+
+def test_compact_empty_transcript():
+    text, stats = compact_transcript("")
+    assert text == ""
+    assert stats["ratio"] == 1.0
+
+
+def test_expand_speaker_labels():
+    compacted = "Spk0: Can you look at it?\nSpk12: Sure."
+    assert expand_speaker_labels("Spk0 asked Spk12 to follow up.", compacted) == \
+        "Speaker_00 asked Speaker_12 to follow up."
+    assert expand_speaker_labels("Use SSO and Spk0X", compacted) == "Use SSO and Spk0X"
+
+
+def test_expand_speaker_labels_leaves_other_text_alone():
+    compacted = "Spk0: Move the logs.\nSpk3: To the AWS S3 bucket."
+    summary = "Spk3 will move logs to the AWS S3 bucket; Spk7 and S0 are not speakers."
+    assert expand_speaker_labels(summary, compacted) == \
+        "Speaker_03 will move logs to the AWS S3 bucket; Spk7 and S0 are not speakers."
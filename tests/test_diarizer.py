@@ -1,8 +1,12 @@
+import os
+import subprocess
 import sys
+from concurrent.futures import Future
 import numpy as np
 import pytest
 from unittest.mock import MagicMock, patch
 
+import diarizer
 from diarizer import diarize
 
 
@@ -14,17 +18,13 @@ def _seg(start, end, text):
     return s
 
 
-def _mock_resemblyzer(n_segments):
-    """Mock resemblyzer with a 10s WAV and distinct embeddings per segment."""
-    mock = MagicMock()
-    mock.preprocess_wav.return_value = np.zeros(160000)  # 10s at 16kHz
-    encoder = MagicMock()
-    # Each call returns a unique unit vector so clustering has signal
-    encoder.embed_utterance.side_effect = [
-        np.eye(n_segments)[i] for i in range(n_segments)
-    ]
-    mock.VoiceEncoder.return_value = encoder
-    return mock
+def _prepared_for(segs):
+    """One window exactly spanning each segment, with a distinct unit embedding per window."""
+    return diarizer.PreparedAudio(
+        embeddings=np.eye(len(segs), dtype=np.float32),
+        starts=np.array([s.start for s in segs]),
+        ends=np.array([s.end for s in segs]),
+    )
 
 
 def _mock_sklearn(labels):
@@ -36,34 +36,33 @@ def _mock_sklearn(labels):
     return mock
 
 
-def _patch_resemblyzer(mock_resemblyzer, mock_sklearn):
+def _patch_sklearn(mock_sklearn):
     return patch.dict(sys.modules, {
-        "resemblyzer": mock_resemblyzer,
         "sklearn": mock_sklearn,
         "sklearn.cluster": mock_sklearn.cluster,
     })
 
 
+def _diarize_prepared(segs, labels, **kwargs):
+    with patch("diarizer.prepare_diarization", return_value=_prepared_for(segs)), \
+         _patch_sklearn(_mock_sklearn(labels)):
+        return diarize("/fake/audio.mp3", segs, **kwargs)
+
+
 def test_diarize_falls_back_on_import_error():
     segs = [_seg(0.0, 3.0, "Hello world"), _seg(5.0, 8.0, "Goodbye world")]
-    with patch("diarizer._convert_to_wav", return_value="/tmp/fake.wav"), \
-         patch("os.unlink"), \
+    with patch("diarizer._pcm_blocks") as mock_decode, \
          patch.dict(sys.modules, {"resemblyzer": None}):
         text, diarized = diarize("/fake/audio.mp3", segs)
     assert diarized is False
     assert "Hello world" in text
     assert "Goodbye world" in text
+    mock_decode.assert_not_called()
 
 
 def test_diarize_labels_two_speakers():
     segs = [_seg(0.0, 3.0, "Hello world"), _seg(5.0, 8.0, "Goodbye world")]
-    mock_r = _mock_resemblyzer(2)
-    mock_sk = _mock_sklearn([0, 1])
-
-    with patch("diarizer._convert_to_wav", return_value="/tmp/fake.wav"), \
-         patch("os.unlink"), \
-         _patch_resemblyzer(mock_r, mock_sk):
-        text, diarized = diarize("/fake/audio.mp3", segs)
+    text, diarized = _diarize_prepared(segs, [0, 1])
 
     assert diarized is True
     assert "Speaker_00: Hello world" in text
@@ -72,13 +71,7 @@ def test_diarize_labels_two_speakers():
 
 def test_diarize_falls_back_on_single_speaker():
     segs = [_seg(0.0, 3.0, "Hello"), _seg(5.0, 8.0, "World")]
-    mock_r = _mock_resemblyzer(2)
-    mock_sk = _mock_sklearn([0, 0])  # both assigned to same cluster
-
-    with patch("diarizer._convert_to_wav", return_value="/tmp/fake.wav"), \
-         patch("os.unlink"), \
-         _patch_resemblyzer(mock_r, mock_sk):
-        text, diarized = diarize("/fake/audio.mp3", segs)
+    text, diarized = _diarize_prepared(segs, [0, 0])  # both assigned to same cluster
 
     assert diarized is False
     assert "Hello" in text
@@ -87,11 +80,7 @@ def test_diarize_falls_back_on_single_speaker():
 
 def test_diarize_falls_back_on_exception():
     segs = [_seg(0.0, 3.0, "Hello")]
-    mock_r = _mock_resemblyzer(1)
-    mock_sk = _mock_sklearn([0])
-
-    with patch("diarizer._convert_to_wav", side_effect=Exception("ffmpeg error")), \
-         _patch_resemblyzer(mock_r, mock_sk):
+    with patch("diarizer.prepare_diarization", side_effect=Exception("ffmpeg error")):
         text, diarized = diarize("/fake/audio.mp3", segs)
 
     assert diarized is False
@@ -99,18 +88,15 @@ def test_diarize_falls_back_on_exception():
 
 
 def test_diarize_skips_very_short_segments():
-    # seg 0 is 0.05s → 800 samples → skipped; seg 1 is 3s → included
-    # Only 1 valid embedding → falls back
+    # seg 0 is 0.05s → skipped; seg 1 is 3s → included
+    # Only 1 valid embedding → falls back without clustering
     segs = [_seg(0.0, 0.05, "Uh"), _seg(5.0, 8.0, "Full sentence")]
-    mock_r = _mock_resemblyzer(1)  # only 1 embed_utterance call expected
     mock_sk = _mock_sklearn([0])
-
-    with patch("diarizer._convert_to_wav", return_value="/tmp/fake.wav"), \
-         patch("os.unlink"), \
-         _patch_resemblyzer(mock_r, mock_sk):
+    with patch("diarizer.prepare_diarization", return_value=_prepared_for(segs)), _patch_sklearn(mock_sk):
         text, diarized = diarize("/fake/audio.mp3", segs)
 
     assert diarized is False
+    mock_sk.cluster.AgglomerativeClustering.assert_not_called()
 
 
 def test_diarize_merges_consecutive_same_speaker():
@@ -120,14 +106,334 @@ def test_diarize_merges_consecutive_same_speaker():
         _seg(3.0, 6.0, "world"),
         _seg(6.0, 9.0, "Goodbye"),
     ]
-    mock_r = _mock_resemblyzer(3)
-    mock_sk = _mock_sklearn([0, 0, 1])
-
-    with patch("diarizer._convert_to_wav", return_value="/tmp/fake.wav"), \
-         patch("os.unlink"), \
-         _patch_resemblyzer(mock_r, mock_sk):
-        text, diarized = diarize("/fake/audio.mp3", segs)
+    text, diarized = _diarize_prepared(segs, [0, 0, 1])
 
     assert diarized is True
     assert "Speaker_00: Hello world" in text
     assert "Speaker_01: Goodbye" in text
+
+
+def test_diarize_returns_per_segment_speakers_when_requested():
+    segs = [_seg(0.0, 3.0, "Hello"), _seg(3.0, 6.0, "world"), _seg(6.0, 9.0, "Goodbye")]
+    text, diarized, speakers = _diarize_prepared(segs, [0, 0, 1], return_speakers=True)
+
+    assert diarized is True
+    assert speakers == ["Speaker_00", "Speaker_00", "Speaker_01"]
+
+
+def test_diarize_returns_no_speakers_on_fallback():
+    segs = [_seg(0.0, 3.0, "Hello")]
+    with patch("diarizer.prepare_diarization", side_effect=Exception("ffmpeg error")):
+        text, diarized, speakers = diarize("/fake/audio.mp3", segs, return_speakers=True)
+    assert (text, diarized, speakers) == ("Hello", False, None)
+
+
+class _WindowedEncoder:
+    """
+    VoiceEncoder stand-in: fixed windows, each embedding its start sample and the chunk's mean.
+    A plain class, since a MagicMock would keep every block it was called with alive.
+    """
+
+    def __init__(self, window=1600, hop=800, dims=2):
+        self.window, self.hop, self.dims = window, hop, dims
+        self.calls = 0
+
+    def embed_utterance(self, chunk, return_partials=False):
+        self.calls += 1
+        starts = range(0, max(len(chunk) - self.window, 0) + 1, self.hop)
+        slices = [slice(s, s + self.window) for s in starts]
+        windows = np.zeros((len(slices), self.dims), dtype=np.float32)
+        windows[:, 0] = list(starts)
+        windows[:, 1] = chunk.mean()
+        return None, windows, slices
+
+
+def _mock_resemblyzer(encoder):
+    mock = MagicMock()
+    mock.VoiceEncoder.return_value = encoder
+    return mock
+
+
+def test_prepare_diarization_keeps_time_aligned_windows():
+    mock_r = _mock_resemblyzer(_WindowedEncoder(window=8000, hop=4000))
+    blocks = [np.zeros(16000, dtype=np.float32), np.zeros(16000, dtype=np.float32),
+              np.zeros(4800, dtype=np.float32)]  # 2.3s decoded as blocks of 1s, 1s, 0.3s
+
+    with patch.dict(sys.modules, {"resemblyzer": mock_r}), \
+         patch("diarizer._duration", return_value=2.3), \
+         patch("diarizer._pcm_blocks", return_value=(b for b in blocks)):
+        prepared = diarizer.prepare_diarization("/fake/audio.mp3", workers=1)
+
+    # Window starts are offset by their block; nothing is trimmed, so times match the recording
+    assert prepared.starts.tolist() == [0.0, 0.25, 0.5, 1.0, 1.25, 1.5, 2.0]
+    assert prepared.ends.tolist() == [0.5, 0.75, 1.0, 1.5, 1.75, 2.0, 2.3]  # padded last window clipped
+    assert prepared.embeddings.shape == (7, 2)
+    assert prepared.embeddings.dtype == np.float32
+
+
+def test_prepare_diarization_stops_decoding_when_cancelled():
+    import threading
+    mock_r = _mock_resemblyzer(_WindowedEncoder(window=8000, hop=4000))
+    cancel = threading.Event()
+    decoded = []
+
+    def blocks(path, block_samples):
+        try:
+            for i in range(100):
+                decoded.append(i)
+                if i == 1:
+                    cancel.set()
+                yield np.zeros(16000, dtype=np.float32)
+        finally:
+            decoded.append("closed")
+
+    with patch.dict(sys.modules, {"resemblyzer": mock_r}), \
+         patch("diarizer._duration", return_value=100.0), \
+         patch("diarizer._pcm_blocks", side_effect=blocks):
+        assert diarizer.prepare_diarization("/fake/audio.mp3", workers=1, cancel=cancel) is None
+    assert decoded[-1] == "closed"  # ffmpeg is torn down at once, not when garbage collected
+    assert len(decoded) < 10
+
+
+def test_window_store_grows_when_duration_is_unknown():
+    store = diarizer._WindowStore(16)
+    for block in range(5):
+        store.add(block * 16000, 16000, np.ones((10, 3), dtype=np.float32), [(i * 1600, (i + 1) * 1600)
+                                                                              for i in range(10)])
+    prepared = store.prepared()
+    assert prepared.embeddings.shape == (50, 3)
+    assert prepared.starts[-1] == pytest.approx(4.9)
+    assert np.all(np.diff(prepared.starts) > 0)
+
+
+def test_plan_blocks_shrinks_blocks_to_fit_the_budget():
+    per_second = diarizer.SAMPLE_RATE * 4 + diarizer.ENCODER_BYTES_PER_SECOND
+    assert diarizer._plan_blocks(2 * 1024 ** 3, workers=1) == (diarizer.PREPARE_BLOCK_SECONDS, 1)
+    for budget, workers in [(4 * 1024 ** 3, 4), (1024 ** 3, 4), (512 * 1024 ** 2, 4), (128 * 1024 ** 2, 2),
+                            (64 * 1024 ** 2, 1)]:
+        seconds, in_flight = diarizer._plan_blocks(budget, workers)
+        assert in_flight <= workers
+        processes = in_flight * diarizer.WORKER_PROCESS_BYTES if in_flight > 1 else 0
+        assert processes + 2 * seconds * in_flight * per_second <= budget
+    assert diarizer._plan_blocks(1024 ** 2, workers=8) == (diarizer.MIN_BLOCK_SECONDS, 1)
+
+
+def test_plan_blocks_runs_serially_when_the_budget_cannot_hold_a_pool():
+    # The default 512 MB can't pay for two spawned workers with torch loaded
+    assert diarizer._plan_blocks(512 * 1024 ** 2, workers=4)[1] == 1
+    assert diarizer._plan_blocks(4 * 1024 ** 3, workers=4)[1] == 4
+
+
+def test_silent_blocks_are_not_amplified_into_nan():
+    assert not np.isnan(diarizer._normalize_volume(np.zeros(1600, dtype=np.float32))).any()
+    quiet = np.full(1600, 1e-6, dtype=np.float32)
+    assert np.abs(diarizer._normalize_volume(quiet)).max() == pytest.approx(1e-6 * 10 ** (30 / 20), rel=1e-4)
+
+
+class _FakeFfmpeg:
+    """Popen stand-in whose stdout produces a long s16le recording without ever holding it."""
+
+    def __init__(self, seconds):
+        self.remaining = seconds * diarizer.SAMPLE_RATE * 2
+        self.stdout = self
+        self.returncode = None
+
+    def read(self, n):
+        n = min(n, self.remaining)
+        self.remaining -= n
+        return b"\x10\x00" * (n // 2)
+
+    def close(self):
+        pass
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        self.returncode = -9
+
+    def wait(self):
+        self.returncode = self.returncode or 0
+        return self.returncode
+
+
+_RSS_PROBE = """
+import resource, sys
+from unittest.mock import patch
+import diarizer
+from tests.test_diarizer import _FakeFfmpeg, _WindowedEncoder, _mock_resemblyzer
+
+hours, budget_mb = int(sys.argv[1]), int(sys.argv[2])
+mock_r = _mock_resemblyzer(_WindowedEncoder(window=25600, hop=12300, dims=256))
+with patch.dict(sys.modules, {"resemblyzer": mock_r}), \\
+     patch("diarizer._duration", return_value=hours * 3600), \\
+     patch("diarizer.subprocess.Popen", return_value=_FakeFfmpeg(hours * 3600)):
+    with open("/proc/self/statm") as f:
+        before = int(f.read().split()[1]) * resource.getpagesize()
+    prepared = diarizer.prepare_diarization("/fake/all_day.mp3", memory_mb=budget_mb)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(len(prepared.starts), peak - before)
+"""
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="reads RSS from /proc")
+def test_prepare_diarization_peak_rss_stays_within_budget():
+    # Peak RSS of a real process, measured from just before preparation starts. The encoder is a
+    # stand-in, so torch's own activations aren't in it: ENCODER_BYTES_PER_SECOND and
+    # WORKER_PROCESS_BYTES reserve budget for those, and benchmarks/diarize_scaling.py measures
+    # them with resemblyzer installed. This catches buffers that grow with the recording.
+    hours, budget_mb = 2, 64
+    whole_recording = hours * 3600 * diarizer.SAMPLE_RATE * 4  # float32, what preprocess_wav would hold
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", _RSS_PROBE, str(hours), str(budget_mb)],
+                            cwd=root, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    windows, growth = map(int, result.stdout.split())
+    assert windows > hours * 3600  # windows over the whole recording
+    assert whole_recording > 6 * budget_mb * 1024 ** 2
+    assert growth < budget_mb * 1024 ** 2, f"peak RSS grew {growth / 1024 ** 2:.1f} MB"
+
+
+def test_pcm_blocks_stops_ffmpeg_when_consumer_stops_early():
+    fake = _FakeFfmpeg(10)
+    with patch("diarizer.subprocess.Popen", return_value=fake):
+        blocks = diarizer._pcm_blocks("/fake/audio.mp3", diarizer.SAMPLE_RATE)
+        first = next(blocks)
+        blocks.close()
+    assert len(first) == diarizer.SAMPLE_RATE
+    assert first.dtype == np.float32
+    assert fake.returncode == -9
+
+
+def test_pcm_blocks_raises_when_ffmpeg_fails():
+    fake = _FakeFfmpeg(0)
+    fake.wait = lambda: setattr(fake, "returncode", 1)
+    with patch("diarizer.subprocess.Popen", return_value=fake), pytest.raises(Exception):
+        list(diarizer._pcm_blocks("/fake/audio.mp3", diarizer.SAMPLE_RATE))
+
+
+_spawn_pool = diarizer._make_pool
+
+
+def _fork_pool(workers, slots, slot_samples):
+    # fork so the children inherit the mocked resemblyzer/torch modules
+    return _spawn_pool(workers, slots, slot_samples, context="fork")
+
+
+def test_embedded_blocks_in_pool_preserve_order():
+    # Each block holds a distinct constant, so its windows identify it; 8 blocks through 3 slots
+    # also checks that a slot is not overwritten while its block is still being embedded
+    blocks = [np.full(16000, i, dtype=np.float32) for i in range(1, 9)]
+    blocks.append(np.zeros(800, dtype=np.float32))  # too short to embed, but still advances time
+    encoder = _WindowedEncoder(window=8000, hop=8000)
+    mock_r = _mock_resemblyzer(encoder)
+
+    with patch.dict(sys.modules, {"resemblyzer": mock_r, "torch": MagicMock()}), \
+         patch("diarizer._make_pool", _fork_pool), \
+         patch("diarizer._normalize_volume", side_effect=lambda block: block):
+        results = list(diarizer._embedded_blocks(iter(blocks), workers=3, in_flight=3, block_samples=16000))
+
+    assert [offset for offset, _, _ in results] == [i * 16000 for i in range(8)]
+    assert [float(windows[0, 1]) for _, _, (windows, _) in results] == list(range(1, 9))
+    assert encoder.calls == 0  # all work happened in the pool processes
+
+
+class _InlinePool:
+    """Runs the worker side in this process, recording what each task was sent."""
+
+    def __init__(self, workers, slots, slot_samples):
+        diarizer._init_worker([shm.name for shm in slots], slot_samples)
+        self.submitted = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def test_embedded_blocks_hand_audio_to_the_pool_through_shared_memory(monkeypatch):
+    monkeypatch.setattr(diarizer, "_worker_slots", None)
+    monkeypatch.setattr(diarizer, "_worker_encoder", None)
+    blocks = [np.full(16000, i, dtype=np.float32) for i in range(1, 4)] + [np.full(9600, 4, dtype=np.float32)]
+    pools = []
+
+    def make_pool(*args):
+        pools.append(_InlinePool(*args))
+        return pools[-1]
+
+    with patch.dict(sys.modules, {"resemblyzer": _mock_resemblyzer(_WindowedEncoder()), "torch": MagicMock()}), \
+         patch("diarizer._make_pool", make_pool), \
+         patch("diarizer._normalize_volume", side_effect=lambda block: block):
+        results = list(diarizer._embedded_blocks(iter(blocks), workers=2, in_flight=2, block_samples=16000))
+
+    # Tasks carry a slot number and a length, never the samples themselves
+    assert pools[0].submitted == [(0, 16000), (1, 16000), (0, 16000), (1, 9600)]
+    assert [float(windows[0, 1]) for _, _, (windows, _) in results] == [1, 2, 3, 4]
+
+
+def test_embedded_blocks_stay_serial_for_a_single_block():
+    encoder = _WindowedEncoder()
+    with patch.dict(sys.modules, {"resemblyzer": _mock_resemblyzer(encoder)}), \
+         patch("diarizer._make_pool") as mock_pool:
+        results = list(diarizer._embedded_blocks(iter([np.ones(16000, dtype=np.float32)]), workers=4,
+                                                 in_flight=4, block_samples=16000))
+    mock_pool.assert_not_called()
+    assert encoder.calls == 1
+    assert [offset for offset, _, _ in results] == [0]
+
+
+def test_segment_embeddings_weight_windows_by_overlap():
+    prepared = diarizer.PreparedAudio(
+        embeddings=np.array([[1.0, 0.0], [0.0, 1.0], [0.0, 1.0]], dtype=np.float32),
+        starts=np.array([0.0, 1.0, 2.0]),
+        ends=np.array([1.6, 2.6, 3.6]),
+    )
+    segs = [_seg(0.0, 1.0, "a"), _seg(1.2, 1.25, "uh"), _seg(1.4, 2.0, "b"), _seg(5.0, 6.0, "late")]
+    embeddings, valid = diarizer._segment_embeddings(prepared, segs)
+    assert valid == [0, 2]  # too short, and past the last window
+    assert embeddings.shape == (2, 2)
+    np.testing.assert_allclose(embeddings[0], [1.0, 0.0])
+    # 0.2s of window 0 and 0.6s of window 1
+    np.testing.assert_allclose(embeddings[1], np.array([0.2, 0.6]) / np.hypot(0.2, 0.6), rtol=1e-6)
+
+
+def test_diarize_with_prepared_audio_does_not_decode_again():
+    prepared = diarizer.PreparedAudio(
+        embeddings=np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32),
+        starts=np.array([0.0, 3.0]),
+        ends=np.array([3.0, 6.0]),
+    )
+    segs = [_seg(0.0, 3.0, "Hello"), _seg(3.0, 6.0, "Goodbye")]
+    mock_sk = _mock_sklearn([0, 1])
+    with patch("diarizer.prepare_diarization") as mock_prepare, _patch_sklearn(mock_sk):
+        text, diarized, speakers = diarize("/fake/audio.mp3", segs, return_speakers=True, prepared=prepared)
+    mock_prepare.assert_not_called()
+    assert speakers == ["Speaker_00", "Speaker_01"]
+    embedded = mock_sk.cluster.AgglomerativeClustering.return_value.fit_predict.call_args[0][0]
+    np.testing.assert_allclose(embedded, [[1.0, 0.0], [0.0, 1.0]])
+
+
+def test_cluster_samples_large_sessions_and_assigns_the_rest_to_centroids():
+    # Two speakers alternating in blocks of 10 segments
+    n = 100
+    embeddings = np.zeros((n, 2), dtype=np.float32)
+    speaker = (np.arange(n) // 10) % 2
+    embeddings[speaker == 0, 0] = 1.0
+    embeddings[speaker == 1, 1] = 1.0
+    clustering = MagicMock()
+    clustering.fit_predict.side_effect = lambda x: (x[:, 1] > 0.5).astype(int) + 7
+    mock_sk = MagicMock()
+    mock_sk.cluster.AgglomerativeClustering.return_value = clustering
+
+    with _patch_sklearn(mock_sk):
+        labels = diarizer._cluster(embeddings, max_segments=30)
+
+    assert len(clustering.fit_predict.call_args[0][0]) == 30  # only the sample is clustered
+    assert labels.tolist() == (speaker + 7).tolist()
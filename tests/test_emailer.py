@@ -42,3 +42,18 @@ def test_send_notes_attaches_transcript(tmp_path):
     assert "Meeting Notes" in msg["Subject"]
     payloads = msg.get_payload()
     assert len(payloads) == 2  # body + attachment
+
+def test_send_notes_uses_configured_smtp_server(tmp_path, monkeypatch):
+    transcript_file = tmp_path / "transcript.txt"
+    transcript_file.write_text("Transcript")
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", "2525")
+    monkeypatch.setenv("SMTP_STARTTLS", "false")
+    with patch("emailer.smtplib.SMTP") as mock_smtp_class:
+        mock_smtp = MagicMock()
+        mock_smtp_class.return_value.__enter__ = MagicMock(return_value=mock_smtp)
+        mock_smtp_class.return_value.__exit__ = MagicMock(return_value=False)
+        send_notes("u@example.com", "pw", "u@example.com", "label", "summary", str(transcript_file))
+    mock_smtp_class.assert_called_with("127.0.0.1", 2525)
+    mock_smtp.starttls.assert_not_called()
+    mock_smtp.login.assert_called_once_with("u@example.com", "pw")
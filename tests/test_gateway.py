@@ -0,0 +1,207 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+import pytest
+from gateway import Gateway, TokenBucket
+
+
+class _StandIn(ThreadingHTTPServer):
+    """Local chat-completions endpoint that answers the first `fail_first` requests with 429."""
+    daemon_threads = True
+
+    def __init__(self, fail_first=0, retry_after_ms=None, latency=0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.fail_first = fail_first
+        self.retry_after_ms = retry_after_ms
+        self.latency = latency
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.requests.append(time.monotonic())
+            n = len(server.requests)
+        time.sleep(server.latency)
+        if n <= server.fail_first:
+            body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests"}}).encode()
+            self.send_response(429)
+            if server.retry_after_ms is not None:
+                self.send_header("retry-after-ms", str(server.retry_after_ms))
+        else:
+            body = json.dumps({
+                "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "stand-in",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "Summary"}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+            }).encode()
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stand_in(request):
+    server = _StandIn(**getattr(request, "param", {}))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _chat(server):
+    from groq import Groq
+    client = Groq(api_key="test", base_url=server.url, max_retries=0)
+    return lambda: client.chat.completions.create(
+        model="stand-in", messages=[{"role": "user", "content": "hi"}]
+    )
+
+
+@pytest.mark.parametrize("stand_in", [{"fail_first": 2, "retry_after_ms": 50, "latency": 0.02}], indirect=True)
+def test_retries_429_honoring_retry_after(stand_in):
+    gw = Gateway(default_rpm=6000, base_delay=0.01)
+    response = gw.call("chat", _chat(stand_in))
+    assert response.choices[0].message.content == "Summary"
+    assert len(stand_in.requests) == 3
+    # Each retry waited at least the server's 50ms hint
+    gaps = [b - a for a, b in zip(stand_in.requests, stand_in.requests[1:])]
+    assert all(gap >= 0.05 for gap in gaps)
+    stats = gw.stats()["chat"]
+    assert stats["calls"] == 3
+    assert stats["retries"] == 2
+    assert stats["rate_limited"] == 2
+    assert stats["p50_ms"] >= 20
+
+
+@pytest.mark.parametrize("stand_in", [{"fail_first": 100}], indirect=True)
+def test_gives_up_after_max_retries(stand_in):
+    from groq import RateLimitError
+    gw = Gateway(default_rpm=6000, max_retries=2, base_delay=0.001)
+    with pytest.raises(RateLimitError):
+        gw.call("chat", _chat(stand_in))
+    assert len(stand_in.requests) == 3
+
+
+def test_non_retryable_errors_raise_immediately():
+    gw = Gateway(default_rpm=6000, sleep=MagicMock())
+    error = ValueError("bad request")
+    error.status_code = 400
+    fn = MagicMock(side_effect=error)
+    with pytest.raises(ValueError):
+        gw.call("chat", fn)
+    assert fn.call_count == 1
+    assert gw.stats()["chat"]["errors"] == 1
+
+
+def test_backoff_without_hint_is_jittered_exponential():
+    gw = Gateway(base_delay=1.0, max_delay=8.0)
+    for attempt in range(6):
+        delay = gw._backoff(attempt, None)
+        assert 0 <= delay <= min(8.0, 2 ** attempt)
+
+
+def test_concurrency_is_capped():
+    gw = Gateway(default_rpm=60000, burst=100, max_concurrency=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.02)
+        with lock:
+            active.pop()
+
+    threads = [threading.Thread(target=gw.call, args=("chat", work)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) == 2
+
+
+def test_token_bucket_waits_when_empty():
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2.0, capacity=2, clock=lambda: now[0], sleep=sleep)
+    bucket.acquire()
+    bucket.acquire()
+    assert waits == []
+    bucket.acquire()
+    assert waits == [pytest.approx(0.5)]
+
+
+def test_endpoints_have_separate_buckets():
+    gw = Gateway(rpm={"transcribe": 20}, default_rpm=30)
+    assert gw._bucket("transcribe").rate == pytest.approx(20 / 60)
+    assert gw._bucket("chat").rate == pytest.approx(30 / 60)
+
+
+@pytest.mark.parametrize("stand_in", [{"latency": 0.2}], indirect=True)
+def test_identical_calls_in_flight_are_coalesced(stand_in):
+    gateway = Gateway(default_rpm=6000, burst=10, max_concurrency=4)
+    chat = _chat(stand_in)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gateway.call("chat", chat, coalesce_key="q")))
+               for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(stand_in.requests) == 1
+    assert len(results) == 3 and results[0] is results[1] is results[2]
+    assert gateway.stats()["chat"]["coalesced"] == 2
+    gateway.call("chat", chat, coalesce_key="q")  # finished calls aren't reused
+    assert len(stand_in.requests) == 2
+
+
+def test_coalesced_callers_share_the_failure():
+    gateway = Gateway(max_retries=0)
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("bad request")
+
+    errors = []
+
+    def call():
+        try:
+            gateway.call("chat", fail, coalesce_key="q")
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while not gateway.stats().get("chat", {}).get("coalesced"):
+        time.sleep(0.01)
+    release.set()
+    leader.join()
+    follower.join()
+    assert len(errors) == 2
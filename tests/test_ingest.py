@@ -0,0 +1,85 @@
+import io
+from unittest.mock import patch
+from jobs import JobManager
+import ingest
+
+
+def _fake_normalize(src, dest):
+    with open(src, "rb") as f, open(dest, "wb") as out:
+        out.write(f.read())
+
+
+def test_save_stream_reads_in_chunks(tmp_path):
+    stream = io.BytesIO(b"x" * 10)
+    reads = []
+    original_read = stream.read
+    stream.read = lambda n: reads.append(n) or original_read(n)
+    dest = tmp_path / "out.bin"
+    ingest.save_stream(stream, str(dest), chunk_size=4)
+    assert dest.read_bytes() == b"x" * 10
+    assert set(reads) == {4}
+
+
+def test_recording_paths_are_unique(tmp_path):
+    paths = {ingest.recording_path(str(tmp_path)) for _ in range(20)}
+    assert len(paths) == 20
+    assert all(p.endswith(".mp3") for p in paths)
+
+
+def test_upload_label_uses_file_stem():
+    assert ingest.upload_label("/phone/Standup 03.m4a") == "Standup 03"
+    assert ingest.upload_label(None) == "upload"
+
+
+def test_import_directory_queues_audio_files_only(tmp_path):
+    src = tmp_path / "src"
+    out = tmp_path / "out"
+    src.mkdir()
+    out.mkdir()
+    (src / "a.mp3").write_bytes(b"a")
+    (src / "b.M4A").write_bytes(b"b")
+    (src / "notes.txt").write_text("not audio")
+    jm = JobManager(":memory:")
+    with patch("ingest.normalize_audio", side_effect=_fake_normalize):
+        results = ingest.import_directory(str(src), jm, str(out), concurrency=2)
+    assert sorted(results) == [str(src / "a.mp3"), str(src / "b.M4A")]
+    labels = sorted(job["label"] for job in jm.list_jobs())
+    assert labels == ["a", "b"]
+    assert all(job["status"] == "pending" for job in jm.list_jobs())
+
+
+def test_import_directory_reports_failures_and_continues(tmp_path):
+    (tmp_path / "bad.mp3").write_bytes(b"")
+    (tmp_path / "good.mp3").write_bytes(b"ok")
+    jm = JobManager(":memory:")
+
+    def normalize(src, dest):
+        if src.endswith("bad.mp3"):
+            raise RuntimeError("ffmpeg failed")
+        _fake_normalize(src, dest)
+
+    with patch("ingest.normalize_audio", side_effect=normalize):
+        results = ingest.import_directory(str(tmp_path), jm, str(tmp_path), concurrency=1)
+    assert results[str(tmp_path / "bad.mp3")] is None
+    assert results[str(tmp_path / "good.mp3")] is not None
+
+
+def test_import_directory_runs_pipeline_with_settings(tmp_path):
+    (tmp_path / "a.mp3").write_bytes(b"a")
+    jm = JobManager(":memory:")
+    settings = {"transcript_dir": str(tmp_path)}
+    with patch("ingest.normalize_audio", side_effect=_fake_normalize), \
+         patch.object(jm, "process") as mock_process:
+        ingest.import_directory(str(tmp_path), jm, str(tmp_path), settings=settings)
+    assert mock_process.call_args[1]["transcript_dir"] == str(tmp_path)
+
+
+def test_import_with_settings_creates_job_already_claimed(tmp_path):
+    (tmp_path / "a.mp3").write_bytes(b"a")
+    jm = JobManager(":memory:")
+    seen = []
+    with patch("ingest.normalize_audio", side_effect=_fake_normalize), \
+         patch.object(jm, "process", side_effect=lambda job_id, **_: seen.append(jm.claim_next_job())):
+        job_id = ingest.import_file(str(tmp_path / "a.mp3"), jm, str(tmp_path), settings={"x": 1})
+    assert seen == [None]  # a worker polling meanwhile finds nothing to claim
+    assert jm.get_job(job_id)["status"] == "transcribing"
@@ -2,6 +2,7 @@ import time
 import pytest
 from unittest.mock import patch, MagicMock
 from jobs import JobManager, JobStatus
+from transcriber import Segment
 
 
 def test_new_job_is_pending():
@@ -26,9 +27,9 @@ def test_process_job_runs_pipeline(tmp_path):
     jm = JobManager(":memory:")
     job_id = jm.create_job("meeting_20260218_1030")
 
-    mock_summarize = MagicMock(return_value="summary text")
+    mock_summarize = MagicMock(return_value=("summary text", {"strategy": "brief"}))
     with patch("jobs.transcribe", return_value=("transcript text", [])), \
-         patch("jobs.diarize", return_value=("transcript text", False)), \
+         patch("jobs.diarize", return_value=("transcript text", False, None)), \
          patch("jobs.summarize", mock_summarize), \
          patch("jobs.send_notes"):
         jm.process(
@@ -43,7 +44,8 @@ def test_process_job_runs_pipeline(tmp_path):
 
     job = jm.get_job(job_id)
     assert job["status"] == JobStatus.DONE
-    mock_summarize.assert_called_once_with("transcript text", model="llama-3.3-70b-versatile", diarized=False)
+    mock_summarize.assert_called_once_with("transcript text", model="llama-3.3-70b-versatile",
+                                           diarized=False, return_stats=True)
 
 
 def test_process_job_sets_error_on_failure(tmp_path):
@@ -77,9 +79,9 @@ def test_process_job_sets_transcript_path_and_summary(tmp_path):
     jm = JobManager(":memory:")
     job_id = jm.create_job("meeting_20260218_1030")
 
-    mock_summarize = MagicMock(return_value="summary text")
+    mock_summarize = MagicMock(return_value=("summary text", {"strategy": "brief"}))
     with patch("jobs.transcribe", return_value=("transcript text", [])), \
-         patch("jobs.diarize", return_value=("transcript text", False)), \
+         patch("jobs.diarize", return_value=("transcript text", False, None)), \
          patch("jobs.summarize", mock_summarize), \
          patch("jobs.send_notes"):
         jm.process(
@@ -95,6 +97,7 @@ def test_process_job_sets_transcript_path_and_summary(tmp_path):
     job = jm.get_job(job_id)
     assert job["transcript_path"] is not None
     assert job["summary"] == "summary text"
+    assert job["metrics"]["summary"] == {"strategy": "brief"}
 
 
 def test_startup_marks_interrupted_jobs_as_error():
@@ -115,9 +118,11 @@ def test_process_job_writes_diarized_transcript(tmp_path):
     jm = JobManager(":memory:")
     job_id = jm.create_job("meeting_20260218_1030")
 
-    with patch("jobs.transcribe", return_value=("plain text", [])), \
-         patch("jobs.diarize", return_value=("Speaker_00: Hello\nSpeaker_01: World", True)), \
-         patch("jobs.summarize", return_value="summary"), \
+    segments = [Segment(0.0, 1.0, "Hello"), Segment(1.0, 2.0, "World")]
+    with patch("jobs.transcribe", return_value=("Hello World", segments)), \
+         patch("jobs.diarize", return_value=("Speaker_00: Hello\nSpeaker_01: World", True,
+                                             ["Speaker_00", "Speaker_01"])), \
+         patch("jobs.summarize", return_value=("summary", {"strategy": "brief"})), \
          patch("jobs.send_notes"):
         jm.process(
             job_id=job_id,
@@ -133,3 +138,474 @@ def test_process_job_writes_diarized_transcript(tmp_path):
     transcript_contents = open(job["transcript_path"]).read()
     assert "Speaker_00: Hello" in transcript_contents
     assert "Speaker_01: World" in transcript_contents
+
+
+def test_claim_next_job_takes_oldest_pending():
+    jm = JobManager(":memory:")
+    first = jm.create_job("meeting_a")
+    jm.create_job("meeting_b")
+    job = jm.claim_next_job()
+    assert job["id"] == first
+    assert job["status"] == JobStatus.TRANSCRIBING
+
+
+def test_claim_next_job_returns_none_when_queue_empty():
+    jm = JobManager(":memory:")
+    assert jm.claim_next_job() is None
+
+
+def test_claim_is_exclusive_across_connections(tmp_path):
+    db = str(tmp_path / "jobs.db")
+    web = JobManager(db)
+    job_id = web.create_job("meeting_a")
+    worker_a = JobManager(db, recover=False)
+    worker_b = JobManager(db, recover=False)
+    claims = [worker_a.claim_next_job(), worker_b.claim_next_job()]
+    assert [c["id"] for c in claims if c] == [job_id]
+
+
+def test_recover_in_flight_keeps_pending_jobs_queued():
+    jm = JobManager(":memory:")
+    queued = jm.create_job("meeting_queued")
+    running = jm.create_job("meeting_running")
+    jm._set_status(running, JobStatus.SUMMARIZING)
+    jm.recover_in_flight()
+    assert jm.get_job(queued)["status"] == JobStatus.PENDING
+    assert jm.get_job(running)["status"] == JobStatus.ERROR
+
+
+def test_process_job_saves_structured_transcript(tmp_path):
+    from transcript_store import load_transcript
+    audio = tmp_path / "meeting.mp3"
+    audio.write_bytes(b"fake audio")
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting")
+    segments = [Segment(0.0, 1.5, " Hi all"), Segment(1.5, 4.0, " Morning")]
+
+    with patch("jobs.transcribe", return_value=("Hi all Morning", segments)), \
+         patch("jobs.diarize", return_value=("", True, ["Speaker_01", "Speaker_00"])), \
+         patch("jobs.summarize", return_value=("summary", {"strategy": "brief"})), \
+         patch("jobs.send_notes"):
+        jm.process(job_id=job_id, audio_path=str(audio), transcript_dir=str(tmp_path),
+                   gmail_user="u@g.com", gmail_password="pw", to_address="u@g.com",
+                   summary_model="llama-3.3-70b-versatile")
+
+    stored = load_transcript(str(tmp_path / "meeting.segments.json"))
+    assert stored.diarized
+    assert stored.between(2.0, 3.0) == [{"start": 1.5, "end": 4.0, "speaker": "Speaker_00", "text": "Morning"}]
+
+
+def test_process_job_reuses_structured_transcript_on_retry(tmp_path):
+    from transcript_store import save_transcript
+    audio = tmp_path / "meeting.mp3"
+    audio.write_bytes(b"fake audio")
+    save_transcript(str(tmp_path / "meeting.segments.json"),
+                    [Segment(0.0, 1.0, "Hello"), Segment(1.0, 2.0, "World")], ["Speaker_00", "Speaker_01"])
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting")
+
+    mock_summarize = MagicMock(return_value=("summary", {"strategy": "brief"}))
+    with patch("jobs.transcribe") as mock_transcribe, \
+         patch("jobs.diarize") as mock_diarize, \
+         patch("jobs.summarize", mock_summarize), \
+         patch("jobs.send_notes"):
+        jm.process(job_id=job_id, audio_path=str(audio), transcript_dir=str(tmp_path),
+                   gmail_user="u@g.com", gmail_password="pw", to_address="u@g.com",
+                   summary_model="llama-3.3-70b-versatile")
+
+    mock_transcribe.assert_not_called()
+    mock_diarize.assert_not_called()
+    mock_summarize.assert_called_once_with("Spk0: Hello\nSpk1: World",
+                                           model="llama-3.3-70b-versatile", diarized=True, return_stats=True)
+    assert (tmp_path / "meeting.txt").read_text() == "Speaker_00: Hello\nSpeaker_01: World"
+
+
+def test_migrate_adds_columns_to_existing_database(tmp_path):
+    import sqlite3
+    db = str(tmp_path / "jobs.db")
+    conn = sqlite3.connect(db)
+    conn.execute("""
+        CREATE TABLE jobs (id TEXT PRIMARY KEY, label TEXT NOT NULL, status TEXT NOT NULL,
+                           summary TEXT, transcript_path TEXT, audio_path TEXT, error TEXT,
+                           created_at TEXT NOT NULL)
+    """)
+    conn.execute("INSERT INTO jobs VALUES ('old1', 'old', 'done', 's', NULL, NULL, NULL, '2026-01-01')")
+    conn.commit()
+    conn.close()
+    jm = JobManager(db)
+    assert jm.get_job("old1")["metrics"] is None
+    assert jm.get_job("old1")["room"] is None
+
+
+def test_process_job_summarizes_compacted_transcript(tmp_path):
+    audio = tmp_path / "meeting.mp3"
+    audio.write_bytes(b"fake audio")
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting")
+    segments = [Segment(0.0, 2.0, "Um, budget is approved."), Segment(2.0, 4.0, "Thanks. Thanks. Thanks.")]
+
+    mock_summarize = MagicMock(return_value=("Spk1 will circulate it.", {"strategy": "brief"}))
+    with patch("jobs.transcribe", return_value=("", segments)), \
+         patch("jobs.diarize", return_value=("", True, ["Speaker_00", "Speaker_01"])), \
+         patch("jobs.summarize", mock_summarize), \
+         patch("jobs.send_notes"):
+        jm.process(job_id=job_id, audio_path=str(audio), transcript_dir=str(tmp_path),
+                   gmail_user="u@g.com", gmail_password="pw", to_address="u@g.com",
+                   summary_model="llama-3.3-70b-versatile")
+
+    assert mock_summarize.call_args[0][0] == "Spk0: budget is approved.\nSpk1: Thanks."
+    job = jm.get_job(job_id)
+    assert job["summary"] == "Speaker_01 will circulate it."
+    assert job["metrics"]["compaction"]["fillers_removed"] == 1
+    # The transcript itself is kept verbatim
+    assert "Um, budget" in (tmp_path / "meeting.txt").read_text()
+
+
+def _run_done_job(jm, tmp_path):
+    audio = tmp_path / "meeting.mp3"
+    audio.write_bytes(b"fake audio")
+    job_id = jm.create_job("meeting")
+    with patch("jobs.transcribe", return_value=("", [Segment(0.0, 2.0, "Budget approved")])), \
+         patch("jobs.diarize", return_value=("", False, None)), \
+         patch("jobs.summarize", return_value=("1. SUMMARY\n- Budget", {})), \
+         patch("jobs.send_notes"):
+        jm.process(job_id=job_id, audio_path=str(audio), transcript_dir=str(tmp_path),
+                   gmail_user="u@g.com", gmail_password="pw", to_address="u@g.com",
+                   summary_model="llama-3.3-70b-versatile")
+    return job_id
+
+
+def test_process_job_indexes_transcript_and_summary(tmp_path):
+    index = MagicMock()
+    jm = JobManager(":memory:", index=index)
+    job_id = _run_done_job(jm, tmp_path)
+    args = index.add.call_args[0]
+    assert args[:2] == (job_id, "meeting")
+    assert [c["kind"] for c in args[2]] == ["transcript", "summary:summary"]
+
+
+def test_index_failure_does_not_fail_job(tmp_path):
+    index = MagicMock()
+    index.add.side_effect = ImportError("No module named 'sentence_transformers'")
+    jm = JobManager(":memory:", index=index)
+    job_id = _run_done_job(jm, tmp_path)
+    assert jm.get_job(job_id)["status"] == JobStatus.DONE
+
+
+def _old_done_job(jm, tmp_path, label="old meeting", days_ago=90):
+    from datetime import datetime, timedelta
+    from transcript_store import save_transcript
+    transcript = tmp_path / f"{label}.txt"
+    save_transcript(str(tmp_path / f"{label}.segments.json"),
+                    [Segment(0.0, 1.0, "Hello"), Segment(1.0, 2.0, "World")], ["Speaker_00", "Speaker_01"])
+    job_id = jm.create_job(label)
+    created = (datetime.now() - timedelta(days=days_ago)).isoformat()
+    jm._db.execute("UPDATE jobs SET status='done', summary=?, transcript_path=?, created_at=? WHERE id=?",
+                   ("1. SUMMARY\n- Hello world", str(transcript), created, job_id))
+    jm._db.commit()
+    return job_id
+
+
+def test_archive_moves_old_done_jobs_out_of_hot_table(tmp_path):
+    jm = JobManager(str(tmp_path / "jobs.db"))
+    old_id = _old_done_job(jm, tmp_path)
+    recent_id = _old_done_job(jm, tmp_path, label="recent", days_ago=1)
+    failed_id = jm.create_job("failed")
+    jm._db.execute("UPDATE jobs SET status='error', created_at='2020-01-01' WHERE id=?", (failed_id,))
+    jm._db.commit()
+
+    assert jm.archive_jobs(older_than_days=30) == 1
+
+    assert [j["id"] for j in jm.list_jobs()] == [recent_id, failed_id]
+    assert jm._db.execute("SELECT COUNT(*) FROM jobs WHERE id=?", (old_id,)).fetchone()[0] == 0
+    assert not (tmp_path / "old meeting.txt").exists()
+    assert not (tmp_path / "old meeting.segments.json").exists()
+    assert jm._db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # incremental
+
+
+def test_archived_job_is_still_readable(tmp_path):
+    from transcript_store import loads_transcript
+    jm = JobManager(str(tmp_path / "jobs.db"))
+    job_id = _old_done_job(jm, tmp_path)
+    jm.archive_jobs(older_than_days=30)
+
+    job = jm.get_job(job_id)
+    assert job["archived"] is True
+    assert job["summary"] == "1. SUMMARY\n- Hello world"
+    assert jm.archived_file(job_id, "transcript") == b"Speaker_00: Hello\nSpeaker_01: World"
+    stored = loads_transcript(jm.archived_file(job_id, "segments"))
+    assert stored.between(1.5, 2.0)[0]["speaker"] == "Speaker_01"
+
+
+def test_list_jobs_can_include_archived(tmp_path):
+    jm = JobManager(str(tmp_path / "jobs.db"))
+    old_id = _old_done_job(jm, tmp_path)
+    recent_id = _old_done_job(jm, tmp_path, label="recent", days_ago=1)
+    jm.archive_jobs(older_than_days=30)
+    jobs = jm.list_jobs(include_archived=True)
+    assert [j["id"] for j in jobs] == [recent_id, old_id]
+    assert jobs[1]["archived"] is True
+
+
+def test_archive_compresses_summaries(tmp_path):
+    jm = JobManager(str(tmp_path / "jobs.db"))
+    job_id = _old_done_job(jm, tmp_path)
+    summary = "- the same action item again\n" * 200
+    jm._db.execute("UPDATE jobs SET summary=? WHERE id=?", (summary, job_id))
+    jm._db.commit()
+    jm.archive_jobs(older_than_days=30)
+    blob = jm._db.execute("SELECT summary_z FROM jobs_archive WHERE id=?", (job_id,)).fetchone()[0]
+    assert len(blob) < len(summary) / 10
+    assert jm.get_job(job_id)["summary"] == summary
+
+
+def test_archive_skips_a_job_it_cannot_read(tmp_path, capsys):
+    db = str(tmp_path / "jobs.db")
+    jm = JobManager(db)
+    bad_id = _old_done_job(jm, tmp_path, label="corrupt", days_ago=120)
+    (tmp_path / "corrupt.segments.json").write_text("{not json")
+    good_id = _old_done_job(jm, tmp_path)
+
+    assert jm.archive_jobs(older_than_days=30, batch_size=1) == 1
+    assert [j["id"] for j in jm.list_jobs()] == [bad_id]
+    assert jm.get_job(good_id)["archived"] is True
+    assert not jm._db.in_transaction
+    assert bad_id in capsys.readouterr().err
+    other = JobManager(db)  # the database isn't left locked
+    other.create_job("next meeting")
+    assert jm.archive_jobs(older_than_days=30) == 0
+
+
+def test_archive_with_nothing_old_is_a_no_op(tmp_path):
+    jm = JobManager(str(tmp_path / "jobs.db"))
+    _old_done_job(jm, tmp_path, days_ago=1)
+    assert jm.archive_jobs(older_than_days=30) == 0
+
+
+def test_process_removes_live_caption_draft(tmp_path):
+    audio = tmp_path / "meeting.mp3"
+    audio.write_bytes(b"fake audio")
+    draft = tmp_path / "meeting.draft.txt"
+    draft.write_text("rough live captions\n")
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting")
+    with patch("jobs.transcribe", return_value=("final text", [])), \
+         patch("jobs.diarize", return_value=("final text", False, None)), \
+         patch("jobs.summarize", return_value=("summary", {})), \
+         patch("jobs.send_notes"):
+        jm.process(job_id=job_id, audio_path=str(audio), transcript_dir=str(tmp_path),
+                   gmail_user="u@g.com", gmail_password="pw", to_address="u@g.com",
+                   summary_model="llama-3.3-70b-versatile")
+    assert jm.get_job(job_id)["status"] == JobStatus.DONE
+    assert not draft.exists()
+    assert (tmp_path / "meeting.txt").read_text() == "final text"
+
+
+def test_diarization_prep_overlaps_transcription(tmp_path):
+    import threading
+    audio = tmp_path / "meeting.mp3"
+    audio.write_bytes(b"fake audio")
+    prep_started = threading.Event()
+    prepared = object()
+
+    def prepare(path, cancel):
+        prep_started.set()
+        return prepared
+
+    def transcribe(path, return_segments):
+        # Only returns once preparation is underway, so a sequential pipeline would time out here
+        assert prep_started.wait(timeout=5)
+        return "Hello", [Segment(0.0, 1.0, "Hello")]
+
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting")
+    with patch("jobs.prepare_diarization", side_effect=prepare), \
+         patch("jobs.transcribe", side_effect=transcribe), \
+         patch("jobs.diarize", return_value=("Hello", False, None)) as mock_diarize, \
+         patch("jobs.summarize", return_value=("summary", {})), \
+         patch("jobs.send_notes"):
+        jm.process(job_id=job_id, audio_path=str(audio), transcript_dir=str(tmp_path),
+                   gmail_user="u@g.com", gmail_password="pw", to_address="u@g.com",
+                   summary_model="llama-3.3-70b-versatile")
+    job = jm.get_job(job_id)
+    assert job["status"] == JobStatus.DONE
+    assert mock_diarize.call_args.kwargs["prepared"] is prepared
+    assert set(job["metrics"]["timings"]) == {"transcribe_seconds", "diarize_wait_seconds"}
+
+
+def test_failed_diarization_prep_falls_back_to_plain_diarize(tmp_path):
+    audio = tmp_path / "meeting.mp3"
+    audio.write_bytes(b"fake audio")
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting")
+    with patch("jobs.prepare_diarization", side_effect=RuntimeError("ffmpeg error")), \
+         patch("jobs.transcribe", return_value=("Hello", [Segment(0.0, 1.0, "Hello")])), \
+         patch("jobs.diarize", return_value=("Hello", False, None)) as mock_diarize, \
+         patch("jobs.summarize", return_value=("summary", {})), \
+         patch("jobs.send_notes"):
+        jm.process(job_id=job_id, audio_path=str(audio), transcript_dir=str(tmp_path),
+                   gmail_user="u@g.com", gmail_password="pw", to_address="u@g.com",
+                   summary_model="llama-3.3-70b-versatile")
+    assert jm.get_job(job_id)["status"] == JobStatus.DONE
+    assert mock_diarize.call_args.kwargs["prepared"] is None
+
+
+def test_failed_transcription_stops_diarization_prep_first(tmp_path):
+    import threading
+    audio = tmp_path / "meeting.mp3"
+    audio.write_bytes(b"fake audio")
+    prep_started, prep_stopped = threading.Event(), threading.Event()
+
+    def prepare(path, cancel):
+        prep_started.set()
+        if cancel.wait(timeout=5):
+            time.sleep(0.05)  # winding down: ffmpeg killed, pool shut down
+            prep_stopped.set()
+
+    def transcribe(path, return_segments):
+        assert prep_started.wait(timeout=5)
+        raise RuntimeError("Groq unavailable")
+
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting")
+    with patch("jobs.prepare_diarization", side_effect=prepare), \
+         patch("jobs.transcribe", side_effect=transcribe):
+        jm.process(job_id=job_id, audio_path=str(audio), transcript_dir=str(tmp_path),
+                   gmail_user="u@g.com", gmail_password="pw", to_address="u@g.com",
+                   summary_model="llama-3.3-70b-versatile")
+    assert prep_stopped.is_set()  # process() returned, and recorded the failure, only after prep stopped
+    job = jm.get_job(job_id)
+    assert job["status"] == JobStatus.ERROR
+    assert job["error"] == "Groq unavailable"
+
+
+def test_lease_takes_oldest_pending_job():
+    jm = JobManager(":memory:")
+    first = jm.create_job("meeting_a", room="board")
+    jm.create_job("meeting_b")
+    job = jm.lease_next_job("gpu-box", lease_seconds=60)
+    assert job["id"] == first
+    assert job["status"] == JobStatus.TRANSCRIBING
+    assert job["lease_owner"] == "gpu-box"
+    assert job["room"] == "board"
+
+
+def test_live_lease_is_not_reassigned():
+    jm = JobManager(":memory:")
+    jm.create_job("meeting_a")
+    assert jm.lease_next_job("a", lease_seconds=60)
+    assert jm.lease_next_job("b", lease_seconds=60) is None
+
+
+def test_expired_lease_is_reassigned():
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting_a")
+    jm.lease_next_job("a", lease_seconds=60)
+    jm.heartbeat(job_id, "a", status=JobStatus.DIARIZING)
+    with patch("jobs.time.time", return_value=time.time() + 3600):
+        job = jm.lease_next_job("b", lease_seconds=60)
+    assert job["id"] == job_id
+    assert job["lease_owner"] == "b"
+    assert job["status"] == JobStatus.TRANSCRIBING
+    assert jm.heartbeat(job_id, "a") is False
+    assert jm.complete_lease(job_id, "a", "s", "/tmp/t.txt", {}, MagicMock()) is False
+
+
+def test_job_is_failed_after_its_lease_expires_too_often():
+    from jobs import MAX_LEASE_ATTEMPTS
+    jm = JobManager(":memory:")
+    crasher = jm.create_job("all-day recording")
+    later = jm.create_job("standup")
+    now = time.time()
+    for attempt in range(MAX_LEASE_ATTEMPTS):
+        with patch("jobs.time.time", return_value=now + attempt * 3600):
+            job = jm.lease_next_job(f"w{attempt}", lease_seconds=60)
+        assert job["id"] == crasher
+        assert job["attempts"] == attempt + 1
+    with patch("jobs.time.time", return_value=now + MAX_LEASE_ATTEMPTS * 3600):
+        assert jm.lease_next_job("w9", lease_seconds=60)["id"] == later
+    job = jm.get_job(crasher)
+    assert job["status"] == JobStatus.ERROR
+    assert "lease expired" in job["error"]
+    assert not jm._db.in_transaction
+    assert jm.retry_job(crasher)
+    assert jm.get_job(crasher)["attempts"] == 0
+
+
+def test_heartbeat_extends_lease_and_reports_stage():
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting_a")
+    before = jm.lease_next_job("a", lease_seconds=10)["lease_expires"]
+    assert jm.heartbeat(job_id, "a", lease_seconds=600, status=JobStatus.SUMMARIZING)
+    job = jm.get_job(job_id)
+    assert job["lease_expires"] > before + 500
+    assert job["status"] == JobStatus.SUMMARIZING
+    with pytest.raises(ValueError):
+        jm.heartbeat(job_id, "a", status=JobStatus.DONE)
+
+
+def test_complete_lease_marks_done_and_indexes():
+    index = MagicMock()
+    jm = JobManager(":memory:", index=index)
+    job_id = jm.create_job("meeting_a")
+    jm.lease_next_job("a")
+    stored = MagicMock()
+    with patch("jobs.transcript_chunks", return_value=[]), patch("jobs.summary_chunks", return_value=[]):
+        assert jm.complete_lease(job_id, "a", "summary", "/tmp/t.txt", {"timings": {}}, stored)
+    job = jm.get_job(job_id)
+    assert job["status"] == JobStatus.DONE
+    assert job["lease_owner"] == "a" and job["lease_expires"] is None
+    assert job["metrics"] == {"timings": {}}
+    index.add.assert_called_once()
+
+
+def test_fail_lease_then_retry_clears_lease():
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting_a")
+    jm.lease_next_job("a")
+    assert jm.fail_lease(job_id, "b", "boom") is False
+    assert jm.fail_lease(job_id, "a", "boom")
+    assert jm.get_job(job_id)["error"] == "boom"
+    assert jm.retry_job(job_id)
+    assert jm.get_job(job_id)["lease_owner"] is None
+
+
+def test_restart_leaves_leased_jobs_to_their_workers():
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting_a")
+    jm.lease_next_job("a")
+    jm._recover()
+    assert jm.get_job(job_id)["status"] == JobStatus.TRANSCRIBING
+
+
+def test_list_jobs_filters_by_room():
+    jm = JobManager(":memory:")
+    jm.create_job("meeting_a", room="board")
+    jm.create_job("meeting_b", room="lab")
+    assert [j["label"] for j in jm.list_jobs(room="lab")] == ["meeting_b"]
+
+
+def test_archiving_never_rewrites_the_whole_database(tmp_path):
+    import sqlite3
+    db = str(tmp_path / "jobs.db")
+    sqlite3.connect(db).execute("CREATE TABLE legacy (x)").connection.commit()  # predates incremental vacuum
+    jm = JobManager(db)
+    _old_done_job(jm, tmp_path)
+    statements = []
+    jm._db.set_trace_callback(statements.append)
+    assert jm.archive_jobs(older_than_days=30) == 1
+    assert not [s for s in statements if s.strip().upper() == "VACUUM"]
+    assert jm._db.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+
+    assert jm.enable_incremental_vacuum() is True
+    assert jm._db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert jm.enable_incremental_vacuum() is False
+
+
+def test_index_bug_is_logged_and_job_stays_done(tmp_path, capsys):
+    index = MagicMock()
+    index.add.side_effect = KeyError("dim")
+    jm = JobManager(":memory:", index=index)
+    job_id = _run_done_job(jm, tmp_path)
+    assert jm.get_job(job_id)["status"] == JobStatus.DONE
+    assert f"{job_id}: not indexed for search: KeyError('dim')" in capsys.readouterr().err
@@ -0,0 +1,55 @@
+import smtplib
+import loadtest
+from loadtest import Scenario
+
+
+def test_smoke_run_reports_requests_jobs_and_contention(monkeypatch):
+    # Each run builds its own gateway from the environment; don't pace the stand-in at production limits
+    monkeypatch.setenv("GROQ_TRANSCRIBE_RPM", "60000")
+    monkeypatch.setenv("GROQ_CHAT_RPM", "60000")
+    scenario = Scenario(duration=1.5, pollers=2, poll_interval=0.2, recorders=2, meeting_seconds=0.2,
+                        audio_seconds=0.5, segments=5, groq_latency=0.01, smtp_latency=0.0, drain_seconds=20)
+    report = loadtest.run(scenario)
+
+    requests = report["requests"]
+    assert requests["GET /api/jobs"]["count"] >= 2
+    assert requests["GET /api/jobs"]["statuses"] == {200: requests["GET /api/jobs"]["count"]}
+    assert requests["POST /api/stop"]["count"] >= 1
+    assert 0 < requests["GET /api/status"]["p50"] <= requests["GET /api/status"]["max"]
+
+    jobs = report["jobs"]
+    assert jobs["created"] >= 1
+    assert jobs["done"] == jobs["created"], jobs["errors"]
+    assert jobs["turnaround"]["count"] == jobs["created"]
+    assert report["groq"]["transcriptions"] == jobs["created"]
+    assert report["gateway"]["transcribe"]["calls"] == jobs["created"]
+    assert report["smtp"]["messages"] == jobs["created"]
+
+    assert report["sqlite"]["jobmanager_lock_wait"]["count"] > 0
+    assert report["sqlite"]["commit"]["count"] > 0
+    assert report["threads"]["python_peak"] > scenario.pollers
+    assert "turnaround" in loadtest.format_report(report)
+    assert "Groq gateway" in loadtest.format_report(report)
+
+
+def test_run_restores_the_app_and_environment(monkeypatch):
+    import app as app_module
+    import os
+    monkeypatch.delenv("SMTP_HOST", raising=False)
+    recorder, job_manager = app_module.recorder, app_module.job_manager
+    loadtest.run(Scenario(duration=0.2, pollers=1, recorders=0, drain_seconds=1))
+    assert app_module.recorder is recorder
+    assert app_module.job_manager is job_manager
+    assert "SMTP_HOST" not in os.environ
+
+
+def test_smtp_stand_in_accepts_smtplib():
+    server = loadtest._start(loadtest.SmtpStandIn(Scenario(smtp_latency=0.0)))
+    try:
+        with smtplib.SMTP("127.0.0.1", server.port) as client:
+            client.login("user", "password")
+            client.sendmail("a@example.com", ["b@example.com"], "Subject: hi\r\n\r\nbody\r\n.\r\nmore")
+        assert server.messages == 1
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -33,3 +33,44 @@ def test_recorder_stop_when_not_recording(tmp_path):
     rec = Recorder(mic_device="hw:0,0", output_dir=str(tmp_path))
     result = rec.stop()
     assert result is None
+
+def test_recorder_with_captioner_pipes_pcm_to_it(tmp_path):
+    import io
+    captioner = MagicMock()
+    rec = Recorder(mic_device="hw:0,0", output_dir=str(tmp_path), captioner=captioner)
+    with patch("recorder.subprocess.Popen") as mock_popen:
+        mock_proc = MagicMock()
+        mock_proc.stdout = io.BytesIO(b"\x01\x00" * 3200)
+        mock_popen.return_value = mock_proc
+        filepath = rec.start()
+        rec.stop()
+    cmd = mock_popen.call_args[0][0]
+    assert cmd[cmd.index(filepath) + 1:] == ["-f", "s16le", "-ar", "16000", "-ac", "1", "pipe:1"]
+    captioner.start.assert_called_once_with(filepath)
+    assert b"".join(c.args[0] for c in captioner.feed.call_args_list) == b"\x01\x00" * 3200
+    captioner.stop.assert_called_once()
+
+
+def test_recorder_stop_does_not_wait_for_captions(tmp_path):
+    import io
+    captioner = MagicMock()
+    rec = Recorder(mic_device="hw:0,0", output_dir=str(tmp_path), captioner=captioner)
+    with patch("recorder.subprocess.Popen") as mock_popen:
+        mock_popen.return_value.stdout = io.BytesIO(b"")
+        rec.start()
+        rec.stop()
+    captioner.stop.assert_called_once_with(wait=False)
+
+
+def test_recorder_stops_ffmpeg_when_captioner_fails_to_start(tmp_path):
+    captioner = MagicMock()
+    captioner.start.side_effect = OSError("disk full")
+    rec = Recorder(mic_device="hw:0,0", output_dir=str(tmp_path), captioner=captioner)
+    with patch("recorder.subprocess.Popen") as mock_popen:
+        mock_proc = mock_popen.return_value
+        with pytest.raises(OSError):
+            rec.start()
+    mock_proc.terminate.assert_called_once()
+    mock_proc.wait.assert_called_once()
+    assert not rec.is_recording()
+    assert rec.stop() is None
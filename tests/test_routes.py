@@ -1,3 +1,4 @@
+import os
 import pytest
 from unittest.mock import patch, MagicMock
 import app as app_module
@@ -50,3 +51,502 @@ def test_start_when_already_recording_returns_409(client):
     with patch.object(app_module.recorder, "is_recording", return_value=True):
         resp = client.post("/api/start")
     assert resp.status_code == 409
+
+
+def test_stop_in_process_mode_leaves_job_queued(client, monkeypatch):
+    monkeypatch.setattr(app_module, "JOB_WORKER", "process")
+    with patch.object(app_module.recorder, "stop", return_value="/tmp/meeting_20260218_1030.mp3"), \
+         patch.object(app_module.job_manager, "process_async") as mock_async:
+        resp = client.post("/api/stop")
+    assert resp.status_code == 200
+    mock_async.assert_not_called()
+    assert app_module.job_manager.get_job(resp.json["job_id"])["status"] == "pending"
+
+
+def _fake_normalize(src, dest):
+    with open(src, "rb") as f, open(dest, "wb") as out:
+        out.write(f.read())
+
+
+def test_upload_multipart_creates_job(client, tmp_path):
+    import io
+    with patch.object(app_module, "normalize_audio", side_effect=_fake_normalize) as mock_norm, \
+         patch.object(app_module.job_manager, "process_async") as mock_async:
+        resp = client.post("/api/upload", data={"file": (io.BytesIO(b"zoom audio"), "standup.m4a")},
+                           content_type="multipart/form-data")
+    assert resp.status_code == 200
+    job = app_module.job_manager.get_job(resp.json["job_id"])
+    assert job["label"] == "standup"
+    src, dest = mock_norm.call_args[0]
+    assert src.startswith(str(tmp_path))
+    assert open(dest, "rb").read() == b"zoom audio"
+    assert not (tmp_path / src).exists()  # spooled upload removed after conversion
+    assert not list(tmp_path.glob("*.upload"))
+    mock_async.assert_called_once()
+
+
+def test_upload_raw_body_creates_job(client, tmp_path):
+    with patch.object(app_module, "normalize_audio", side_effect=_fake_normalize), \
+         patch.object(app_module.job_manager, "process_async"):
+        resp = client.post("/api/upload?filename=phone.mp3", data=b"phone audio",
+                           content_type="audio/mpeg")
+    assert resp.status_code == 200
+    job = app_module.job_manager.get_job(resp.json["job_id"])
+    assert job["label"] == "phone"
+    assert open(job["audio_path"], "rb").read() == b"phone audio"
+    assert not list(tmp_path.glob("*.upload"))
+
+
+def test_upload_without_file_returns_400(client, tmp_path):
+    resp = client.post("/api/upload", data={"other": "x"}, content_type="multipart/form-data")
+    assert resp.status_code == 400
+
+
+def test_upload_undecodable_audio_returns_400(client, tmp_path):
+    import subprocess
+    with patch.object(app_module, "normalize_audio",
+                      side_effect=subprocess.CalledProcessError(1, "ffmpeg")):
+        resp = client.post("/api/upload?filename=x.mp3", data=b"junk", content_type="audio/mpeg")
+    assert resp.status_code == 400
+    assert not list(tmp_path.glob("*.upload"))
+
+
+def _done_job(tmp_path, transcript="Speaker_00: Hello there\n" * 50, audio=b"ID3" + bytes(range(256)) * 40):
+    transcript_path = tmp_path / "meeting.txt"
+    transcript_path.write_text(transcript)
+    audio_path = tmp_path / "meeting.mp3"
+    audio_path.write_bytes(audio)
+    jm = app_module.job_manager
+    job_id = jm.create_job("meeting", audio_path=str(audio_path))
+    jm._db.execute("UPDATE jobs SET status='done', transcript_path=? WHERE id=?", (str(transcript_path), job_id))
+    jm._db.commit()
+    return job_id
+
+
+def test_transcript_etag_revalidation_returns_304(client, tmp_path):
+    job_id = _done_job(tmp_path)
+    first = client.get(f"/api/jobs/{job_id}/transcript")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert not etag.startswith("W/")
+    assert first.headers["Last-Modified"]
+    again = client.get(f"/api/jobs/{job_id}/transcript", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+
+def test_transcript_is_gzipped_when_accepted(client, tmp_path):
+    import gzip
+    job_id = _done_job(tmp_path)
+    resp = client.get(f"/api/jobs/{job_id}/transcript", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert gzip.decompress(resp.data).decode().startswith("Speaker_00: Hello there")
+    plain = client.get(f"/api/jobs/{job_id}/transcript")
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["ETag"] != resp.headers["ETag"]
+
+
+def test_concurrent_compression_of_one_transcript(tmp_path):
+    import gzip
+    import threading
+    source = tmp_path / "meeting.txt"
+    source.write_text("Speaker_00: Hello there\n" * 2000)
+    dest = str(source) + ".gz"
+    errors = []
+
+    def compress():
+        for _ in range(20):
+            try:
+                app_module._compress_file(str(source), dest, "gzip")
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=compress) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert gzip.decompress(open(dest, "rb").read()) == source.read_bytes()
+    assert sorted(os.listdir(tmp_path)) == ["meeting.txt", "meeting.txt.gz"]
+
+
+def test_transcript_range_request_is_not_compressed(client, tmp_path):
+    job_id = _done_job(tmp_path)
+    resp = client.get(f"/api/jobs/{job_id}/transcript",
+                      headers={"Range": "bytes=0-9", "Accept-Encoding": "gzip"})
+    assert resp.status_code == 206
+    assert resp.data == b"Speaker_00"
+    assert "Content-Encoding" not in resp.headers
+
+
+def test_transcript_missing_file_returns_404(client, tmp_path):
+    job_id = _done_job(tmp_path)
+    (tmp_path / "meeting.txt").unlink()
+    assert client.get(f"/api/jobs/{job_id}/transcript").status_code == 404
+
+
+def test_audio_supports_range_requests(client, tmp_path):
+    audio = bytes(range(256)) * 4
+    job_id = _done_job(tmp_path, audio=audio)
+    resp = client.get(f"/api/jobs/{job_id}/audio", headers={"Range": "bytes=256-511"})
+    assert resp.status_code == 206
+    assert resp.mimetype == "audio/mpeg"
+    assert resp.data == audio[256:512]
+    assert resp.headers["Content-Range"] == f"bytes 256-511/{len(audio)}"
+
+
+def test_audio_unknown_job_returns_404(client):
+    assert client.get("/api/jobs/nope/audio").status_code == 404
+
+
+def test_service_worker_served_from_root(client):
+    resp = client.get("/sw.js")
+    assert resp.status_code == 200
+    assert "javascript" in resp.mimetype
+
+
+def test_segments_returns_time_range(client, tmp_path):
+    from transcript_store import save_transcript
+    from transcriber import Segment
+    job_id = _done_job(tmp_path)
+    save_transcript(str(tmp_path / "meeting.segments.json"),
+                    [Segment(0.0, 2.0, "One"), Segment(2.0, 4.0, "Two"), Segment(4.0, 6.0, "Three")])
+    resp = client.get(f"/api/jobs/{job_id}/segments?start=2.5&end=4.5")
+    assert resp.status_code == 200
+    assert [s["text"] for s in resp.json] == ["Two", "Three"]
+
+
+def test_transcript_text_rendered_on_demand(client, tmp_path):
+    from transcript_store import save_transcript
+    from transcriber import Segment
+    job_id = _done_job(tmp_path)
+    (tmp_path / "meeting.txt").unlink()
+    save_transcript(str(tmp_path / "meeting.segments.json"),
+                    [Segment(0.0, 2.0, "Hi"), Segment(2.0, 4.0, "Bye")], ["Speaker_00", "Speaker_01"])
+    resp = client.get(f"/api/jobs/{job_id}/transcript")
+    assert resp.status_code == 200
+    assert resp.data == b"Speaker_00: Hi\nSpeaker_01: Bye"
+
+
+def test_ask_answers_from_retrieved_chunks(client, monkeypatch):
+    index = MagicMock()
+    index.search.return_value = [[
+        (0.91, {"job_id": "j1", "label": "Budget review", "kind": "summary:key decisions",
+                "text": "- Budget approved"}),
+    ]]
+    monkeypatch.setattr(app_module, "semantic_index", index)
+    with patch.object(app_module, "answer_question", return_value="It was approved.") as mock_answer:
+        resp = client.post("/api/ask", json={"question": "Was the budget approved?", "k": 3})
+    assert resp.status_code == 200
+    assert resp.json["answer"] == "It was approved."
+    assert resp.json["sources"][0]["label"] == "Budget review"
+    index.search.assert_called_once_with(["Was the budget approved?"], k=3)
+    assert mock_answer.call_args[0][1][0]["text"] == "- Budget approved"
+
+
+def test_ask_requires_question(client):
+    assert client.post("/api/ask", json={}).status_code == 400
+
+
+def test_ask_without_embedding_model_returns_503(client, monkeypatch):
+    index = MagicMock()
+    index.search.side_effect = ImportError("sentence_transformers")
+    monkeypatch.setattr(app_module, "semantic_index", index)
+    assert client.post("/api/ask", json={"question": "hi"}).status_code == 503
+
+
+def test_ask_after_embedding_model_change_returns_503(client, monkeypatch):
+    from semantic_index import EmbeddingMismatch
+    index = MagicMock()
+    index.search.side_effect = EmbeddingMismatch("the index holds 384-dim embeddings")
+    monkeypatch.setattr(app_module, "semantic_index", index)
+    resp = client.post("/api/ask", json={"question": "hi"})
+    assert resp.status_code == 503
+    assert "384-dim" in resp.json["error"]
+
+
+def test_archived_transcript_and_segments_are_served(client, tmp_path, monkeypatch):
+    from datetime import datetime, timedelta
+    from jobs import JobManager
+    from transcript_store import save_transcript
+    from transcriber import Segment
+    jm = JobManager(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(app_module, "job_manager", jm)
+    job_id = _done_job(tmp_path)
+    save_transcript(str(tmp_path / "meeting.segments.json"), [Segment(0.0, 2.0, "Hi"), Segment(2.0, 4.0, "Bye")])
+    jm._db.execute("UPDATE jobs SET created_at=? WHERE id=?",
+                   ((datetime.now() - timedelta(days=60)).isoformat(), job_id))
+    jm._db.commit()
+    (tmp_path / "meeting.txt").unlink()
+    assert jm.archive_jobs(older_than_days=30) == 1
+
+    resp = client.get(f"/api/jobs/{job_id}/transcript")
+    assert resp.status_code == 200
+    assert resp.data == b"Hi Bye"
+    assert client.get(f"/api/jobs/{job_id}/transcript",
+                      headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+    assert client.get(f"/api/jobs/{job_id}/segments?start=3").json[0]["text"] == "Bye"
+    assert client.get("/api/jobs").json == []
+    assert client.get("/api/jobs?archived=1").json[0]["id"] == job_id
+
+
+def test_gateway_stats_are_exposed(client, monkeypatch):
+    import gateway
+    monkeypatch.setattr(gateway, "_gateway", gateway.Gateway())
+    gateway.get_gateway().call("chat", lambda: "ok")
+    stats = client.get("/api/gateway/stats").json
+    assert stats["chat"]["calls"] == 1
+    assert stats["chat"]["coalesced"] == 0
+
+
+def test_captions_disabled_returns_404(client, monkeypatch):
+    monkeypatch.setattr(app_module, "captioner", None)
+    assert client.get("/api/captions").status_code == 404
+    assert client.get("/api/status").json["captions"] is False
+
+
+def test_captions_stream_sends_snapshot(client, tmp_path, monkeypatch):
+    from captions import LiveCaptioner
+    captioner = LiveCaptioner(str(tmp_path), recognize=lambda pcm: "")
+    captioner._lines = ["hello there"]
+    monkeypatch.setattr(app_module, "captioner", captioner)
+    resp = client.get("/api/captions")
+    assert resp.mimetype == "text/event-stream"
+    body = resp.get_data(as_text=True)
+    assert body.startswith('event: snapshot\ndata: {"type": "snapshot", "lines": ["hello there"]')
+    assert body.endswith("event: end\ndata: {\"type\": \"end\"}\n\n")
+    resp.close()  # as the WSGI server does once the stream ends
+    assert captioner._subscribers == []
+
+
+def test_captions_caps_concurrent_viewers(client, tmp_path, monkeypatch):
+    import threading
+    from captions import LiveCaptioner
+    captioner = LiveCaptioner(str(tmp_path), recognize=lambda pcm: "")
+    monkeypatch.setattr(app_module, "captioner", captioner)
+    monkeypatch.setattr(app_module, "_caption_clients", threading.BoundedSemaphore(1))
+    first = client.get("/api/captions", buffered=False)
+    assert first.status_code == 200
+    assert client.get("/api/captions").status_code == 503
+    first.close()  # the viewer disconnects, even before reading anything
+    assert captioner._subscribers == []
+    again = client.get("/api/captions", buffered=False)
+    assert again.status_code == 200
+    again.close()
+
+
+def test_transcript_falls_back_to_caption_draft_while_processing(client, tmp_path):
+    job_id = app_module.job_manager.create_job("meeting", audio_path=str(tmp_path / "meeting_1.mp3"))
+    assert client.get(f"/api/jobs/{job_id}/transcript").status_code == 404
+    (tmp_path / "meeting_1.draft.txt").write_text("live words\n")
+    resp = client.get(f"/api/jobs/{job_id}/transcript")
+    assert resp.status_code == 200
+    assert resp.data == b"live words\n"
+    assert resp.headers["X-Transcript-Draft"] == "1"
+
+
+@pytest.fixture
+def queue_client(client, monkeypatch):
+    monkeypatch.setattr(app_module, "JOB_WORKER", "process")
+    monkeypatch.setattr(app_module, "QUEUE_TOKEN", "secret")
+    return client
+
+
+AUTH = {"Authorization": "Bearer secret"}
+
+
+def test_queue_requires_token(queue_client):
+    resp = queue_client.post("/api/queue/lease", json={"worker": "w1"})
+    assert resp.status_code == 401
+
+
+def test_queue_refused_when_jobs_run_in_process(client):
+    resp = client.post("/api/queue/lease", json={"worker": "w1"})
+    assert resp.status_code == 503
+
+
+def test_lease_returns_204_when_queue_empty(queue_client):
+    resp = queue_client.post("/api/queue/lease", json={"worker": "w1"}, headers=AUTH)
+    assert resp.status_code == 204
+
+
+def test_remote_worker_lease_heartbeat_complete(queue_client, tmp_path):
+    from transcript_store import build_transcript, dumps_transcript
+    job_id = app_module.job_manager.create_job("standup", audio_path=str(tmp_path / "meeting_x.mp3"), room="lab")
+    resp = queue_client.post("/api/queue/lease", json={"worker": "w1"}, headers=AUTH)
+    assert resp.json["id"] == job_id and resp.json["room"] == "lab"
+
+    resp = queue_client.post(f"/api/queue/{job_id}/heartbeat", json={"worker": "w1", "status": "diarizing"},
+                             headers=AUTH)
+    assert resp.status_code == 200
+    assert app_module.job_manager.get_job(job_id)["status"] == "diarizing"
+    resp = queue_client.post(f"/api/queue/{job_id}/heartbeat", json={"worker": "w2"}, headers=AUTH)
+    assert resp.status_code == 409
+
+    segments = dumps_transcript(build_transcript([MagicMock(start=0.0, end=1.0, text="Hello")]))
+    resp = queue_client.post(f"/api/queue/{job_id}/complete", headers=AUTH,
+                             json={"worker": "w1", "summary": "notes", "metrics": {}, "segments": segments})
+    assert resp.status_code == 200
+    job = app_module.job_manager.get_job(job_id)
+    assert job["status"] == "done" and job["summary"] == "notes"
+    assert open(job["transcript_path"]).read().strip() == "Hello"
+
+
+def test_complete_rejects_invalid_segments(queue_client, tmp_path):
+    job_id = app_module.job_manager.create_job("standup", audio_path=str(tmp_path / "meeting_x.mp3"))
+    queue_client.post("/api/queue/lease", json={"worker": "w1"}, headers=AUTH)
+    resp = queue_client.post(f"/api/queue/{job_id}/complete", headers=AUTH,
+                             json={"worker": "w1", "summary": "notes", "segments": "not json"})
+    assert resp.status_code == 400
+    assert app_module.job_manager.get_job(job_id)["status"] == "transcribing"
+
+
+def test_fail_records_remote_error(queue_client):
+    job_id = app_module.job_manager.create_job("standup")
+    queue_client.post("/api/queue/lease", json={"worker": "w1"}, headers=AUTH)
+    resp = queue_client.post(f"/api/queue/{job_id}/fail", json={"worker": "w1", "error": "boom"}, headers=AUTH)
+    assert resp.status_code == 200
+    assert app_module.job_manager.get_job(job_id)["error"] == "boom"
+
+
+class _InlineThread:
+    def __init__(self, target, args=(), daemon=None):
+        self.target, self.args = target, args
+
+    def start(self):
+        self.target(*self.args)
+
+
+def test_stop_pushes_recording_to_central_in_background(client, monkeypatch):
+    central = MagicMock(base_url="http://central:5001")
+    monkeypatch.setattr(app_module, "central", central)
+    monkeypatch.setattr(app_module, "ROOM", "board")
+    with patch.object(app_module.recorder, "stop", return_value="/tmp/meeting_20260218_1030.mp3"), \
+         patch.object(app_module.threading, "Thread") as mock_thread:
+        resp = client.post("/api/stop")
+    assert resp.json == {"status": "uploading", "central": "http://central:5001"}
+    central.upload.assert_not_called()  # not on the request thread
+    assert mock_thread.call_args.kwargs["target"] is app_module._push_to_central
+
+    app_module._push_to_central(*mock_thread.call_args.kwargs["args"])
+    central.upload.assert_called_once_with("/tmp/meeting_20260218_1030.mp3", "20260218 1030", room="board")
+    assert app_module.job_manager.list_jobs() == []
+
+
+def test_stop_processes_locally_when_central_unreachable(client, monkeypatch):
+    central = MagicMock(base_url="http://central:5001")
+    central.upload.side_effect = ConnectionRefusedError()
+    monkeypatch.setattr(app_module, "central", central)
+    monkeypatch.setattr(app_module, "ROOM", "board")
+    with patch.object(app_module.recorder, "stop", return_value="/tmp/meeting_20260218_1030.mp3"), \
+         patch.object(app_module.threading, "Thread", _InlineThread), \
+         patch.object(app_module.job_manager, "process_async") as mock_async:
+        client.post("/api/stop")
+    mock_async.assert_called_once()
+    assert [job["room"] for job in app_module.job_manager.list_jobs()] == ["board"]
+
+
+def test_upload_tags_room_and_label(client):
+    with patch.object(app_module, "normalize_audio", side_effect=_fake_normalize), \
+         patch.object(app_module.job_manager, "process_async"):
+        resp = client.post("/api/upload?filename=meeting_1.mp3&label=20260218 1030&room=lab", data=b"audio")
+    job = app_module.job_manager.get_job(resp.json["job_id"])
+    assert (job["label"], job["room"]) == ("20260218 1030", "lab")
+
+
+@pytest.fixture
+def room_node(monkeypatch):
+    central = MagicMock(base_url="http://central:5001")
+    monkeypatch.setattr(app_module, "central", central)
+    monkeypatch.setattr(app_module, "ROOM", "board")
+    monkeypatch.setattr(app_module, "_central_cache", {"jobs": [], "fetched": float("-inf"), "refreshing": False})
+    return central
+
+
+def test_room_node_lists_its_jobs_on_central(client, room_node):
+    room_node.jobs.return_value = [{"id": "c0ffee00", "label": "x", "created_at": "2026-02-18"}]
+    with patch.object(app_module.threading, "Thread", _InlineThread):
+        client.get("/api/jobs")  # a stale cache refreshes in the background
+    resp = client.get("/api/jobs")
+    assert resp.json == [{"id": "c0ffee00", "label": "x", "created_at": "2026-02-18", "node": "http://central:5001"}]
+    room_node.jobs.assert_called_once_with(room="board", archived=True, timeout=10)
+
+
+def test_room_node_job_list_does_not_wait_for_central(client, room_node):
+    with patch.object(app_module.threading, "Thread") as mock_thread:
+        resp = client.get("/api/jobs")
+    assert resp.json == []
+    room_node.jobs.assert_not_called()
+    mock_thread.return_value.start.assert_called_once()
+
+
+def test_node_without_room_does_not_merge_every_rooms_jobs(client, room_node, monkeypatch):
+    monkeypatch.setattr(app_module, "ROOM", None)
+    with patch.object(app_module.threading, "Thread", _InlineThread):
+        client.get("/api/jobs")
+    room_node.jobs.assert_not_called()
+
+
+def test_invalid_lease_seconds_returns_400(queue_client):
+    resp = queue_client.post("/api/queue/lease", json={"worker": "w1", "lease_seconds": "soon"}, headers=AUTH)
+    assert resp.status_code == 400
+
+
+def test_complete_retry_after_success_is_acknowledged(queue_client, tmp_path):
+    from transcript_store import build_transcript, dumps_transcript
+    job_id = app_module.job_manager.create_job("standup", audio_path=str(tmp_path / "meeting_x.mp3"))
+    queue_client.post("/api/queue/lease", json={"worker": "w1"}, headers=AUTH)
+    body = {"worker": "w1", "summary": "notes",
+            "segments": dumps_transcript(build_transcript([MagicMock(start=0.0, end=1.0, text="Hello")]))}
+    assert queue_client.post(f"/api/queue/{job_id}/complete", json=body, headers=AUTH).status_code == 200
+    assert queue_client.post(f"/api/queue/{job_id}/complete", json=body, headers=AUTH).status_code == 200
+    assert queue_client.post(f"/api/queue/{job_id}/complete", json=dict(body, worker="w2"),
+                             headers=AUTH).status_code == 409
+
+
+def test_stale_worker_cannot_overwrite_new_owners_segments(queue_client, tmp_path):
+    import time
+    from transcript_store import build_transcript, dumps_transcript
+    job_id = app_module.job_manager.create_job("standup", audio_path=str(tmp_path / "meeting_x.mp3"))
+    queue_client.post("/api/queue/lease", json={"worker": "w1"}, headers=AUTH)
+    with patch("jobs.time.time", return_value=time.time() + 3600):
+        app_module.job_manager.lease_next_job("w2")  # w1's lease expired and w2 took over
+    segments = dumps_transcript(build_transcript([MagicMock(start=0.0, end=1.0, text="stale")]))
+    resp = queue_client.post(f"/api/queue/{job_id}/complete", headers=AUTH,
+                             json={"worker": "w1", "summary": "old", "segments": segments})
+    assert resp.status_code == 409
+    assert not list(tmp_path.glob("*.segments.json")) and not list(tmp_path.glob("*.tmp"))
+
+
+def test_upload_with_empty_filename_leaves_no_spooled_files(client, tmp_path):
+    import io
+    resp = client.post("/api/upload", data={"file": (io.BytesIO(b"audio"), ""), "extra": (io.BytesIO(b"x"), "x.mp3")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 400
+    assert not list(tmp_path.glob("*.upload"))
+
+
+def test_only_upload_route_spools_file_parts_to_recordings(client, tmp_path):
+    import io
+    client.post("/api/ask", data={"file": (io.BytesIO(b"x"), "x.mp3")}, content_type="multipart/form-data")
+    assert not list(tmp_path.glob("*.upload"))
+
+
+def test_dashboard_lists_archived_meetings():
+    import os
+    with open(os.path.join(app_module.app.root_path, app_module.app.template_folder, "index.html")) as f:
+        assert "fetch('/api/jobs?archived=1')" in f.read()
+
+
+def test_ask_with_non_integer_k_returns_400(client):
+    resp = client.post("/api/ask", json={"question": "What was decided?", "k": "lots"})
+    assert resp.status_code == 400
+
+
+def test_periodic_archiving_survives_a_failed_run(monkeypatch):
+    monkeypatch.setattr(app_module.job_manager, "archive_jobs", MagicMock(side_effect=RuntimeError("bad row")))
+    with patch("app.threading.Timer") as mock_timer:
+        app_module._archive_periodically()
+    mock_timer.return_value.start.assert_called_once()
@@ -0,0 +1,103 @@
+import hashlib
+import re
+import numpy as np
+import pytest
+from semantic_index import EmbeddingMismatch, SemanticIndex, summary_chunks, transcript_chunks
+from transcript_store import build_transcript
+from transcriber import Segment
+
+DIM = 256
+
+
+def fake_embed(texts):
+    """Deterministic bag-of-words embedding: shared words -> similar vectors."""
+    out = np.zeros((len(texts), DIM), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            out[i, int(hashlib.md5(word.encode()).hexdigest(), 16) % DIM] += 1
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.where(norms == 0, 1, norms)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SemanticIndex(str(tmp_path / "index"), embed=fake_embed)
+
+
+def test_search_finds_relevant_meeting(index):
+    index.add("j1", "Budget review", [{"kind": "transcript", "text": "The marketing budget increases by ten percent"}])
+    index.add("j2", "Hiring sync", [{"kind": "transcript", "text": "We will hire two backend engineers in March"}])
+    [hits] = index.search(["how many engineers will we hire"], k=1)
+    assert hits[0][1]["job_id"] == "j2"
+    assert hits[0][1]["label"] == "Hiring sync"
+
+
+def test_batched_search_returns_ranked_results_per_query(index):
+    index.add("j1", "A", [{"kind": "t", "text": f"topic{i} alpha"} for i in range(5)])
+    results = index.search(["topic1 alpha", "topic3 alpha"], k=3)
+    assert [r[0][1]["text"] for r in results] == ["topic1 alpha", "topic3 alpha"]
+    assert all(len(r) == 3 for r in results)
+    assert all(r[0][0] >= r[1][0] >= r[2][0] for r in results)
+
+
+def test_index_persists_and_reloads(tmp_path):
+    path = str(tmp_path / "index")
+    SemanticIndex(path, embed=fake_embed).add("j1", "A", [{"kind": "t", "text": "quarterly roadmap"}])
+    reopened = SemanticIndex(path, embed=fake_embed)
+    assert len(reopened) == 1
+    assert reopened.search(["roadmap"], k=1)[0][0][1]["job_id"] == "j1"
+    vectors = np.memmap(tmp_path / "index" / "vectors.f16", dtype=np.float16, mode="r")
+    assert vectors.dtype == np.float16
+
+
+def test_index_grows_past_initial_capacity(index, monkeypatch):
+    import semantic_index
+    monkeypatch.setattr(semantic_index, "SEARCH_BLOCK_ROWS", 300)  # exercise multi-block top-k merge
+    for j in range(3):
+        index.add(f"j{j}", "M", [{"kind": "t", "text": f"meeting{j} item{i}"} for i in range(500)])
+    assert len(index) == 1500
+    [hits] = index.search(["meeting2 item499"], k=1)
+    assert hits[0][1]["text"] == "meeting2 item499"
+
+
+def test_reader_sees_rows_added_by_another_instance(tmp_path):
+    path = str(tmp_path / "index")
+    reader = SemanticIndex(path, embed=fake_embed)
+    assert reader.search(["anything"]) == [[]]
+    SemanticIndex(path, embed=fake_embed).add("j1", "A", [{"kind": "t", "text": "anything"}])
+    assert reader.search(["anything"], k=1)[0][0][1]["job_id"] == "j1"
+
+
+def test_same_job_is_indexed_once(index):
+    assert index.add("j1", "A", [{"kind": "t", "text": "hello"}]) == 1
+    assert index.add("j1", "A", [{"kind": "t", "text": "hello"}]) == 0
+    assert len(index) == 1
+
+
+def test_changed_embedding_dimension_is_rejected(tmp_path):
+    directory = str(tmp_path / "index")
+    SemanticIndex(directory, embed=fake_embed).add("job1", "Budget", [{"kind": "summary", "text": "budget review"}])
+    wider = SemanticIndex(directory, embed=lambda texts: np.ones((len(texts), DIM * 2), dtype=np.float32))
+    with pytest.raises(EmbeddingMismatch):
+        wider.add("job2", "Roadmap", [{"kind": "summary", "text": "roadmap"}])
+    with pytest.raises(EmbeddingMismatch):
+        wider.search(["budget"])
+    assert len(wider) == 1
+    assert SemanticIndex(directory, embed=fake_embed).search(["budget"])[0][0][1]["job_id"] == "job1"
+
+
+def test_transcript_chunks_keep_time_span_and_speakers():
+    segments = [Segment(i * 2.0, i * 2.0 + 2.0, f"word{i} " * 10) for i in range(30)]
+    stored = build_transcript(segments, ["Speaker_00" if i < 15 else "Speaker_01" for i in range(30)])
+    chunks = transcript_chunks(stored, max_words=100)
+    assert len(chunks) == 3
+    assert (chunks[0]["start"], chunks[0]["end"]) == (0.0, 20.0)
+    assert chunks[1]["text"].startswith("Speaker_00: word10")
+    assert "\nSpeaker_01: word15" in chunks[1]["text"]
+
+
+def test_summary_chunks_split_numbered_sections():
+    summary = "1. SUMMARY\n- Budget ok\n\n2. ACTION ITEMS\n- Ana: send deck\n\n3. KEY DECISIONS\n- Ship Friday"
+    chunks = summary_chunks(summary)
+    assert [c["kind"] for c in chunks] == ["summary:summary", "summary:action items", "summary:key decisions"]
+    assert "Ana: send deck" in chunks[1]["text"]
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported when a job actually needs them
+HEAVY_MODULES = ("faster_whisper", "groq", "numpy", "resemblyzer", "sklearn", "torch")
+
+# Generous ceiling for `import app` on a Pi; catches regressions, not noise
+MAX_IMPORT_SECONDS = 2.0
+
+
+def _import_times(module):
+    """Run `python -X importtime -c 'import <module>'` and return {module: cumulative_us}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, env=os.environ.copy(),
+    )
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        try:
+            times[name.strip()] = int(cumulative)
+        except ValueError:
+            continue  # header row
+    return times
+
+
+def test_app_import_does_not_load_heavy_modules():
+    times = _import_times("app")
+    loaded = {name.split(".")[0] for name in times}
+    assert not loaded & set(HEAVY_MODULES), sorted(loaded & set(HEAVY_MODULES))
+
+
+def test_app_import_time_within_budget():
+    times = _import_times("app")
+    assert times["app"] / 1e6 < MAX_IMPORT_SECONDS, f"import app took {times['app'] / 1e6:.2f}s"
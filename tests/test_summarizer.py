@@ -7,7 +7,8 @@ def _mock_groq_response(content):
     return mock
 
 def test_summarize_returns_string():
-    with patch("summarizer._client") as mock_client:
+    with patch("summarizer.groq_client") as mock_factory:
+        mock_client = mock_factory.return_value
         mock_client.chat.completions.create.return_value = _mock_groq_response(
             "- Discussed roadmap\nAction: Alice to follow up"
         )
@@ -17,7 +18,8 @@ def test_summarize_returns_string():
 
 def test_summarize_sends_transcript_in_prompt():
     transcript = "We talked about deadlines and deliverables."
-    with patch("summarizer._client") as mock_client:
+    with patch("summarizer.groq_client") as mock_factory:
+        mock_client = mock_factory.return_value
         mock_client.chat.completions.create.return_value = _mock_groq_response("Summary here")
         summarize(transcript)
     call_args = mock_client.chat.completions.create.call_args
@@ -25,7 +27,8 @@ def test_summarize_sends_transcript_in_prompt():
     assert any(transcript in m["content"] for m in messages)
 
 def test_summarize_uses_diarized_prompt_when_diarized():
-    with patch("summarizer._client") as mock_client:
+    with patch("summarizer.groq_client") as mock_factory:
+        mock_client = mock_factory.return_value
         mock_client.chat.completions.create.return_value = _mock_groq_response("Summary")
         summarize("Speaker_00: Hello", diarized=True)
     messages = mock_client.chat.completions.create.call_args[1]["messages"]
@@ -35,7 +38,8 @@ def test_summarize_uses_diarized_prompt_when_diarized():
     assert "OPEN QUESTIONS" in prompt
 
 def test_summarize_uses_simple_prompt_when_not_diarized():
-    with patch("summarizer._client") as mock_client:
+    with patch("summarizer.groq_client") as mock_factory:
+        mock_client = mock_factory.return_value
         mock_client.chat.completions.create.return_value = _mock_groq_response("Summary")
         summarize("Hello world", diarized=False)
     messages = mock_client.chat.completions.create.call_args[1]["messages"]
@@ -43,9 +47,89 @@ def test_summarize_uses_simple_prompt_when_not_diarized():
     assert "SPEAKERS" not in prompt
 
 def test_summarize_defaults_to_simple_prompt():
-    with patch("summarizer._client") as mock_client:
+    with patch("summarizer.groq_client") as mock_factory:
+        mock_client = mock_factory.return_value
         mock_client.chat.completions.create.return_value = _mock_groq_response("Summary")
         summarize("Hello world")
     messages = mock_client.chat.completions.create.call_args[1]["messages"]
     prompt = " ".join(m["content"] for m in messages)
     assert "SPEAKERS" not in prompt
+
+
+def test_route_short_meeting_uses_small_model_and_brief_prompt():
+    from summarizer import route, PROMPT_BRIEF, SMALL_MODEL
+    chosen = route("Quick standup. All good.", model="big-model")
+    assert chosen.strategy == "brief"
+    assert chosen.model == SMALL_MODEL
+    assert chosen.template == PROMPT_BRIEF
+
+
+def test_route_short_diarized_meeting_keeps_speaker_prompt():
+    from summarizer import route, PROMPT_DIARIZED, SMALL_MODEL
+    chosen = route("Speaker_00: Hi\nSpeaker_01: Hello", model="big-model", diarized=True)
+    assert chosen.model == SMALL_MODEL
+    assert chosen.template == PROMPT_DIARIZED
+
+
+def test_route_medium_meeting_uses_requested_model(monkeypatch):
+    from summarizer import route
+    monkeypatch.setenv("SUMMARY_SHORT_TOKENS", "10")
+    chosen = route("word " * 100, model="big-model")
+    assert (chosen.strategy, chosen.model) == ("full", "big-model")
+
+
+def test_summarize_map_reduce_for_long_meetings(monkeypatch):
+    monkeypatch.setenv("SUMMARY_SHORT_TOKENS", "10")
+    monkeypatch.setenv("SUMMARY_LONG_TOKENS", "50")
+    monkeypatch.setenv("SUMMARY_CHUNK_TOKENS", "30")
+    transcript = "\n".join(f"Speaker_0{i % 2}: point number {i} about the budget." for i in range(20))
+    with patch("summarizer.groq_client") as mock_factory:
+        create = mock_factory.return_value.chat.completions.create
+        create.return_value = _mock_groq_response("notes")
+        create.return_value.usage.prompt_tokens = 100
+        create.return_value.usage.completion_tokens = 10
+        summary, stats = summarize(transcript, model="big-model", diarized=True, return_stats=True)
+
+    calls = create.call_args_list
+    assert stats["strategy"] == "map_reduce"
+    assert stats["chunks"] == len(calls) - 1 > 1
+    assert {c[1]["model"] for c in calls[:-1]} == {"llama-3.1-8b-instant"}
+    assert calls[-1][1]["model"] == "big-model"
+    assert "SPEAKERS" in calls[-1][1]["messages"][0]["content"]
+    assert stats["calls"] == len(calls)
+    assert stats["prompt_tokens"] == 100 * len(calls)
+
+
+def test_summarize_return_stats_records_tokens():
+    with patch("summarizer.groq_client") as mock_factory:
+        create = mock_factory.return_value.chat.completions.create
+        create.return_value = _mock_groq_response("Summary")
+        create.return_value.usage.prompt_tokens = 42
+        create.return_value.usage.completion_tokens = 7
+        summary, stats = summarize("Hello world", return_stats=True)
+    assert summary == "Summary"
+    assert stats["strategy"] == "brief"
+    assert (stats["calls"], stats["prompt_tokens"], stats["completion_tokens"]) == (1, 42, 7)
+    assert stats["latency_ms"] >= 0
+
+
+def test_split_chunks_respects_limit_and_keeps_text():
+    from summarizer import _split_chunks
+    text = "\n".join(f"line {i}" for i in range(50))
+    chunks = _split_chunks(text, 40)
+    assert all(len(c) <= 40 for c in chunks)
+    assert "\n".join(chunks) == text
+
+
+def test_answer_question_sends_only_passages():
+    from summarizer import answer_question
+    with patch("summarizer.groq_client") as mock_factory:
+        create = mock_factory.return_value.chat.completions.create
+        create.return_value = _mock_groq_response("Approved in the budget review.")
+        answer = answer_question("Was it approved?", [
+            {"label": "Budget review", "kind": "summary:key decisions", "text": "- Budget approved"},
+        ])
+    assert answer == "Approved in the budget review."
+    prompt = create.call_args[1]["messages"][0]["content"]
+    assert "[Budget review — summary:key decisions]\n- Budget approved" in prompt
+    assert "Question: Was it approved?" in prompt
@@ -23,7 +23,7 @@ def _make_mock_response(segments_data):
 def test_transcribe_returns_text(tmp_path):
     audio_file = str(tmp_path / "test.mp3")
     open(audio_file, "wb").close()
-    with patch("transcriber.Groq") as mock_cls:
+    with patch("transcriber.groq_client") as mock_cls:
         mock_cls.return_value.audio.transcriptions.create.return_value = \
             _make_mock_response([("Hello world.", 0.0, 2.0)])
         result = transcribe(audio_file)
@@ -34,7 +34,7 @@ def test_transcribe_saves_to_file(tmp_path):
     audio_file = str(tmp_path / "test.mp3")
     out_file = str(tmp_path / "transcript.txt")
     open(audio_file, "wb").close()
-    with patch("transcriber.Groq") as mock_cls:
+    with patch("transcriber.groq_client") as mock_cls:
         mock_cls.return_value.audio.transcriptions.create.return_value = \
             _make_mock_response([("Meeting content here.", 0.0, 3.0)])
         transcribe(audio_file, output_path=out_file)
@@ -46,7 +46,7 @@ def test_transcribe_saves_to_file(tmp_path):
 def test_transcribe_returns_segments_when_requested(tmp_path):
     audio_file = str(tmp_path / "test.mp3")
     open(audio_file, "wb").close()
-    with patch("transcriber.Groq") as mock_cls:
+    with patch("transcriber.groq_client") as mock_cls:
         mock_cls.return_value.audio.transcriptions.create.return_value = \
             _make_mock_response([("Hello world.", 0.0, 2.5)])
         text, segments = transcribe(audio_file, return_segments=True)
@@ -61,7 +61,7 @@ def test_transcribe_returns_segments_when_requested(tmp_path):
 def test_transcribe_returns_multiple_segments(tmp_path):
     audio_file = str(tmp_path / "test.mp3")
     open(audio_file, "wb").close()
-    with patch("transcriber.Groq") as mock_cls:
+    with patch("transcriber.groq_client") as mock_cls:
         mock_cls.return_value.audio.transcriptions.create.return_value = \
             _make_mock_response([
                 ("First segment.", 0.0, 2.0),
@@ -77,7 +77,7 @@ def test_transcribe_returns_multiple_segments(tmp_path):
 def test_transcribe_uses_correct_model_and_format(tmp_path):
     audio_file = str(tmp_path / "test.mp3")
     open(audio_file, "wb").close()
-    with patch("transcriber.Groq") as mock_cls:
+    with patch("transcriber.groq_client") as mock_cls:
         mock_instance = mock_cls.return_value
         mock_instance.audio.transcriptions.create.return_value = \
             _make_mock_response([("text", 0.0, 1.0)])
@@ -90,7 +90,7 @@ def test_transcribe_uses_correct_model_and_format(tmp_path):
 def test_transcribe_still_returns_string_by_default(tmp_path):
     audio_file = str(tmp_path / "test.mp3")
     open(audio_file, "wb").close()
-    with patch("transcriber.Groq") as mock_cls:
+    with patch("transcriber.groq_client") as mock_cls:
         mock_cls.return_value.audio.transcriptions.create.return_value = \
             _make_mock_response([("Hello", 0.0, 1.0)])
         result = transcribe(audio_file)
@@ -0,0 +1,74 @@
+import os
+import time
+from transcriber import Segment
+from transcript_store import (
+    build_transcript, ensure_text, load_transcript, save_transcript, structured_path,
+)
+
+SEGMENTS = [
+    Segment(0.0, 2.0, " Good morning."),
+    Segment(2.0, 5.0, " Morning!"),
+    Segment(5.0, 9.0, " Let's start with the roadmap."),
+    Segment(9.0, 12.0, " Sounds good."),
+]
+SPEAKERS = ["Speaker_00", "Speaker_01", "Speaker_01", "Speaker_00"]
+
+
+def test_round_trip_preserves_segments(tmp_path):
+    path = str(tmp_path / "m.segments.json")
+    save_transcript(path, SEGMENTS, SPEAKERS)
+    stored = load_transcript(path)
+    assert len(stored) == 4
+    assert stored.segment(2) == {"start": 5.0, "end": 9.0, "speaker": "Speaker_01",
+                                 "text": "Let's start with the roadmap."}
+    assert [s.text for s in stored.segments()] == [s.text.strip() for s in SEGMENTS]
+
+
+def test_between_returns_overlapping_segments():
+    stored = build_transcript(SEGMENTS, SPEAKERS)
+    assert [s["text"] for s in stored.between(4.0, 6.0)] == ["Morning!", "Let's start with the roadmap."]
+    assert stored.between(12.0, 20.0) == []
+    assert len(stored.between(0.0, float("inf"))) == 4
+
+
+def test_to_text_merges_diarized_turns():
+    stored = build_transcript(SEGMENTS, SPEAKERS)
+    assert stored.to_text() == (
+        "Speaker_00: Good morning.\n"
+        "Speaker_01: Morning! Let's start with the roadmap.\n"
+        "Speaker_00: Sounds good."
+    )
+
+
+def test_to_text_plain_when_not_diarized():
+    stored = build_transcript(SEGMENTS)
+    assert not stored.diarized
+    assert stored.segment(0)["speaker"] is None
+    assert stored.to_text() == "Good morning. Morning! Let's start with the roadmap. Sounds good."
+
+
+def test_ensure_text_renders_missing_and_stale_text(tmp_path):
+    txt = str(tmp_path / "m.txt")
+    assert ensure_text(txt) is False
+    save_transcript(structured_path(txt), SEGMENTS)
+    assert ensure_text(txt) is True
+    assert open(txt).read().startswith("Good morning.")
+
+    old = time.time() - 60
+    os.utime(txt, (old, old))
+    save_transcript(structured_path(txt), SEGMENTS, SPEAKERS)
+    ensure_text(txt)
+    assert open(txt).read().startswith("Speaker_00: Good morning.")
+
+
+def test_ensure_text_replaces_the_file_atomically(tmp_path):
+    txt = str(tmp_path / "meeting.txt")
+    with open(txt, "w") as f:
+        f.write("stale")
+    os.utime(txt, (0, 0))
+    save_transcript(structured_path(txt), SEGMENTS)
+    with open(txt) as reader:  # a reader that opened the old file keeps seeing it whole
+        assert ensure_text(txt) is True
+        assert reader.read() == "stale"
+    assert open(txt).read() == load_transcript(structured_path(txt)).to_text()
+    assert sorted(os.listdir(tmp_path)) == ["meeting.segments.json", "meeting.txt"]
@@ -0,0 +1,128 @@
+from unittest.mock import MagicMock, patch
+from central import LeaseLost
+from jobs import JobManager, JobStatus
+import worker
+
+SETTINGS = dict(
+    transcript_dir="/tmp",
+    gmail_user="u@g.com",
+    gmail_password="pw",
+    to_address="u@g.com",
+    summary_model="llama-3.3-70b-versatile"
+)
+
+
+def test_run_once_processes_claimed_job():
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting_a", audio_path="/tmp/meeting_a.mp3")
+    with patch.object(jm, "process") as mock_process:
+        assert worker.run_once(jm, SETTINGS) is True
+    mock_process.assert_called_once_with(job_id=job_id, audio_path="/tmp/meeting_a.mp3", **SETTINGS)
+
+
+def test_run_once_returns_false_on_empty_queue():
+    jm = JobManager(":memory:")
+    with patch.object(jm, "process") as mock_process:
+        assert worker.run_once(jm, SETTINGS) is False
+    mock_process.assert_not_called()
+
+
+def test_run_once_skips_jobs_already_in_progress():
+    jm = JobManager(":memory:")
+    job_id = jm.create_job("meeting_a")
+    jm._set_status(job_id, JobStatus.DIARIZING)
+    with patch.object(jm, "process") as mock_process:
+        assert worker.run_once(jm, SETTINGS) is False
+    mock_process.assert_not_called()
+
+
+def _fake_pipeline(label, audio_path, transcript_dir, set_status, notify=True, **settings):
+    assert notify is False  # remote workers email only after the central node has the result
+    set_status(JobStatus.SUMMARIZING)
+    path = f"{transcript_dir}/{label}.txt"
+    with open(path.replace(".txt", ".segments.json"), "w") as f:
+        f.write("{}")
+    return path, None, "notes", {"timings": {}}
+
+
+def test_run_remote_once_processes_leased_job():
+    client = MagicMock()
+    client.lease.return_value = {"id": "j1", "label": "standup"}
+    order = []
+    client.complete.side_effect = lambda *a: order.append("complete")
+    with patch("worker.run_pipeline", side_effect=_fake_pipeline), \
+         patch("worker.send_notes", side_effect=lambda **kw: order.append("email")) as mock_send:
+        assert worker.run_remote_once(client, "w1", SETTINGS, lease_seconds=30) is True
+    assert order == ["complete", "email"]
+    assert mock_send.call_args.kwargs["meeting_label"] == "standup"
+    assert client.download_audio.call_args[0][0] == "j1"
+    client.heartbeat.assert_called_once_with("j1", "w1", 30, status=JobStatus.SUMMARIZING)
+    client.complete.assert_called_once()
+    assert client.complete.call_args[0][:4] == ("j1", "w1", "notes", {"timings": {}})
+    client.fail.assert_not_called()
+
+
+def test_run_remote_once_reports_failure():
+    client = MagicMock()
+    client.lease.return_value = {"id": "j1", "label": "standup"}
+    with patch("worker.run_pipeline", side_effect=RuntimeError("groq down")):
+        worker.run_remote_once(client, "w1", SETTINGS)
+    client.fail.assert_called_once_with("j1", "w1", "groq down")
+    client.complete.assert_not_called()
+
+
+def test_run_remote_once_stops_when_lease_is_lost():
+    client = MagicMock()
+    client.lease.return_value = {"id": "j1", "label": "standup"}
+    client.heartbeat.side_effect = LeaseLost("j1")
+    with patch("worker.run_pipeline", side_effect=_fake_pipeline), patch("worker.send_notes") as mock_send:
+        worker.run_remote_once(client, "w1", SETTINGS)
+    client.complete.assert_not_called()
+    client.fail.assert_not_called()
+    mock_send.assert_not_called()
+
+
+def test_run_remote_once_retries_complete_through_transient_errors():
+    client = MagicMock()
+    client.lease.return_value = {"id": "j1", "label": "standup"}
+    client.complete.side_effect = [ConnectionResetError(), TimeoutError(), None]
+    with patch("worker.run_pipeline", side_effect=_fake_pipeline), \
+         patch("worker.send_notes") as mock_send, patch("worker.time.sleep") as mock_sleep:
+        worker.run_remote_once(client, "w1", SETTINGS)
+    assert client.complete.call_count == 3
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [1, 2]
+    client.fail.assert_not_called()
+    mock_send.assert_called_once()
+
+
+def test_run_remote_once_does_not_email_when_complete_keeps_failing():
+    client = MagicMock()
+    client.lease.return_value = {"id": "j1", "label": "standup"}
+    client.complete.side_effect = ConnectionRefusedError()
+    with patch("worker.run_pipeline", side_effect=_fake_pipeline), \
+         patch("worker.send_notes") as mock_send, patch("worker.time.sleep"):
+        worker.run_remote_once(client, "w1", SETTINGS)
+    assert client.complete.call_count == len(worker.COMPLETE_RETRY_DELAYS) + 1
+    mock_send.assert_not_called()
+
+
+def test_run_remote_once_returns_false_on_empty_queue():
+    client = MagicMock()
+    client.lease.return_value = None
+    assert worker.run_remote_once(client, "w1", SETTINGS) is False
+
+
+def test_run_keeps_polling_when_archiving_fails(tmp_path):
+    import threading
+    stop = threading.Event()
+    calls = []
+
+    def archive(self, older_than_days):
+        calls.append(older_than_days)
+        stop.set()
+        raise RuntimeError("bad row")
+
+    with patch("worker.JobManager.archive_jobs", archive), patch("worker.SemanticIndex"), \
+            patch("worker.pipeline_settings", return_value=SETTINGS):
+        worker.run(db_path=str(tmp_path / "jobs.db"), poll_interval=0, stop_event=stop)
+    assert calls == [30]
@@ -1,5 +1,6 @@
 import dataclasses
-from groq import Groq
+from clients import groq_client
+from gateway import get_gateway
 
 
 @dataclasses.dataclass
@@ -10,13 +11,16 @@ class Segment:
 
 
 def transcribe(audio_path, output_path=None, return_segments=False):
-    client = Groq()
-    with open(audio_path, "rb") as f:
-        response = client.audio.transcriptions.create(
-            file=f,
-            model="whisper-large-v3-turbo",
-            response_format="verbose_json",
-        )
+    def _request():
+        # reopened per attempt so a retried upload starts from the first byte
+        with open(audio_path, "rb") as f:
+            return groq_client().audio.transcriptions.create(
+                file=f,
+                model="whisper-large-v3-turbo",
+                response_format="verbose_json",
+            )
+
+    response = get_gateway().call("transcribe", _request)
     text = response.text.strip()
     if output_path:
         with open(output_path, "w") as f:
@@ -0,0 +1,121 @@
+import bisect
+import dataclasses
+import json
+import os
+import tempfile
+from diarizer import format_turns
+from transcriber import Segment
+
+FORMAT_VERSION = 1
+
+
+@dataclasses.dataclass
+class StoredTranscript:
+    """
+    Column-oriented transcript: parallel arrays per segment plus one text buffer.
+
+    Segment i spans starts[i]..ends[i] seconds, is spoken by speakers[speaker_ids[i]]
+    (speaker_ids[i] == -1 when not diarized) and reads text[offsets[i]:offsets[i + 1]].
+    """
+    starts: list
+    ends: list
+    speaker_ids: list
+    speakers: list
+    offsets: list
+    text: str
+    diarized: bool
+
+    def __len__(self):
+        return len(self.starts)
+
+    def segment(self, i):
+        speaker_id = self.speaker_ids[i]
+        return {
+            "start": self.starts[i],
+            "end": self.ends[i],
+            "speaker": self.speakers[speaker_id] if speaker_id >= 0 else None,
+            "text": self.text[self.offsets[i]:self.offsets[i + 1]],
+        }
+
+    def segments(self):
+        return [
+            Segment(start=self.starts[i], end=self.ends[i], text=self.text[self.offsets[i]:self.offsets[i + 1]])
+            for i in range(len(self))
+        ]
+
+    def between(self, start, end):
+        """Segments overlapping [start, end) seconds, found by bisection (Whisper times are monotonic)."""
+        lo = bisect.bisect_right(self.ends, start)
+        hi = bisect.bisect_left(self.starts, end)
+        return [self.segment(i) for i in range(lo, max(lo, hi))]
+
+    def to_text(self):
+        if not self.diarized:
+            return " ".join(self.text[self.offsets[i]:self.offsets[i + 1]] for i in range(len(self)))
+        labels = [self.speakers[s] for s in self.speaker_ids]
+        return format_turns(self.segments(), labels)
+
+
+def structured_path(transcript_path):
+    return os.path.splitext(transcript_path)[0] + ".segments.json"
+
+
+def draft_path(transcript_path):
+    """Where live captions of a recording accumulate until the final transcript replaces them."""
+    return os.path.splitext(transcript_path)[0] + ".draft.txt"
+
+
+def build_transcript(segments, speakers=None):
+    starts, ends, speaker_ids, offsets, texts = [], [], [], [0], []
+    names = sorted(set(speakers)) if speakers else []
+    for i, seg in enumerate(segments):
+        text = (seg.text or "").strip()
+        starts.append(float(seg.start))
+        ends.append(float(seg.end))
+        speaker_ids.append(names.index(speakers[i]) if speakers else -1)
+        texts.append(text)
+        offsets.append(offsets[-1] + len(text))
+    return StoredTranscript(
+        starts=starts, ends=ends, speaker_ids=speaker_ids, speakers=names,
+        offsets=offsets, text="".join(texts), diarized=bool(speakers),
+    )
+
+
+def dumps_transcript(transcript):
+    data = {"version": FORMAT_VERSION, **dataclasses.asdict(transcript)}
+    return json.dumps(data, separators=(",", ":"))
+
+
+def loads_transcript(data):
+    data = json.loads(data)
+    if data.pop("version") != FORMAT_VERSION:
+        raise ValueError("unsupported transcript format")
+    return StoredTranscript(**data)
+
+
+def save_transcript(path, segments, speakers=None):
+    transcript = build_transcript(segments, speakers)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(dumps_transcript(transcript))
+    os.replace(tmp, path)
+    return transcript
+
+
+def load_transcript(path):
+    with open(path) as f:
+        return loads_transcript(f.read())
+
+
+def ensure_text(transcript_path):
+    """Render the .txt view from the structured transcript if it is missing or stale."""
+    source = structured_path(transcript_path)
+    if not os.path.exists(source):
+        return os.path.exists(transcript_path)
+    if not os.path.exists(transcript_path) or os.path.getmtime(transcript_path) < os.path.getmtime(source):
+        # Request threads render this concurrently with readers, so never expose a half-written file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(transcript_path) or ".", suffix=".txt.tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(load_transcript(source).to_text())
+        os.replace(tmp, transcript_path)
+    return True
@@ -0,0 +1,221 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+from dotenv import load_dotenv
+from central import CentralClient, LeaseLost
+from emailer import send_notes
+from jobs import LEASE_SECONDS, JobManager, run_pipeline
+from semantic_index import SemanticIndex
+from transcript_store import structured_path
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "jobs.db")
+TRANSCRIPTS_DIR = os.path.join(BASE_DIR, "transcripts")
+INDEX_DIR = os.path.join(BASE_DIR, "index")
+ARCHIVE_INTERVAL = 6 * 3600
+COMPLETE_RETRY_DELAYS = (1, 2, 4, 8, 16)
+
+
+def pipeline_settings():
+    return dict(
+        transcript_dir=TRANSCRIPTS_DIR,
+        gmail_user=os.getenv("GMAIL_USER"),
+        gmail_password=os.getenv("GMAIL_APP_PASSWORD"),
+        to_address=os.getenv("GMAIL_TO"),
+        summary_model=os.getenv("GROQ_SUMMARY_MODEL", "llama-3.3-70b-versatile")
+    )
+
+
+def run_once(job_manager, settings):
+    """Claim and process one queued job. Returns False when the queue was empty."""
+    job = job_manager.claim_next_job()
+    if not job:
+        return False
+    job_manager.process(job_id=job["id"], audio_path=job["audio_path"], **settings)
+    return True
+
+
+def run(db_path=DB_PATH, poll_interval=2.0, stop_event=None):
+    load_dotenv()
+    os.makedirs(TRANSCRIPTS_DIR, exist_ok=True)
+    job_manager = JobManager(db_path, recover=False, index=SemanticIndex(INDEX_DIR))
+    settings = pipeline_settings()
+    next_archive = time.monotonic()
+    while stop_event is None or not stop_event.is_set():
+        if run_once(job_manager, settings):
+            continue
+        if time.monotonic() >= next_archive:
+            # Only when idle, so archiving never delays a queued meeting
+            try:
+                job_manager.archive_jobs(older_than_days=int(os.getenv("ARCHIVE_AFTER_DAYS", "30")))
+            except Exception as e:
+                print(f"Archiving failed: {e!r}", file=sys.stderr)
+            next_archive = time.monotonic() + ARCHIVE_INTERVAL
+        time.sleep(poll_interval)
+
+
+class _Lease:
+    """Keeps a remote job's lease alive in the background while the pipeline runs."""
+
+    def __init__(self, client, job_id, worker, lease_seconds):
+        self.client = client
+        self.job_id = job_id
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._renew, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _renew(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                self.client.heartbeat(self.job_id, self.worker, self.lease_seconds)
+            except LeaseLost:
+                self.lost = True
+                return
+            except OSError:
+                pass  # central briefly unreachable; the next beat may still land inside the lease
+
+    def set_status(self, status):
+        """Report a stage change; aborts the pipeline at a stage boundary once the lease is gone."""
+        if self.lost:
+            raise LeaseLost(self.job_id)
+        try:
+            self.client.heartbeat(self.job_id, self.worker, self.lease_seconds, status=status)
+        except OSError:
+            pass  # progress reports are best-effort; the background beat keeps the lease
+
+
+def _complete(client, job_id, worker, summary, metrics, segments_path, lease):
+    """Report a result, retrying transient failures for as long as the lease is still ours."""
+    for delay in COMPLETE_RETRY_DELAYS + (None,):
+        if lease.lost:
+            raise LeaseLost(job_id)
+        try:
+            return client.complete(job_id, worker, summary, metrics, segments_path)
+        except urllib.error.HTTPError as e:
+            if e.code < 500 or delay is None:
+                raise  # the central node refused the result itself; sending it again won't help
+        except OSError:
+            if delay is None:
+                raise
+        time.sleep(delay)
+
+
+def run_remote_once(client, worker, settings, lease_seconds=LEASE_SECONDS):
+    """Lease, process and report one job from a central node. Returns False when its queue was empty."""
+    job = client.lease(worker, lease_seconds)
+    if not job:
+        return False
+    work_dir = tempfile.mkdtemp(prefix=f"job-{job['id']}-")
+    try:
+        audio_path = os.path.join(work_dir, f"{job['id']}.mp3")
+        client.download_audio(job["id"], audio_path)
+        with _Lease(client, job["id"], worker, lease_seconds) as lease:
+            transcript_path, _, summary, metrics = run_pipeline(
+                job["label"], audio_path, **dict(settings, transcript_dir=work_dir), set_status=lease.set_status,
+                notify=False
+            )
+            _complete(client, job["id"], worker, summary, metrics, structured_path(transcript_path), lease)
+    except LeaseLost:
+        pass  # another worker owns the job now and will report it
+    except Exception as e:
+        try:
+            client.fail(job["id"], worker, str(e))
+        except (LeaseLost, OSError):
+            pass  # the lease then expires and the job is handed out again
+    else:
+        # Only once the central node holds the result, so a job redone elsewhere never emails twice
+        try:
+            send_notes(gmail_user=settings["gmail_user"], gmail_password=settings["gmail_password"],
+                       to_address=settings["to_address"], meeting_label=job["label"], summary=summary,
+                       transcript_path=transcript_path)
+        except Exception as e:
+            print(f"{job['id']}: notes were not emailed: {e}", file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return True
+
+
+def run_remote(central_url, worker=None, poll_interval=2.0, lease_seconds=LEASE_SECONDS, stop_event=None):
+    load_dotenv()
+    client = CentralClient(central_url, token=os.getenv("QUEUE_TOKEN") or None)
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    settings = pipeline_settings()
+    while stop_event is None or not stop_event.is_set():
+        try:
+            if run_remote_once(client, worker, settings, lease_seconds):
+                continue
+        except OSError:
+            pass  # central node down; keep polling
+        time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued meeting-notes jobs outside the web server.")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("WORKER_PROCESSES", "1")),
+                        help="number of worker processes (default: $WORKER_PROCESSES or 1)")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="seconds to wait between polls of an empty queue")
+    parser.add_argument("--no-recover", action="store_true",
+                        help="don't fail in-flight jobs on startup (use when another worker is already running)")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--central", metavar="URL",
+                        help="lease jobs from this central node over HTTP instead of the local database")
+    parser.add_argument("--lease-seconds", type=int, default=LEASE_SECONDS,
+                        help="how long a leased job stays ours without a heartbeat (--central only)")
+    parser.add_argument("--archive", action="store_true",
+                        help="archive old finished jobs once and exit (for cron)")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="one-off: convert an older database to incremental vacuum, then exit "
+                             "(rewrites the whole file; stop the web server first)")
+    args = parser.parse_args()
+
+    if args.vacuum:
+        converted = JobManager(args.db, recover=False).enable_incremental_vacuum()
+        print("Converted to incremental vacuum" if converted else "Already uses incremental vacuum")
+        return
+
+    if args.archive:
+        load_dotenv()
+        days = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+        print(f"Archived {JobManager(args.db, recover=False).archive_jobs(older_than_days=days)} jobs")
+        return
+
+    if args.central:
+        target, target_args = run_remote, (args.central, None, args.poll_interval, args.lease_seconds)
+    else:
+        target, target_args = run, (args.db, args.poll_interval)
+        if not args.no_recover:
+            JobManager(args.db, recover=False).recover_in_flight()
+
+    if args.processes <= 1:
+        target(*target_args)
+        return
+    procs = [
+        multiprocessing.Process(target=target, args=target_args)
+        for _ in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()